@@ -0,0 +1,219 @@
+"""
+Precomputed archetype personas in a memory-mapped file
+
+Apart from `key_lesson`, the quiz is a finite answer space, and a handful of
+fields (ARCHETYPE_FIELDS) shape the persona most. precompute_archetypes.py
+generates one persona per high-traffic combination of those fields and
+writes them here; the server maps the file and answers a submission without
+free text from the persona of its combination.
+
+File layout (little-endian):
+
+    8 bytes   MAGIC
+    4 bytes   header length H
+    H bytes   header JSON: fields, their options, prompt version, model
+              chain, created_at, count
+    padding   to an 8-byte boundary
+    count     uint64 combination keys, sorted
+    count+1   uint64 offsets of each persona within the data section
+    data      zlib-compressed persona JSON, back to back
+
+Keys are the AnswerCodec keys of just the archetype fields, so a lookup is a
+binary search over the mapped key array and one decompression; nothing but
+the header is read at startup. The options of every archetype field are
+stored in the header and checked on load, so a file built for another
+version of Data/Questions.json is rejected instead of serving personas for
+the wrong answers.
+"""
+
+import json
+import mmap
+import os
+import struct
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from packed_answers import SIDE_ENTRY_BIT, AnswerCodec
+
+MAGIC = b"PGARCH1\0"
+
+# The fields PERSONA_GENERATION_PROMPT leans on most: 2,880 full combinations
+ARCHETYPE_FIELDS = (
+    "risk_tolerance",
+    "involvement_level",
+    "time_horizon",
+    "experience_level",
+    "priority_focus",
+    "customer_segment",
+)
+
+
+class ArchetypeKeys:
+    """Projection of answers onto the archetype fields, as packed keys"""
+
+    def __init__(self, codec: AnswerCodec, fields: Sequence[str] = ARCHETYPE_FIELDS):
+        unknown = [name for name in fields if name not in codec.by_name]
+        if unknown:
+            raise ValueError(f"Archetype fields without fixed options: {', '.join(unknown)}")
+        self.codec = codec
+        self.fields = list(fields)
+
+    def project(self, answers: Dict[str, Any]) -> Dict[str, Any]:
+        return {name: answers[name] for name in self.fields if answers.get(name) not in (None, "", [])}
+
+    def key(self, answers: Dict[str, Any]) -> Optional[int]:
+        """Key of the answers' combination, or None if a value is outside the quiz options"""
+        key, side = self.codec.encode(self.project(answers))
+        return None if side is not None else key
+
+    def answers(self, key: int) -> Dict[str, Any]:
+        return self.codec.decode(key & ~SIDE_ENTRY_BIT)
+
+    def options(self) -> Dict[str, List[Any]]:
+        return {name: self.codec.by_name[name].options for name in self.fields}
+
+    def combinations(self) -> Iterator[Dict[str, Any]]:
+        """Every combination with all archetype fields answered"""
+        combinations = [{}]
+        for name in self.fields:
+            combinations = [{**partial, name: option} for partial in combinations for option in self.codec.by_name[name].options]
+        return iter(combinations)
+
+
+def write_archetypes(
+    path: str,
+    keys: ArchetypeKeys,
+    personas: Dict[int, Dict[str, Any]],
+    prompt_version: str,
+    model_chain: str,
+):
+    """Write {combination key: persona dict} atomically (temp file + rename)"""
+    header = json.dumps({
+        "fields": keys.fields,
+        "options": keys.options(),
+        "prompt_version": prompt_version,
+        "model_chain": model_chain,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "count": len(personas),
+    }, ensure_ascii=False).encode("utf-8")
+    prefix = MAGIC + struct.pack("<I", len(header)) + header
+    prefix += b"\0" * (-len(prefix) % 8)
+
+    ordered = sorted(personas)
+    blobs = [zlib.compress(json.dumps(personas[key], ensure_ascii=False).encode("utf-8"), 9) for key in ordered]
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(prefix)
+        f.write(struct.pack(f"<{len(ordered)}Q", *ordered))
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        for blob in blobs:
+            f.write(blob)
+    os.replace(temp_path, path)
+
+
+class ArchetypeStore:
+    """
+    A mapped archetype file plus coverage counters for the traffic it sees
+
+    `get` counts every lookup as a hit, a miss (combination not in the file)
+    or free_text (a key_lesson answer, which archetypes cannot reflect), and
+    remembers the most requested uncovered combinations so the next
+    precompute run can add them.
+    """
+
+    def __init__(self, path: str, keys: ArchetypeKeys, max_uncovered: int = 10000):
+        import numpy as np
+
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an archetype file")
+        (header_length,) = struct.unpack_from("<I", self._map, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header: Dict[str, Any] = json.loads(self._map[start:start + header_length].decode("utf-8"))
+        if self.header["fields"] != keys.fields or self.header["options"] != keys.options():
+            self.close()
+            raise ValueError(f"{path} was built for different quiz fields or options; regenerate it")
+        self.projection = keys
+        self.count = self.header["count"]
+        keys_at = start + header_length + (-(start + header_length) % 8)
+        self._keys = np.frombuffer(self._map, dtype="<u8", count=self.count, offset=keys_at)
+        self._offsets = np.frombuffer(self._map, dtype="<u8", count=self.count + 1, offset=keys_at + 8 * self.count)
+        self._data_at = keys_at + 8 * (2 * self.count + 1)
+
+        self.max_uncovered = max_uncovered
+        self.hits = 0
+        self.misses = 0
+        self.free_text = 0
+        self.uncovered: Counter = Counter()
+
+    @property
+    def prompt_version(self) -> str:
+        return self.header["prompt_version"]
+
+    def close(self):
+        if getattr(self, "_keys", None) is not None:
+            # numpy views pin the buffer; drop them before unmapping
+            self._keys = self._offsets = None
+        self._map.close()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def lookup(self, key: int) -> Optional[Dict[str, Any]]:
+        index = int(self._keys.searchsorted(key))
+        if index >= self.count or int(self._keys[index]) != key:
+            return None
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return json.loads(zlib.decompress(self._map[self._data_at + start:self._data_at + end]))
+
+    def get(self, answers: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Persona dict for a submission's combination, or None"""
+        if answers.get("key_lesson"):
+            self.free_text += 1
+            return None
+        key = self.projection.key(answers)
+        persona = self.lookup(key) if key is not None else None
+        if persona is None:
+            self.misses += 1
+            if key is not None and (key in self.uncovered or len(self.uncovered) < self.max_uncovered):
+                self.uncovered[key] += 1
+            return None
+        self.hits += 1
+        return persona
+
+    def __iter__(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        for index in range(self.count):
+            key = int(self._keys[index])
+            yield key, self.lookup(key)
+
+    def stats(self, top: int = 20) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.free_text
+        return {
+            "path": self.path,
+            "entries": self.count,
+            "fields": self.projection.fields,
+            "prompt_version": self.header["prompt_version"],
+            "model_chain": self.header["model_chain"],
+            "created_at": self.header["created_at"],
+            "lookups": lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "free_text": self.free_text,
+            # Share of all requests, and of the ones archetypes could serve
+            "coverage": self.hits / lookups if lookups else 0.0,
+            "eligible_coverage": self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0,
+            "top_uncovered": [
+                {"answers": self.projection.answers(key), "requests": count}
+                for key, count in self.uncovered.most_common(top)
+            ],
+        }
@@ -0,0 +1,145 @@
+"""
+Event-loop load test for the persona API
+
+Keeps a large number of /generate-persona calls pending against a slow fake
+provider and measures /generate-persona/basic latency while they are in flight.
+With the async provider path the rule-based latency should stay flat; run with
+--blocking to simulate the old synchronous SDK calls and watch it stall.
+
+Usage:
+    python benchmarks/event_loop_load_test.py --pending 200 --provider-latency 2.0
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+os.environ.setdefault("OPENAI_API_KEY", "load-test")
+
+import main  # noqa: E402
+
+SAMPLE_ANSWERS = {
+    "goal_primary": "I want to invest capital and earn returns",
+    "time_horizon": "4-7 years",
+    "ticket_size": "₹15-50 lakh",
+    "risk_tolerance": 3,
+    "involvement_level": "Co pilot - I support and guide, a manager or founder runs it",
+    "sectors": ["Food and beverage", "Health and wellness"],
+    "customer_segment": "B2C - consumers, families, walk in users",
+    "experience_level": "I have run a small or mid size business",
+    "priority_focus": "Process - systems, playbooks, controls",
+}
+
+FAKE_PERSONA = {
+    "persona_tags": ["Mid risk - balanced", "Hands-on hybrid", "Long term"],
+    "persona_summary": "Load test persona.",
+    "investment_style": "Load test persona.",
+    "strengths": ["Patience"],
+    "considerations": ["None"],
+    "recommended_opportunities": ["None"],
+}
+
+
+def install_fake_provider(latency: float, blocking: bool):
+    """Replace the OpenAI provider call with a fixed-latency fake"""
+
+    async def fake_openai(prompt: str) -> main.PersonaResponse:
+        if blocking:
+            time.sleep(latency)
+        else:
+            await asyncio.sleep(latency)
+        return main.PersonaResponse(**FAKE_PERSONA, generated_at="load-test")
+
+    main.generate_persona_with_openai = fake_openai
+
+
+async def time_basic_requests(client: httpx.AsyncClient, count: int, interval: float) -> list:
+    """
+    Send rule-based requests on a fixed schedule
+
+    Latency is measured from the scheduled send time, so time spent waiting for
+    a blocked event loop counts against the request (no coordinated omission).
+    """
+    latencies = []
+    schedule_start = time.perf_counter()
+    for i in range(count):
+        scheduled = schedule_start + i * interval
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        response = await client.post("/generate-persona/basic", json=SAMPLE_ANSWERS)
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+        response.raise_for_status()
+    return latencies
+
+
+def summarize(label: str, latencies: list) -> dict:
+    ordered = sorted(latencies)
+    summary = {
+        "p50_ms": statistics.median(ordered),
+        "p95_ms": ordered[int(len(ordered) * 0.95) - 1],
+        "max_ms": ordered[-1],
+    }
+    print(f"{label:<28} p50={summary['p50_ms']:8.2f}ms  p95={summary['p95_ms']:8.2f}ms  max={summary['max_ms']:8.2f}ms")
+    return summary
+
+
+async def launch_ai_requests(client: httpx.AsyncClient, count: int, ramp: float, pending: list):
+    """Start AI requests spread evenly over the ramp window"""
+    for _ in range(count):
+        pending.append(asyncio.create_task(client.post("/generate-persona", json=SAMPLE_ANSWERS)))
+        await asyncio.sleep(ramp / count)
+
+
+async def run(args):
+    install_fake_provider(args.provider_latency, args.blocking)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        # main.py logs every provider attempt; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            idle = await time_basic_requests(client, args.samples, args.interval)
+
+            pending = []
+            launcher = asyncio.create_task(launch_ai_requests(client, args.pending, args.ramp, pending))
+            loaded = await time_basic_requests(client, args.samples, args.interval)
+            await launcher
+            in_flight = sum(not task.done() for task in pending)
+
+            ai_start = time.perf_counter()
+            responses = await asyncio.gather(*pending)
+            ai_wall = time.perf_counter() - ai_start
+
+    print(f"Mode: {'blocking (sync SDK simulation)' if args.blocking else 'async'}")
+    print(f"AI requests: {args.pending}, provider latency {args.provider_latency:.2f}s, "
+          f"in flight while sampling: {in_flight}")
+    idle_summary = summarize("basic (idle)", idle)
+    loaded_summary = summarize("basic (AI calls pending)", loaded)
+    failures = sum(r.status_code != 200 for r in responses)
+    print(f"AI requests drained {ai_wall:.2f}s after sampling finished, failures: {failures}")
+
+    ratio = loaded_summary["p95_ms"] / max(idle_summary["p95_ms"], 0.001)
+    print(f"p95 slowdown under load: {ratio:.1f}x")
+    return ratio
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pending", type=int, default=200, help="AI requests kept in flight")
+    parser.add_argument("--provider-latency", type=float, default=2.0, help="Fake provider latency in seconds")
+    parser.add_argument("--samples", type=int, default=50, help="Rule-based requests timed per phase")
+    parser.add_argument("--interval", type=float, default=0.01, help="Seconds between scheduled rule-based requests")
+    parser.add_argument("--ramp", type=float, default=0.2, help="Seconds over which the AI requests are started")
+    parser.add_argument("--blocking", action="store_true", help="Simulate blocking (sync) provider calls")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,307 @@
+"""
+Throughput and tail-latency load test for the persona API
+
+Drives /generate-persona, /generate-persona/basic and /generate-persona/hybrid
+one endpoint at a time with an open-loop arrival rate, and reports p50/p95/p99
+latency and achieved requests per second for each. Latency is measured from
+each request's scheduled send time, so a stalled server is charged for the
+requests it delayed (no coordinated omission).
+
+By default the API and benchmarks/mock_providers.py are started as
+subprocesses, with the provider SDKs pointed at the mock, so no API credits
+are used. Pass --url to load an already running server instead.
+
+Results are written as JSON (commit, config, mock profiles, per-endpoint
+stats) so runs can be compared between commits with --compare.
+
+Usage:
+    python benchmarks/load_test.py --duration 20 --rps 50 --rps basic=500
+    python benchmarks/load_test.py --mock-args="--median 2 --error-rate 0.05" --output before.json
+    python benchmarks/load_test.py --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from itertools import cycle
+from typing import Any, Callable, Dict, List
+
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from quiz_encoding import QUESTIONS  # noqa: E402
+
+ENDPOINTS = {
+    "generate-persona": "/generate-persona",
+    "basic": "/generate-persona/basic",
+    "hybrid": "/generate-persona/hybrid",
+}
+
+
+def random_answers(rng: random.Random) -> Dict[str, Any]:
+    """A complete answer set drawn from Data/Questions.json"""
+    answers = {}
+    for q in QUESTIONS:
+        if q["type"] == "single":
+            answers[q["name"]] = rng.choice(q["options"])
+        elif q["type"] == "multi":
+            answers[q["name"]] = rng.sample(q["options"], rng.randint(1, min(3, len(q["options"]))))
+        elif q["type"] == "slider":
+            answers[q["name"]] = rng.randint(q["min"], q["max"])
+    return answers
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def git_revision() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR, capture_output=True, text=True
+        ).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+async def run_phase(client: httpx.AsyncClient, path: str, rps: float, duration: float,
+                    next_answers: Callable[[], Dict[str, Any]], max_in_flight: int) -> Dict[str, Any]:
+    """Send requests to one endpoint at a fixed rate and collect per-request outcomes"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    methods: Dict[str, int] = {}
+    providers: Dict[str, int] = {}
+    dropped = 0
+    in_flight = set()
+
+    async def one(answers: Dict[str, Any], scheduled: float):
+        try:
+            response = await client.post(path, json=answers)
+            status = str(response.status_code)
+            if response.status_code == 200:
+                body = response.json()
+                method = body.get("method", "ai")
+                methods[method] = methods.get(method, 0) + 1
+                provider = body.get("provider") or (body.get("ai_persona") or {}).get("provider")
+                if provider:
+                    providers[provider] = providers.get(provider, 0) + 1
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        latencies.append(time.perf_counter() - scheduled)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    total = max(1, int(rps * duration))
+    started = time.perf_counter()
+    for i in range(total):
+        scheduled = started + i / rps
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        if len(in_flight) >= max_in_flight:
+            dropped += 1  # the client, not the server, would be the bottleneck
+            continue
+        task = asyncio.create_task(one(next_answers(), scheduled))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    ok = statuses.get("200", 0)
+    result = {
+        "path": path,
+        "target_rps": rps,
+        "requests": len(latencies),
+        "dropped_client_side": dropped,
+        "ok": ok,
+        "error_rate": 1 - ok / len(latencies) if latencies else None,
+        "achieved_rps": len(latencies) / elapsed,
+        "ok_rps": ok / elapsed,
+        "statuses": statuses,
+        "methods": methods,
+        "providers": providers,
+    }
+    if ordered:
+        result.update({
+            "mean_ms": statistics.fmean(ordered) * 1000,
+            "p50_ms": percentile(ordered, 50) * 1000,
+            "p95_ms": percentile(ordered, 95) * 1000,
+            "p99_ms": percentile(ordered, 99) * 1000,
+            "max_ms": ordered[-1] * 1000,
+        })
+    return result
+
+
+def print_result(name: str, result: Dict[str, Any]):
+    print(
+        f"{name:<18}{result['requests']:>7}{result['achieved_rps']:>9.1f}{result['error_rate'] * 100:>8.1f}%"
+        f"{result.get('p50_ms', 0):>10.1f}{result.get('p95_ms', 0):>10.1f}{result.get('p99_ms', 0):>10.1f}"
+        f"{result.get('max_ms', 0):>10.1f}"
+    )
+
+
+def print_comparison(results: Dict[str, Any], baseline: Dict[str, Any]):
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "achieved_rps"):
+            if before.get(key):
+                change = (result.get(key, 0) - before[key]) / before[key] * 100
+                deltas.append(f"{key} {before[key]:.1f} -> {result.get(key, 0):.1f} ({change:+.1f}%)")
+        print(f"  {name}: " + ", ".join(deltas))
+
+
+def wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise Exception(f"Load test Error: {url} did not come up within {timeout:g}s")
+
+
+def spawn_servers(args) -> List[subprocess.Popen]:
+    """Start the mock providers and the API (pointed at them) as subprocesses"""
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+    mock = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARKS_DIR, "mock_providers.py"), "--port", str(args.mock_port),
+         *args.mock_args.split()],
+        cwd=REPO_DIR,
+    )
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "mock", "GOOGLE_API_KEY": "mock", "ANTHROPIC_API_KEY": "mock",
+        "OPENAI_BASE_URL": f"{mock_url}/v1",
+        "GOOGLE_GEMINI_BASE_URL": mock_url,
+        "ANTHROPIC_BASE_URL": mock_url,
+    }
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.api_port), "--log-level", "warning"],
+        cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    processes = [mock, api]
+    try:
+        wait_until_up(f"{mock_url}/_mock/config")
+        wait_until_up(f"http://127.0.0.1:{args.api_port}/health")
+    except Exception:
+        stop_servers(processes)
+        raise
+    return processes
+
+
+def stop_servers(processes: List[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def parse_rates(values: List[str]) -> Dict[str, float]:
+    """--rps 20 --rps basic=500 -> {"generate-persona": 20, "basic": 500, "hybrid": 20}"""
+    rates = {name: 20.0 for name in ENDPOINTS}
+    for value in values:
+        name, _, rate = value.rpartition("=")
+        for endpoint in ([name] if name else ENDPOINTS):
+            if endpoint not in ENDPOINTS:
+                raise SystemExit(f"Unknown endpoint {endpoint!r}; expected one of {', '.join(ENDPOINTS)}")
+            rates[endpoint] = float(rate)
+    return rates
+
+
+async def run(args, base_url: str) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    rates = parse_rates(args.rps)
+    names = args.endpoints.split(",")
+    # A small pool of distinct answer sets makes the persona cache hit; 0 means every request is new
+    needed = sum(int(rates[name] * (args.duration + args.warmup)) + 1 for name in names)
+    next_answers = cycle([random_answers(rng) for _ in range(args.distinct or needed)]).__next__
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        print(f"{'endpoint':<18}{'reqs':>7}{'rps':>9}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name in names:
+            if args.warmup:
+                await run_phase(client, ENDPOINTS[name], rates[name], args.warmup, next_answers, args.max_in_flight)
+            results[name] = await run_phase(
+                client, ENDPOINTS[name], rates[name], args.duration, next_answers, args.max_in_flight
+            )
+            print_result(name, results[name])
+        mock_profiles = None
+        if args.mock_port and not args.url:
+            mock_profiles = (await client.get(f"http://127.0.0.1:{args.mock_port}/_mock/config")).json()
+    return {"results": results, "mock": mock_profiles}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Load a running server instead of spawning the API and mock providers")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma-separated phases to run")
+    parser.add_argument("--rps", action="append", default=[], help="Target rate, for all endpoints or NAME=RATE")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per endpoint")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unrecorded seconds before each phase")
+    parser.add_argument("--distinct", type=int, default=0, help="Distinct answer sets to cycle through (0 = all new)")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Client-side cap on concurrent requests")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--api-port", type=int, default=8300)
+    parser.add_argument("--mock-port", type=int, default=8200)
+    parser.add_argument("--mock-args", default="", help="Extra arguments for mock_providers.py, e.g. \"--median 2\"")
+    parser.add_argument("--output", help="Result file (default benchmarks/results/load-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    for name in args.endpoints.split(","):
+        if name not in ENDPOINTS:
+            parser.error(f"unknown endpoint {name!r}; expected one of {', '.join(ENDPOINTS)}")
+
+    processes = [] if args.url else spawn_servers(args)
+    try:
+        run_data = asyncio.run(run(args, args.url or f"http://127.0.0.1:{args.api_port}"))
+    finally:
+        stop_servers(processes)
+
+    revision = git_revision()
+    report = {
+        **revision,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "mock": run_data["mock"],
+        "results": run_data["results"],
+    }
+    output = args.output
+    if not output:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        output = os.path.join(BENCHMARKS_DIR, "results", f"load-{revision['commit'] or 'unknown'}-{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(run_data["results"], json.load(f))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,161 @@
+"""
+Local stand-in for the OpenAI Files + Batch APIs
+
+Implements just enough of /v1/files and /v1/batches for bulk_repersona.py
+--batch-api to run end to end without real credentials. Each submitted chat
+completion request is answered with a canned persona after a configurable
+processing delay; --error-rate makes that fraction of requests fail.
+
+Usage:
+    python benchmarks/mock_batch_server.py --port 8100 --processing-seconds 2
+    OPENAI_API_KEY=mock OPENAI_BASE_URL=http://127.0.0.1:8100/v1 \\
+        python bulk_repersona.py submissions.jsonl personas.jsonl --batch-api --poll-interval 1
+"""
+
+import argparse
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import PlainTextResponse
+
+app = FastAPI(title="Mock OpenAI Batch API")
+
+files = {}
+batches = {}
+settings = {"processing_seconds": 2.0, "error_rate": 0.0}
+
+CANNED_PERSONA = {
+    "persona_tags": ["Mid risk - balanced", "Hands-on hybrid", "Medium term"],
+    "persona_summary": "A measured investor generated by the mock batch server.",
+    "investment_style": "Balances returns with involvement; canned mock output.",
+    "strengths": ["Discipline", "Operational awareness", "Patience"],
+    "considerations": ["Mock persona - not a real analysis"],
+    "recommended_opportunities": ["Regional QSR franchise", "B2B services roll-up"],
+}
+
+
+def file_object(file_id: str) -> dict:
+    entry = files[file_id]
+    return {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(entry["content"]),
+        "created_at": entry["created_at"],
+        "filename": entry["filename"],
+        "purpose": entry["purpose"],
+        "status": "processed",
+    }
+
+
+def chat_completion(body: dict) -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": json.dumps(CANNED_PERSONA)},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 600, "completion_tokens": 300, "total_tokens": 900},
+    }
+
+
+def complete_batch(batch: dict):
+    """Produce the output file the first time a finished batch is observed"""
+    lines = files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+    results = []
+    failed = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        if random.random() < settings["error_rate"]:
+            failed += 1
+            results.append({"id": f"batch_req_{uuid.uuid4().hex[:8]}", "custom_id": request["custom_id"],
+                            "response": None, "error": {"code": "server_error", "message": "mock failure"}})
+        else:
+            results.append({"id": f"batch_req_{uuid.uuid4().hex[:8]}", "custom_id": request["custom_id"],
+                            "response": {"status_code": 200, "request_id": uuid.uuid4().hex,
+                                         "body": chat_completion(request["body"])},
+                            "error": None})
+
+    output_id = f"file-{uuid.uuid4().hex[:12]}"
+    files[output_id] = {
+        "content": "".join(json.dumps(r) + "\n" for r in results).encode("utf-8"),
+        "created_at": int(time.time()),
+        "filename": "batch_output.jsonl",
+        "purpose": "batch_output",
+    }
+    batch.update(
+        status="completed",
+        output_file_id=output_id,
+        completed_at=int(time.time()),
+        request_counts={"total": len(results), "completed": len(results) - failed, "failed": failed},
+    )
+
+
+@app.post("/v1/files")
+async def upload_file(file: UploadFile = File(...), purpose: str = Form(...)):
+    file_id = f"file-{uuid.uuid4().hex[:12]}"
+    files[file_id] = {
+        "content": await file.read(),
+        "created_at": int(time.time()),
+        "filename": file.filename,
+        "purpose": purpose,
+    }
+    return file_object(file_id)
+
+
+@app.get("/v1/files/{file_id}/content", response_class=PlainTextResponse)
+async def file_content(file_id: str):
+    if file_id not in files:
+        raise HTTPException(status_code=404, detail="No such file")
+    return files[file_id]["content"].decode("utf-8")
+
+
+@app.post("/v1/batches")
+async def create_batch(body: dict):
+    if body.get("input_file_id") not in files:
+        raise HTTPException(status_code=400, detail="Unknown input_file_id")
+    batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+    batches[batch_id] = {
+        "id": batch_id,
+        "object": "batch",
+        "endpoint": body["endpoint"],
+        "input_file_id": body["input_file_id"],
+        "completion_window": body["completion_window"],
+        "status": "in_progress",
+        "created_at": int(time.time()),
+        "output_file_id": None,
+        "error_file_id": None,
+        "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        "_ready_at": time.time() + settings["processing_seconds"],
+    }
+    return {k: v for k, v in batches[batch_id].items() if not k.startswith("_")}
+
+
+@app.get("/v1/batches/{batch_id}")
+async def retrieve_batch(batch_id: str):
+    batch = batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="No such batch")
+    if batch["status"] == "in_progress" and time.time() >= batch["_ready_at"]:
+        complete_batch(batch)
+    return {k: v for k, v in batch.items() if not k.startswith("_")}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--processing-seconds", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    settings.update(processing_seconds=args.processing_seconds, error_rate=args.error_rate)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
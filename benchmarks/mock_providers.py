@@ -0,0 +1,363 @@
+"""
+Local stand-ins for the OpenAI, Gemini and Anthropic APIs
+
+Serves the endpoints main.py calls, in each provider's own wire format,
+including streaming:
+
+    POST /v1/chat/completions                         OpenAI (stream=true: SSE chunks)
+    POST /v1beta/models/{model}:generateContent       Gemini
+    POST /v1beta/models/{model}:streamGenerateContent Gemini (alt=sse)
+    POST /v1/messages                                 Anthropic (stream=true: SSE events)
+
+Each provider has its own latency distribution (lognormal, given as median
+and sigma), error rate (500/429/503 with provider-style error bodies) and
+malformed-response rate. A malformed response is one of: the JSON wrapped in
+a ```json fence (as Gemini likes to do), a truncated object, or the JSON
+preceded by prose. Requests asking for structured output (OpenAI json_schema,
+Gemini responseSchema) can only come back truncated, and a forced Anthropic
+tool call always carries a complete persona as its input. Streams spend ~20% of the latency before the first token
+and spread the rest over the chunks.
+
+Point the SDKs at it with:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8200/v1
+    GOOGLE_GEMINI_BASE_URL=http://127.0.0.1:8200
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8200
+
+Settings can be changed while running through GET/POST /_mock/config, e.g.
+{"openai": {"error_rate": 0.5}} to simulate an outage mid-test.
+
+Usage:
+    python benchmarks/mock_providers.py --port 8200 --openai-median 1.2 --gemini-malformed-rate 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+PROVIDERS = ("openai", "gemini", "anthropic")
+
+DEFAULT_PROFILE = {
+    "median": 1.0,  # seconds
+    "sigma": 0.4,  # lognormal shape; 0 gives a fixed latency
+    "error_rate": 0.0,
+    "malformed_rate": 0.0,
+    "chunks": 20,  # streamed deltas per response
+}
+
+profiles: Dict[str, Dict[str, float]] = {name: dict(DEFAULT_PROFILE) for name in PROVIDERS}
+counters: Dict[str, Dict[str, int]] = {name: {"requests": 0, "errors": 0, "malformed": 0} for name in PROVIDERS}
+# System prompts already seen, to report prompt-cache hits like the real APIs
+seen_prefixes = set()
+
+app = FastAPI(title="Mock LLM providers")
+
+PERSONA_TEMPLATE = {
+    "persona_tags": ["Mid risk - balanced", "Hands-on hybrid", "Medium term", "Experienced operator", "Systems focused"],
+    "persona_summary": "A measured investor produced by the mock provider. {note}",
+    "investment_style": "Balances returns with involvement and prefers proven systems; canned mock output.",
+    "strengths": ["Operational discipline", "Patience through cycles", "Clear investment criteria"],
+    "considerations": ["Mock persona - not a real analysis", "Validate unit economics independently"],
+    "recommended_opportunities": ["Regional QSR franchise", "B2B services roll-up", "Managed clinic network"],
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def sample_latency(profile: Dict[str, float]) -> float:
+    if profile["sigma"] <= 0:
+        return profile["median"]
+    return random.lognormvariate(math.log(max(profile["median"], 1e-6)), profile["sigma"])
+
+
+def persona_text(provider: str, profile: Dict[str, float], structured: bool = False) -> str:
+    """
+    Persona JSON, or with probability malformed_rate a broken variant of it
+
+    With structured output requested the API guarantees the format, so the
+    only possible breakage left is truncation at the token limit.
+    """
+    text = json.dumps({
+        **PERSONA_TEMPLATE,
+        "persona_summary": PERSONA_TEMPLATE["persona_summary"].format(note=f"[{provider} {uuid.uuid4().hex[:6]}]"),
+    }, indent=2)
+    if random.random() >= profile["malformed_rate"]:
+        return text
+    counters[provider]["malformed"] += 1
+    kind = "truncated" if structured else random.choice(["fenced", "truncated", "prose"])
+    if kind == "fenced":
+        return f"```json\n{text}\n```"
+    if kind == "truncated":
+        return text[: int(len(text) * random.uniform(0.6, 0.98))]
+    return f"Here is the investor persona you asked for:\n\n{text}"
+
+
+def prompt_tokens(system: str, user: str) -> Dict[str, int]:
+    """Input token estimate, with the system prompt counted as cached once seen (>= 1024 tokens)"""
+    total = estimate_tokens(system) + estimate_tokens(user)
+    cached = 0
+    if system and estimate_tokens(system) >= 1024:
+        if system in seen_prefixes:
+            cached = estimate_tokens(system)
+        seen_prefixes.add(system)
+    return {"input": total, "cached": cached}
+
+
+def chunk_text(text: str, chunks: int) -> List[str]:
+    size = max(1, math.ceil(len(text) / max(1, chunks)))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+async def stream_chunks(text: str, latency: float, chunks: int) -> AsyncIterator[str]:
+    """Yield text deltas: ~20% of the latency to the first one, the rest spread evenly"""
+    parts = chunk_text(text, int(chunks))
+    await asyncio.sleep(latency * 0.2)
+    gap = latency * 0.8 / max(1, len(parts))
+    for i, part in enumerate(parts):
+        if i:
+            await asyncio.sleep(gap)
+        yield part
+
+
+def failure(provider: str) -> Optional[JSONResponse]:
+    """Provider-shaped error response, with probability error_rate"""
+    counters[provider]["requests"] += 1
+    if random.random() >= profiles[provider]["error_rate"]:
+        return None
+    counters[provider]["errors"] += 1
+    status = random.choice([500, 429, 503])
+    headers = {"retry-after": "1"} if status == 429 else {}
+    message = {500: "mock internal error", 429: "mock rate limit", 503: "mock overloaded"}[status]
+    if provider == "openai":
+        body = {"error": {"message": message, "type": "server_error", "code": None}}
+    elif provider == "anthropic":
+        kind = {500: "api_error", 429: "rate_limit_error", 503: "overloaded_error"}[status]
+        body = {"type": "error", "error": {"type": kind, "message": message}}
+    else:
+        body = {"error": {"code": status, "message": message, "status": "UNAVAILABLE"}}
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+def sse(data: Any, event: Optional[str] = None) -> bytes:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+# OpenAI
+
+@app.post("/v1/chat/completions")
+async def openai_chat(request: Request):
+    body = await request.json()
+    if (error := failure("openai")) is not None:
+        return error
+    profile = profiles["openai"]
+    messages = body.get("messages", [])
+    system = "".join(m["content"] for m in messages if m["role"] == "system")
+    user = "".join(m["content"] for m in messages if m["role"] == "user")
+    tokens = prompt_tokens(system, user)
+    structured = (body.get("response_format") or {}).get("type") == "json_schema"
+    text = persona_text("openai", profile, structured)
+    latency = sample_latency(profile)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    usage = {
+        "prompt_tokens": tokens["input"],
+        "completion_tokens": estimate_tokens(text),
+        "total_tokens": tokens["input"] + estimate_tokens(text),
+        "prompt_tokens_details": {"cached_tokens": tokens["cached"]},
+    }
+
+    if not body.get("stream"):
+        await asyncio.sleep(latency)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    async def events():
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model")}
+        async for part in stream_chunks(text, latency, profile["chunks"]):
+            yield b"data: " + json.dumps({**base, "choices": [{"index": 0, "delta": {"content": part}, "finish_reason": None}]}).encode() + b"\n\n"
+        yield b"data: " + json.dumps({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}).encode() + b"\n\n"
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield b"data: " + json.dumps({**base, "choices": [], "usage": usage}).encode() + b"\n\n"
+        yield b"data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+# Gemini
+
+def gemini_response(text: str, tokens: Dict[str, int], model: str, finished: bool = True) -> Dict[str, Any]:
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "index": 0,
+            **({"finishReason": "STOP"} if finished else {}),
+        }],
+        "usageMetadata": {
+            "promptTokenCount": tokens["input"],
+            "candidatesTokenCount": estimate_tokens(text),
+            "totalTokenCount": tokens["input"] + estimate_tokens(text),
+            "cachedContentTokenCount": tokens["cached"],
+        },
+        "modelVersion": model,
+    }
+
+
+@app.post("/{version}/models/{model_action}")
+async def gemini_generate(version: str, model_action: str, request: Request):
+    model, _, action = model_action.partition(":")
+    body = await request.json()
+    if (error := failure("gemini")) is not None:
+        return error
+    profile = profiles["gemini"]
+    system = "".join(p.get("text", "") for p in (body.get("systemInstruction") or {}).get("parts", []))
+    user = "".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+    tokens = prompt_tokens(system, user)
+    config = body.get("generationConfig") or {}
+    structured = bool(config.get("responseSchema") or config.get("responseJsonSchema"))
+    text = persona_text("gemini", profile, structured)
+    latency = sample_latency(profile)
+
+    if action != "streamGenerateContent":
+        await asyncio.sleep(latency)
+        return gemini_response(text, tokens, model)
+
+    async def events():
+        parts = []
+        async for part in stream_chunks(text, latency, profile["chunks"]):
+            parts.append(part)
+            yield sse(gemini_response(part, tokens, model, finished=len("".join(parts)) == len(text)))
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+# Anthropic
+
+def tool_use_block(name: str, text: str) -> Dict[str, Any]:
+    return {"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:12]}", "name": name, "input": json.loads(text)}
+
+
+@app.post("/v1/messages")
+async def anthropic_messages(request: Request):
+    body = await request.json()
+    if (error := failure("anthropic")) is not None:
+        return error
+    profile = profiles["anthropic"]
+    system = body.get("system") or ""
+    if isinstance(system, list):
+        system = "".join(block.get("text", "") for block in system)
+    user = "".join(
+        m["content"] if isinstance(m["content"], str) else "".join(b.get("text", "") for b in m["content"])
+        for m in body.get("messages", [])
+    )
+    tokens = prompt_tokens(system, user)
+    # A forced tool call returns the persona as tool input, which the API always delivers as valid JSON
+    tool = (body.get("tool_choice") or {}).get("name") if body.get("tools") else None
+    text = persona_text("anthropic", {**profile, "malformed_rate": 0.0}) if tool else persona_text("anthropic", profile)
+    latency = sample_latency(profile)
+    message_id = f"msg_{uuid.uuid4().hex[:12]}"
+    usage = {
+        "input_tokens": tokens["input"] - tokens["cached"],
+        "cache_read_input_tokens": tokens["cached"],
+        "cache_creation_input_tokens": 0,
+        "output_tokens": estimate_tokens(text),
+    }
+
+    if not body.get("stream"):
+        await asyncio.sleep(latency)
+        return {
+            "id": message_id,
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model"),
+            "content": [tool_use_block(tool, text) if tool else {"type": "text", "text": text}],
+            "stop_reason": "tool_use" if tool else "end_turn",
+            "stop_sequence": None,
+            "usage": usage,
+        }
+
+    async def events():
+        message = {
+            "id": message_id, "type": "message", "role": "assistant", "model": body.get("model"),
+            "content": [], "stop_reason": None, "stop_sequence": None, "usage": {**usage, "output_tokens": 1},
+        }
+        yield sse({"type": "message_start", "message": message}, "message_start")
+        block = {**tool_use_block(tool, "{}"), "input": {}} if tool else {"type": "text", "text": ""}
+        yield sse({"type": "content_block_start", "index": 0, "content_block": block}, "content_block_start")
+        async for part in stream_chunks(text, latency, profile["chunks"]):
+            delta = {"type": "input_json_delta", "partial_json": part} if tool else {"type": "text_delta", "text": part}
+            yield sse({"type": "content_block_delta", "index": 0, "delta": delta}, "content_block_delta")
+        yield sse({"type": "content_block_stop", "index": 0}, "content_block_stop")
+        yield sse({
+            "type": "message_delta",
+            "delta": {"stop_reason": "tool_use" if tool else "end_turn", "stop_sequence": None},
+            "usage": {"output_tokens": usage["output_tokens"]},
+        }, "message_delta")
+        yield sse({"type": "message_stop"}, "message_stop")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+# Control
+
+@app.get("/_mock/config")
+async def get_config():
+    return {"profiles": profiles, "counters": counters}
+
+
+@app.post("/_mock/config")
+async def update_config(update: Dict[str, Dict[str, float]]):
+    for provider, values in update.items():
+        if provider in profiles:
+            profiles[provider].update({k: float(v) for k, v in values.items() if k in DEFAULT_PROFILE})
+    return {"profiles": profiles}
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    for provider in PROVIDERS:
+        for key, default in DEFAULT_PROFILE.items():
+            option = f"--{provider}-{key.replace('_', '-')}"
+            parser.add_argument(option, type=float, default=None, help=f"{provider} {key} (default {default})")
+    parser.add_argument("--median", type=float, default=None, help="Latency median for all providers")
+    parser.add_argument("--sigma", type=float, default=None, help="Latency sigma for all providers")
+    parser.add_argument("--error-rate", type=float, default=None, help="Error rate for all providers")
+    parser.add_argument("--malformed-rate", type=float, default=None, help="Malformed JSON rate for all providers")
+
+
+def apply_profile_arguments(args: argparse.Namespace):
+    for provider in PROVIDERS:
+        for key in DEFAULT_PROFILE:
+            shared = getattr(args, key, None)
+            specific = getattr(args, f"{provider}_{key}")
+            if specific is not None:
+                profiles[provider][key] = specific
+            elif shared is not None:
+                profiles[provider][key] = shared
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--seed", type=int, default=None)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    apply_profile_arguments(args)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,102 @@
+"""
+Top-k opportunity matching latency over a synthetic catalog
+
+Builds a catalog of random listings in the quiz vocabulary (sector, ticket
+size, geography, deal structure, involvement and a few persona tags each),
+indexes it with OpportunityIndex, and times match() for random investors
+(answers from Data/Questions.json, tags from the compiled rules). A sample
+of queries is checked against a plain Python scan that scores every
+listing, so the index and argpartition shortcut must agree with it.
+
+Usage:
+    python benchmarks/opportunity_matching.py --listings 100000 --queries 2000 --k 10
+    python benchmarks/opportunity_matching.py --write-catalog catalog.json --listings 5000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from load_test import random_answers  # noqa: E402
+from opportunities import CATALOG_FIELDS, OpportunityIndex  # noqa: E402
+from quiz_encoding import QUESTIONS  # noqa: E402
+from rule_engine import RuleEngine, load_rules  # noqa: E402
+
+
+def synthetic_catalog(rng: random.Random, count: int, tag_names: List[str]) -> List[Dict[str, Any]]:
+    options = {q["name"]: q["options"] for q in QUESTIONS if q.get("options")}
+    listings = []
+    for number in range(count):
+        listing = {"id": f"opp-{number}", "title": f"Opportunity {number}"}
+        for column, field in CATALOG_FIELDS.items():
+            choices = options[field]
+            listing[column] = rng.sample(choices, rng.randint(1, 2)) if column in ("geography", "deal_structure") else rng.choice(choices)
+        listing["tags"] = rng.sample(tag_names, 3)
+        listings.append(listing)
+    return listings
+
+
+def brute_force_scores(index: OpportunityIndex, terms: Dict[Any, float]) -> List[float]:
+    return [sum(terms.get(term, 0.0) for term in listing_terms) for listing_terms in index.terms]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--verify", type=int, default=20, help="Queries to check against a full Python scan")
+    parser.add_argument("--write-catalog", help="Also write the synthetic catalog as JSON (for OPPORTUNITIES_PATH)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    engine = RuleEngine(load_rules())
+    catalog = synthetic_catalog(rng, args.listings, engine.tag_names)
+    if args.write_catalog:
+        with open(args.write_catalog, "w", encoding="utf-8") as f:
+            json.dump(catalog, f, ensure_ascii=False)
+
+    started = time.perf_counter()
+    index = OpportunityIndex(catalog)
+    stats = index.stats()
+    print(f"{stats['listings']:,} listings, {stats['terms']} terms, {stats['postings']:,} postings, "
+          f"indexed in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    queries = []
+    for _ in range(args.queries):
+        answers = random_answers(rng)
+        queries.append((answers, engine.tags(answers)))
+    latencies = []
+    for answers, tags in queries:
+        started = time.perf_counter()
+        index.match(answers, tags, args.k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(f"match() top {args.k}: p50 {statistics.median(latencies):.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f} ms, max {latencies[-1]:.2f} ms")
+
+    mismatches = 0
+    for answers, tags in queries[:args.verify]:
+        terms = index.query_terms(answers, tags)
+        expected = sorted(((-score, number) for number, score in enumerate(brute_force_scores(index, terms)) if score > 0))
+        got = index.top(terms, args.k)
+        # Compare score sequences; listings with equal scores may be chosen differently at the cut-off
+        if [round(-score, 4) for score, _ in expected[:args.k]] != [round(score, 4) for _, score in got]:
+            mismatches += 1
+    print(f"queries differing from a full scan: {mismatches}/{min(args.verify, len(queries))}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,108 @@
+"""
+Memory and speed of bit-packed answers vs dicts and QuizAnswers models
+
+Builds the same random submissions (parsed from JSON, as the API receives
+them, so every string is its own object) and measures with tracemalloc what
+it takes to hold them as:
+
+    models   a list of QuizAnswers
+    dicts    a list of answer dicts
+    packed   PackedAnswers (uint64 keys, uint32 side ids, interned side entries)
+
+then times encode, decode and one vectorized column read, and checks that
+every packed submission decodes back to the same canonical answers.
+--key-lesson sets the share of submissions with a free-text key_lesson,
+which are the ones that need a side entry.
+
+Usage:
+    python benchmarks/packed_answers.py --submissions 200000 --key-lesson 0.3
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+os.environ.setdefault("PROVIDER_LOADING", "lazy")
+
+from load_test import random_answers  # noqa: E402
+from packed_answers import AnswerCodec, PackedAnswers  # noqa: E402
+from persona_cache import canonical_answers  # noqa: E402
+
+LESSONS = [
+    "Cash flow matters more than growth",
+    "Never invest in a business you do not understand",
+    "Pick the operator before the idea",
+    "Diligence the lease before the numbers",
+]
+
+
+def traced(build):
+    """(result, bytes allocated and still held by building it)"""
+    tracemalloc.start()
+    result = build()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, held
+
+
+def timed(label: str, count: int, fn):
+    started = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - started
+    print(f"{label:<18}{seconds * 1000:10.1f} ms {count / seconds:14,.0f} submissions/s")
+    return result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=200_000)
+    parser.add_argument("--key-lesson", type=float, default=0.3, help="Share of submissions with free text")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    import numpy  # noqa: F401  imported up front so it is not charged to the packed corpus
+    from main import QuizAnswers
+
+    rng = random.Random(args.seed)
+    raw = []
+    for _ in range(args.submissions):
+        answers = random_answers(rng)
+        if rng.random() < args.key_lesson:
+            answers["key_lesson"] = rng.choice(LESSONS)
+        raw.append(json.dumps(answers))
+    codec = AnswerCodec()
+
+    models, models_bytes = traced(lambda: [QuizAnswers.model_validate_json(payload) for payload in raw])
+    del models
+    dicts, dicts_bytes = traced(lambda: [json.loads(payload) for payload in raw])
+    packed, packed_bytes = traced(lambda: PackedAnswers.from_answers(codec, dicts))
+
+    count = args.submissions
+    print(f"{count:,} submissions, {codec.bits} key bits, {len(packed.strings)} distinct side entries")
+    for label, held in (("QuizAnswers", models_bytes), ("dicts", dicts_bytes), ("packed", packed_bytes)):
+        print(f"{label:<18}{held / 2**20:10.1f} MiB {held / count:10.1f} bytes/submission "
+              f"{dicts_bytes / held:8.1f}x smaller than dicts")
+    print(f"{'packed nbytes':<18}{packed.nbytes / 2**20:10.1f} MiB")
+
+    encoded = timed("encode", count, lambda: [codec.encode(answers) for answers in dicts])
+    decoded = timed("decode", count, lambda: [codec.decode(key, side) for key, side in encoded])
+    timed("column", count, lambda: packed.column("risk_tolerance"))
+    timed("stable_key", count, lambda: [codec.stable_key(key, side) for key, side in encoded])
+    unique = timed("unique_indexes", count, packed.unique_indexes)
+    print(f"distinct submissions: {len(unique):,}")
+
+    mismatches = sum(canonical_answers(new) != canonical_answers(old) for old, new in zip(dicts, decoded))
+    print(f"round-trip mismatches: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
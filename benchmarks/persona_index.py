@@ -0,0 +1,134 @@
+"""
+Nearest-neighbour persona lookup latency and memory at corpus scale
+
+Fills a PersonaIndex with synthetic personas (a realistic amount of varied
+text, so compression is not flattered) and measures insert rate, memory per
+persona and nearest() latency, then checks a sample of lookups against a
+brute-force scan of every stored key.
+
+Answers are drawn two ways:
+
+    clustered  each submission perturbs one of --archetypes prototypes,
+               changing every field with probability --noise, like real
+               users who fall into recognisable groups
+    uniform    every field independent and uniform; the worst case for the
+               partition pruning, since nothing is ever close
+
+Usage:
+    python benchmarks/persona_index.py --personas 1000000 --queries 2000
+    python benchmarks/persona_index.py --distribution uniform --personas 300000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from load_test import random_answers  # noqa: E402
+from packed_answers import SIDE_ENTRY_BIT, AnswerCodec  # noqa: E402
+from persona_index import PersonaIndex  # noqa: E402
+
+WORDS = (
+    "capital operator patient growth margin cash flow founder market regional brand franchise "
+    "discipline returns risk downside upside partner hands-on systems people process customers "
+    "recurring revenue diligence lease team culture exit horizon sector health food education"
+).split()
+
+
+def synthetic_persona(rng: random.Random) -> Dict[str, Any]:
+    def sentence(words: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+    return {
+        "persona_tags": [sentence(2)[:-1] for _ in range(5)],
+        "persona_summary": " ".join(sentence(14) for _ in range(5)),
+        "investment_style": " ".join(sentence(12) for _ in range(2)),
+        "strengths": [sentence(6) for _ in range(3)],
+        "considerations": [sentence(8) for _ in range(3)],
+        "recommended_opportunities": [sentence(6) for _ in range(3)],
+        "generated_at": "2026-01-01T00:00:00",
+        "provider": "OpenAI",
+    }
+
+
+def clustered_answers(rng: random.Random, archetypes: List[Dict[str, Any]], noise: float) -> Dict[str, Any]:
+    answers = dict(rng.choice(archetypes))
+    fresh = random_answers(rng)
+    for name in answers:
+        if rng.random() < noise:
+            answers[name] = fresh[name]
+    return answers
+
+
+def brute_force_distance(index: PersonaIndex, answers: Dict[str, Any]) -> float:
+    np = index.np
+    query = index._query_tables(index.codec.encode(answers)[0] & ~SIDE_ENTRY_BIT)
+    if query is None:
+        return float("nan")
+    table, _ = query
+    keys = np.concatenate([partition.keys[:len(partition.blobs)] for partition in index._partition_list])
+    distances = np.zeros(len(keys), dtype=np.float32)
+    for shift, mask, offset in index._chunk_offsets:
+        distances += table[((keys >> np.uint64(shift)) & np.uint64(mask)).astype(np.int64) + offset]
+    return float(distances.min())
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--personas", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--distribution", choices=("clustered", "uniform"), default="clustered")
+    parser.add_argument("--archetypes", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.2, help="Per-field chance of leaving the archetype")
+    parser.add_argument("--verify", type=int, default=50, help="Lookups to check against a brute-force scan")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    archetypes = [random_answers(rng) for _ in range(args.archetypes)]
+    if args.distribution == "clustered":
+        draw = lambda: clustered_answers(rng, archetypes, args.noise)  # noqa: E731
+    else:
+        draw = lambda: random_answers(rng)  # noqa: E731
+    personas = [synthetic_persona(rng) for _ in range(1000)]
+
+    index = PersonaIndex(AnswerCodec(), max_entries=args.personas)
+    started = time.perf_counter()
+    for i in range(args.personas):
+        index.add(draw(), personas[i % len(personas)])
+    insert_seconds = time.perf_counter() - started
+    print(f"{len(index):,} personas ({args.distribution}) in {len(index.partitions)} partitions, "
+          f"{args.personas / insert_seconds:,.0f} inserts/s, "
+          f"{index.nbytes() / 2**20:,.0f} MiB ({index.nbytes() / max(1, len(index)):.0f} bytes/persona)")
+
+    queries = [draw() for _ in range(args.queries)]
+    latencies, distances = [], []
+    for answers in queries:
+        started = time.perf_counter()
+        persona, distance = index.nearest(answers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        distances.append(distance)
+    latencies.sort()
+    print(f"nearest(): p50 {statistics.median(latencies):.3f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.3f} ms, max {latencies[-1]:.3f} ms")
+    print(f"match distance: median {statistics.median(distances):.3f}, "
+          f"exact {sum(distance == 0 for distance in distances) / len(distances):.1%}")
+
+    mismatches = sum(
+        abs(brute_force_distance(index, answers) - distance) > 1e-5
+        for answers, distance in zip(queries[:args.verify], distances)
+    )
+    print(f"lookups differing from brute force: {mismatches}/{min(args.verify, len(queries))}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
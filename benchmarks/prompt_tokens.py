@@ -0,0 +1,271 @@
+"""
+Prompt token comparison for the quiz answer encodings
+
+Renders the persona prompt for a set of answer sets in every PROMPT_ENCODING
+(verbose, compact, coded) and reports input tokens per request, split into the
+static system prompt (identical across requests, so cacheable) and the
+per-request answers. Coded answers are also decoded again to check the encoding is
+lossless for every sample.
+
+With --live N the first N samples are sent to a real provider in each
+encoding, and the personas are compared: schema validity, agreement with the
+rule-based tags for the same answers, and tag overlap with the verbose
+persona. A compact encoding should not score lower than verbose beyond
+--tolerance.
+
+Token counts use tiktoken (o200k_base, as for gpt-4o-mini) when it is installed
+and its encoding can be loaded, Anthropic's count_tokens endpoint with
+--tokenizer anthropic, and a ~4 characters per token estimate otherwise.
+
+Usage:
+    python benchmarks/prompt_tokens.py --samples 500
+    python benchmarks/prompt_tokens.py --input submissions.jsonl --output tokens.json
+    python benchmarks/prompt_tokens.py --samples 20 --live 10 --provider OpenAI
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+from bulk_repersona import read_submissions  # noqa: E402
+from prompt import PROMPT_TEMPLATES, prompt_version  # noqa: E402
+from quiz_encoding import ENCODINGS, QUESTIONS, decode_answers, encode_answers  # noqa: E402
+
+KEY_LESSONS = [
+    "Never enter a business where I do not trust the numbers or the people.",
+    "Cash flow matters more than revenue.",
+    "The operator makes or breaks the unit, not the brand.",
+]
+
+
+def random_answers(rng: random.Random) -> Dict[str, Any]:
+    """One plausible answer set drawn from Data/Questions.json"""
+    answers = {}
+    for q in QUESTIONS:
+        if rng.random() < 0.1:
+            continue  # unanswered
+        if q["type"] == "single":
+            answers[q["name"]] = rng.choice(q["options"])
+        elif q["type"] == "multi":
+            answers[q["name"]] = rng.sample(q["options"], rng.randint(1, min(3, len(q["options"]))))
+        elif q["type"] == "slider":
+            answers[q["name"]] = rng.randint(q["min"], q["max"])
+        elif rng.random() < 0.5:
+            answers[q["name"]] = rng.choice(KEY_LESSONS)
+    return answers
+
+
+def load_samples(args) -> List[Dict[str, Any]]:
+    if not args.input:
+        rng = random.Random(args.seed)
+        return [random_answers(rng) for _ in range(args.samples)]
+    samples = []
+    for _, _, answers in read_submissions(args.input):
+        if isinstance(answers, dict):
+            samples.append(main.QuizAnswers(**answers).model_dump(exclude_none=True))
+        if len(samples) >= args.samples:
+            break
+    return samples
+
+
+def make_counter(name: str) -> Callable[[str], int]:
+    """Token counting function; falls back to an estimate when no tokenizer is available"""
+    if name in ("auto", "tiktoken"):
+        try:
+            import tiktoken
+
+            encoding = tiktoken.get_encoding("o200k_base")
+            print("Tokenizer: tiktoken o200k_base")
+            return lambda text: len(encoding.encode(text))
+        except Exception as e:
+            if name == "tiktoken":
+                raise
+            print(f"Tokenizer: estimate (~4 chars/token); tiktoken unavailable ({type(e).__name__})")
+    elif name == "anthropic":
+        import anthropic
+
+        client = anthropic.Anthropic()
+        print(f"Tokenizer: Anthropic count_tokens ({main.CLAUDE_MODEL})")
+        return lambda text: client.messages.count_tokens(
+            model=main.CLAUDE_MODEL, messages=[{"role": "user", "content": text}]
+        ).input_tokens
+    else:
+        print("Tokenizer: estimate (~4 chars/token)")
+    return lambda text: max(1, round(len(text) / 4))
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "mean": statistics.fmean(values),
+        "p50": statistics.median(values),
+        "max": max(values),
+    }
+
+
+def token_report(
+    samples: List[Dict[str, Any]],
+    count: Callable[[str], int],
+    cache_discount: float,
+    cache_min_tokens: int,
+) -> Dict[str, Any]:
+    report = {}
+    for encoding in ENCODINGS:
+        system, user = PROMPT_TEMPLATES[encoding]
+        # The system prompt is the shared prefix providers can cache
+        prefix = count(system)
+        static = prefix + count(user.format(quiz_data=""))
+        cached_saving = prefix * cache_discount if prefix >= cache_min_tokens else 0.0
+        totals, answers, lossless = [], [], 0
+        for sample in samples:
+            quiz_data = encode_answers(sample, encoding)
+            totals.append(prefix + count(user.format(quiz_data=quiz_data)))
+            answers.append(totals[-1] - static)
+            lossless += decode_answers(quiz_data, encoding) == sample
+        report[encoding] = {
+            "prompt_version": prompt_version(encoding),
+            "static_tokens": static,
+            "cacheable_prefix_tokens": prefix,
+            "answer_tokens": summarize(answers),
+            "total_tokens": summarize(totals),
+            # Input tokens billed at full price once the prefix is served from the provider cache
+            "cached_billed_tokens": statistics.fmean(totals) - cached_saving,
+            "lossless_samples": lossless,
+        }
+
+    baseline = report["verbose"]
+    for encoding, entry in report.items():
+        entry["answer_tokens_saved_per_request"] = baseline["answer_tokens"]["mean"] - entry["answer_tokens"]["mean"]
+        entry["total_tokens_saved_per_request"] = baseline["total_tokens"]["mean"] - entry["total_tokens"]["mean"]
+        entry["cached_billed_tokens_saved_per_request"] = baseline["cached_billed_tokens"] - entry["cached_billed_tokens"]
+    return report
+
+
+def tag_set(tags: List[str]) -> set:
+    return {tag.strip().lower() for tag in tags}
+
+
+def rule_agreement(persona: main.PersonaResponse, answers: Dict[str, Any]) -> Optional[float]:
+    """Fraction of the rule-based tags for these answers that the AI persona also produced"""
+    expected = tag_set(main.generate_persona_rules_based(main.QuizAnswers(**answers)))
+    if not expected:
+        return None
+    produced = " | ".join(tag_set(persona.persona_tags))
+    return sum(tag in produced for tag in expected) / len(expected)
+
+
+async def live_report(samples: List[Dict[str, Any]], provider: str, tolerance: float) -> Dict[str, Any]:
+    generate = {
+        "OpenAI": main.generate_persona_with_openai,
+        "Gemini": main.generate_persona_with_gemini,
+        "Claude": main.generate_persona_with_claude,
+    }[provider]
+
+    personas: Dict[str, List[Optional[main.PersonaResponse]]] = {}
+    report = {}
+    for encoding in ENCODINGS:
+        results, latencies, errors = [], [], []
+        for sample in samples:
+            started = time.perf_counter()
+            try:
+                results.append(await generate(main.build_persona_prompt(sample, encoding)))
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                results.append(None)
+                errors.append(str(e))
+        personas[encoding] = results
+
+        agreement = [
+            score for persona, sample in zip(results, samples)
+            if persona is not None and (score := rule_agreement(persona, sample)) is not None
+        ]
+        report[encoding] = {
+            "valid_rate": sum(p is not None for p in results) / len(samples),
+            "rule_tag_agreement": statistics.fmean(agreement) if agreement else None,
+            "latency_seconds": summarize(latencies) if latencies else None,
+            "errors": errors[:5],
+        }
+        print(f"  {encoding}: {report[encoding]['valid_rate']:.0%} valid, "
+              f"rule tag agreement {report[encoding]['rule_tag_agreement']}")
+
+    for encoding in ENCODINGS:
+        overlaps = [
+            len(tag_set(a.persona_tags) & tag_set(b.persona_tags)) / len(tag_set(a.persona_tags) | tag_set(b.persona_tags))
+            for a, b in zip(personas["verbose"], personas[encoding])
+            if a is not None and b is not None
+        ]
+        entry = report[encoding]
+        entry["tag_jaccard_vs_verbose"] = statistics.fmean(overlaps) if overlaps else None
+        baseline = report["verbose"]
+        entry["degraded"] = (
+            entry["valid_rate"] < baseline["valid_rate"] - tolerance
+            or (
+                entry["rule_tag_agreement"] is not None
+                and baseline["rule_tag_agreement"] is not None
+                and entry["rule_tag_agreement"] < baseline["rule_tag_agreement"] - tolerance
+            )
+        )
+    return report
+
+
+def print_token_report(report: Dict[str, Any], samples: int):
+    print(f"\nPrompt tokens over {samples} answer sets")
+    print(f"{'encoding':<10}{'static':>8}{'prefix':>8}{'answers':>9}{'total':>8}{'saved/req':>11}"
+          f"{'billed':>8}{'saved/req':>11}{'lossless':>10}")
+    for encoding, entry in report.items():
+        print(
+            f"{encoding:<10}{entry['static_tokens']:>8}{entry['cacheable_prefix_tokens']:>8}"
+            f"{entry['answer_tokens']['mean']:>9.1f}{entry['total_tokens']['mean']:>8.1f}"
+            f"{entry['total_tokens_saved_per_request']:>11.1f}{entry['cached_billed_tokens']:>8.1f}"
+            f"{entry['cached_billed_tokens_saved_per_request']:>11.1f}{entry['lossless_samples']:>6}/{samples}"
+        )
+    print("static = template tokens shared by every request, prefix = the cacheable system prompt, "
+          "billed = total with a cached prefix charged at the cache discount")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=200, help="Answer sets to render")
+    parser.add_argument("--input", help="JSONL of stored submissions instead of random answers")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--tokenizer", choices=["auto", "tiktoken", "anthropic", "estimate"], default="auto")
+    parser.add_argument("--live", type=int, default=0, help="Generate personas for this many samples per encoding")
+    parser.add_argument("--provider", choices=["OpenAI", "Gemini", "Claude"], default="OpenAI")
+    parser.add_argument("--cache-discount", type=float, default=0.5,
+                        help="Price reduction for cached prompt prefix tokens (OpenAI 0.5, Anthropic 0.9)")
+    parser.add_argument("--cache-min-tokens", type=int, default=1024,
+                        help="Shortest prefix the provider caches")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed drop in validity/agreement vs verbose")
+    parser.add_argument("--output", help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    samples = load_samples(args)
+    if not samples:
+        parser.error("no valid answer sets to measure")
+    result = {"samples": len(samples), "tokens": token_report(
+        samples, make_counter(args.tokenizer), args.cache_discount, args.cache_min_tokens
+    )}
+    print_token_report(result["tokens"], len(samples))
+
+    if args.live:
+        print(f"\nLive comparison with {args.provider} on {min(args.live, len(samples))} samples")
+        result["live"] = asyncio.run(live_report(samples[:args.live], args.provider, args.tolerance))
+        degraded = [encoding for encoding, entry in result["live"].items() if entry["degraded"]]
+        print("Degraded encodings: " + (", ".join(degraded) if degraded else "none"))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,131 @@
+"""
+Rule-based tagging throughput: hard-coded checks vs compiled rules vs NumPy
+
+Tags the same random submissions three ways:
+
+    legacy    the substring checks generate_persona_rules_based used to run
+              (copied here as the baseline), ending in list(set(tags))[:6]
+    compiled  RuleEngine.tags, one lookup per rule field
+    bulk      BulkTagger: encode to an option-code matrix, then one
+              vectorized pass (timed separately for encode and tagging)
+
+and checks that all three agree on the tag sets (legacy order is arbitrary).
+Each step is timed --repeat times, after a garbage collection, and the best
+run is reported; single runs of the per-submission paths swing by tens of
+percent with allocator and GC state.
+
+Usage:
+    python benchmarks/rule_tagging.py --submissions 300000
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from load_test import random_answers  # noqa: E402
+from rule_engine import BulkTagger, RuleEngine, load_rules  # noqa: E402
+
+
+def legacy_tags(answers: Dict[str, Any]) -> List[str]:
+    """generate_persona_rules_based before the rules were compiled from Data/output.json"""
+    tags = []
+    risk = answers.get("risk_tolerance")
+    if risk:
+        if risk <= 2:
+            tags.append('Low risk, stable')
+        elif risk == 3:
+            tags.append('Mid risk - balanced')
+        elif risk >= 4:
+            tags.append('High risk, high upside')
+    involvement = answers.get("involvement_level")
+    if involvement:
+        if 'Capital partner' in involvement:
+            tags.append('Capital partner')
+        elif 'Co pilot' in involvement:
+            tags.append('Hands-on hybrid')
+        elif 'Operator' in involvement:
+            tags.append('Active operator')
+    horizon = answers.get("time_horizon")
+    if horizon:
+        if 'Less than 2' in horizon:
+            tags.append('Short term')
+        elif '2-4' in horizon:
+            tags.append('Medium term')
+        else:
+            tags.append('Long term')
+    segment = answers.get("customer_segment")
+    if segment:
+        if 'B2C' in segment:
+            tags.append('B2C focused')
+        if 'B2B' in segment:
+            tags.append('B2B focused')
+    experience = answers.get("experience_level")
+    if experience:
+        if 'new' in experience.lower():
+            tags.append('New investor')
+        elif 'seasoned' in experience.lower() or 'small or mid' in experience.lower():
+            tags.append('Experienced operator')
+    focus = answers.get("priority_focus")
+    if focus:
+        if 'People' in focus:
+            tags.append('People first')
+        if 'Process' in focus:
+            tags.append('Systems focused')
+        if 'Profit' in focus:
+            tags.append('Returns driven')
+    return list(set(tags))[:6]
+
+
+def timed(label: str, count: int, fn, repeat: int = 1):
+    seconds = float("inf")
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        started = time.perf_counter()
+        result = fn()
+        seconds = min(seconds, time.perf_counter() - started)
+    print(f"{label:<22}{seconds * 1000:10.1f} ms {count / seconds:14,.0f} submissions/s")
+    return result, seconds
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=300_000)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per step; the best is reported")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    submissions = [random_answers(rng) for _ in range(args.submissions)]
+    engine = RuleEngine(load_rules())
+    bulk = BulkTagger(engine)
+
+    print(f"{args.submissions:,} submissions")
+    repeat = args.repeat
+    legacy, legacy_seconds = timed("legacy", args.submissions, lambda: [legacy_tags(a) for a in submissions], repeat)
+    compiled, _ = timed("compiled", args.submissions, lambda: [engine.tags(a) for a in submissions], repeat)
+    codes, encode_seconds = timed("bulk encode", args.submissions, lambda: bulk.encode(submissions), repeat)
+    matrix, tag_seconds = timed("bulk tag_matrix", args.submissions, lambda: bulk.tag_matrix(codes), repeat)
+    vectorized = bulk.tags(codes)
+    print(f"bulk tagging is {legacy_seconds / tag_seconds:,.0f}x the legacy rate "
+          f"({legacy_seconds / (encode_seconds + tag_seconds):,.1f}x including encoding)")
+
+    mismatches = sum(
+        set(old) != set(new) or new != fast
+        for old, new, fast in zip(legacy, compiled, vectorized)
+    )
+    print(f"tag sets differing from legacy: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
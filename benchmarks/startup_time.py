@@ -0,0 +1,184 @@
+"""
+Cold-start benchmark: import time and time to first 200 on /health
+
+For each provider loading mode (PROVIDER_LOADING=eager, background, lazy)
+this measures, over fresh interpreters:
+
+    import_ms        `import main` inside a new Python process
+    first_health_ms  spawning uvicorn until GET /health first returns 200
+    clients_ready_ms spawning uvicorn until /providers/transport reports all
+                     provider clients built (background mode only; lazy
+                     builds them on the first AI request)
+
+Dummy API keys enable all three providers, and nothing calls them, so no
+network access or credits are needed. Results are written as JSON with the
+commit, so runs can be compared between commits with --compare.
+
+Usage:
+    python benchmarks/startup_time.py --runs 5
+    python benchmarks/startup_time.py --modes eager,background --output before.json
+    python benchmarks/startup_time.py --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from load_test import git_revision  # noqa: E402
+
+MODES = ("eager", "background", "lazy")
+
+IMPORT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+sdks = [name for name in ("openai", "anthropic", "google.genai") if name in sys.modules]
+print(json.dumps({"import_ms": elapsed * 1000, "sdks_imported": sdks}))
+"""
+
+
+def benchmark_env(mode: str) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "PROVIDER_LOADING": mode,
+        "OPENAI_API_KEY": "startup-benchmark",
+        "GOOGLE_API_KEY": "startup-benchmark",
+        "ANTHROPIC_API_KEY": "startup-benchmark",
+        "JOB_QUEUE_ENABLED": "false",
+        "HTTP_WARMUP_ENABLED": "false",
+    }
+
+
+def measure_import(mode: str) -> Dict[str, Any]:
+    process = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT], cwd=REPO_DIR, env=benchmark_env(mode),
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def poll_until(url: str, started: float, timeout: float, ready=lambda response: True) -> Optional[float]:
+    """Milliseconds from `started` until `url` answers 200 and `ready(response)`"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            response = httpx.get(url, timeout=1.0)
+            if response.status_code == 200 and ready(response):
+                return (time.perf_counter() - started) * 1000
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.005)
+    return None
+
+
+def measure_server(mode: str, port: int, timeout: float) -> Dict[str, Any]:
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_DIR, env=benchmark_env(mode), stdout=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        first_health_ms = poll_until(f"{base_url}/health", started, timeout)
+        clients_ready_ms = None
+        if first_health_ms is not None and mode != "lazy":
+            clients_ready_ms = poll_until(
+                f"{base_url}/providers/transport", started, timeout,
+                lambda response: all(client["loaded"] for client in response.json()["clients"].values()),
+            )
+        return {"first_health_ms": first_health_ms, "clients_ready_ms": clients_ready_ms}
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def median(values: List[Optional[float]]) -> Optional[float]:
+    values = [value for value in values if value is not None]
+    return statistics.median(values) if values else None
+
+
+def format_ms(value: Optional[float]) -> str:
+    return f"{value:12.0f}" if value is not None else f"{'-':>12}"
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated provider loading modes")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per mode and measurement")
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for the server")
+    parser.add_argument("--output", help="Result file (default benchmarks/results/startup-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    modes = args.modes.split(",")
+    for mode in modes:
+        if mode not in MODES:
+            parser.error(f"unknown mode {mode!r}; expected one of {', '.join(MODES)}")
+
+    results = {}
+    print(f"{'mode':<12}{'import ms':>12}{'health ms':>12}{'clients ms':>12}  SDKs imported by `import main`")
+    for mode in modes:
+        imports = [measure_import(mode) for _ in range(args.runs)]
+        servers = [measure_server(mode, args.port, args.timeout) for _ in range(args.runs)]
+        results[mode] = {
+            "import_ms": median([run["import_ms"] for run in imports]),
+            "first_health_ms": median([run["first_health_ms"] for run in servers]),
+            "clients_ready_ms": median([run["clients_ready_ms"] for run in servers]),
+            "sdks_imported": imports[0]["sdks_imported"],
+            "runs": {"import": imports, "server": servers},
+        }
+        result = results[mode]
+        print(f"{mode:<12}{format_ms(result['import_ms'])}{format_ms(result['first_health_ms'])}"
+              f"{format_ms(result['clients_ready_ms'])}  {', '.join(result['sdks_imported']) or '-'}")
+
+    revision = git_revision()
+    report = {
+        **revision,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "results": results,
+    }
+    output = args.output
+    if not output:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        output = os.path.join(BENCHMARKS_DIR, "results", f"startup-{revision['commit'] or 'unknown'}-{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            before = json.load(f)
+        print(f"\nCompared with {before.get('commit')} ({before.get('timestamp')}):")
+        for mode, result in results.items():
+            previous = before.get("results", {}).get(mode)
+            if not previous:
+                continue
+            deltas = []
+            for key in ("import_ms", "first_health_ms", "clients_ready_ms"):
+                if previous.get(key) and result.get(key):
+                    change = (result[key] - previous[key]) / previous[key] * 100
+                    deltas.append(f"{key} {previous[key]:.0f} -> {result[key]:.0f} ({change:+.1f}%)")
+            print(f"  {mode}: " + ", ".join(deltas))
+
+
+if __name__ == "__main__":
+    main_cli()
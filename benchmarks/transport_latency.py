@@ -0,0 +1,172 @@
+"""
+First-request and steady-state provider latency per HTTP transport setup
+
+Compares how the provider SDKs reach the network:
+
+    sdk      each SDK on its own default HTTP stack (HTTP_TRANSPORT=sdk)
+    shared   one pooled keep-alive client shared by all SDKs
+    warm     shared, plus the startup warm-up that pre-opens connections
+
+Every mode runs in a fresh subprocess that imports main.py, so the first call
+pays whatever connection setup the mode leaves to it. Calls go straight to
+main.generate_persona_with_<provider>, with rate limiting off, against
+benchmarks/mock_providers.py at a fixed latency (sigma 0), so the difference
+between first and steady calls is connection setup plus first-use overhead.
+The mock speaks plain HTTP: TLS handshakes to the real APIs add more to the
+cold numbers, which --real measures (it uses the configured API keys and
+spends credits).
+
+Usage:
+    python benchmarks/transport_latency.py --calls 20 --median 0.05
+    python benchmarks/transport_latency.py --modes sdk,warm --real --calls 5
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from load_test import stop_servers, wait_until_up  # noqa: E402
+
+MODES = {
+    "sdk": {"HTTP_TRANSPORT": "sdk", "HTTP_WARMUP_ENABLED": "false"},
+    "shared": {"HTTP_TRANSPORT": "shared", "HTTP_WARMUP_ENABLED": "false"},
+    "warm": {"HTTP_TRANSPORT": "shared", "HTTP_WARMUP_ENABLED": "true"},
+}
+PROVIDERS = ("OpenAI", "Gemini", "Claude")
+
+SAMPLE_ANSWERS = {
+    "goal_primary": "I want to invest capital and earn returns",
+    "time_horizon": "4-7 years",
+    "risk_tolerance": 3,
+    "involvement_level": "Co pilot - I support and guide, a manager or founder runs it",
+    "sectors": ["Food and beverage", "Health and wellness"],
+    "experience_level": "I have run a small or mid size business",
+}
+
+
+async def measure(providers: List[str], calls: int) -> Dict[str, Any]:
+    """Child process: time `calls` sequential calls per provider, after the lifespan startup"""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main
+        import_seconds = time.perf_counter() - started
+        warm_started = time.perf_counter()
+        await main.warm_up_providers()
+        warm_up_seconds = time.perf_counter() - warm_started
+        prompt = main.build_persona_prompt(SAMPLE_ANSWERS)
+        results = {}
+        for provider in providers:
+            generate = getattr(main, f"generate_persona_with_{provider.lower()}")
+            latencies, errors = [], 0
+            for _ in range(calls):
+                call_started = time.perf_counter()
+                try:
+                    await generate(prompt)
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - call_started) * 1000)
+            results[provider] = {"latencies_ms": latencies, "errors": errors}
+    return {"import_seconds": import_seconds, "warm_up_seconds": warm_up_seconds, "providers": results}
+
+
+def run_mode(mode: str, args, env: Dict[str, str]) -> Dict[str, Any]:
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", "--calls", str(args.calls), "--providers", args.providers],
+        cwd=REPO_DIR, env={**env, **MODES[mode], "RATE_LIMIT_ENABLED": "false", "PERSONA_CACHE_ENABLED": "false",
+             # SDK import time would otherwise land on the first call
+             "PROVIDER_LOADING": "eager"},
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def summarize(latencies: List[float]) -> Dict[str, Any]:
+    if not latencies:
+        return {"first_ms": None, "steady_p50_ms": None, "steady_p95_ms": None}
+    steady = sorted(latencies[1:]) or latencies
+    return {
+        "first_ms": latencies[0],
+        "steady_p50_ms": statistics.median(steady),
+        "steady_p95_ms": steady[max(0, int(len(steady) * 0.95) - 1)],
+    }
+
+
+def format_ms(value) -> str:
+    return f"{value:10.1f}" if value is not None else f"{'-':>10}"
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated modes to compare")
+    parser.add_argument("--providers", default=",".join(PROVIDERS), help="Comma-separated providers to call")
+    parser.add_argument("--calls", type=int, default=20, help="Sequential calls per provider (the first is the cold one)")
+    parser.add_argument("--median", type=float, default=0.05, help="Mock provider latency in seconds")
+    parser.add_argument("--mock-port", type=int, default=8200)
+    parser.add_argument("--real", action="store_true", help="Call the real provider APIs with the configured keys")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure(args.providers.split(","), args.calls))))
+        return
+
+    for mode in args.modes.split(","):
+        if mode not in MODES:
+            parser.error(f"unknown mode {mode!r}; expected one of {', '.join(MODES)}")
+
+    env = dict(os.environ)
+    processes = []
+    if not args.real:
+        mock_url = f"http://127.0.0.1:{args.mock_port}"
+        processes.append(subprocess.Popen(
+            [sys.executable, os.path.join(BENCHMARKS_DIR, "mock_providers.py"), "--port", str(args.mock_port),
+             "--median", str(args.median), "--sigma", "0"],
+            cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+        env.update({
+            "OPENAI_API_KEY": "mock", "GOOGLE_API_KEY": "mock", "ANTHROPIC_API_KEY": "mock",
+            "OPENAI_BASE_URL": f"{mock_url}/v1",
+            "GOOGLE_GEMINI_BASE_URL": mock_url,
+            "ANTHROPIC_BASE_URL": mock_url,
+        })
+    results = {}
+    try:
+        if processes:
+            wait_until_up(f"{mock_url}/_mock/config")
+        for mode in args.modes.split(","):
+            results[mode] = run_mode(mode, args, env)
+    finally:
+        stop_servers(processes)
+
+    print(f"{'mode':<8}{'provider':<10}{'first ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for mode, result in results.items():
+        for provider, data in result["providers"].items():
+            summary = summarize(data["latencies_ms"])
+            data.update(summary)
+            print(f"{mode:<8}{provider:<10}{format_ms(summary['first_ms'])}{format_ms(summary['steady_p50_ms'])}"
+                  f"{format_ms(summary['steady_p95_ms'])}{data['errors']:>8}")
+        print(f"{'':<8}import {result['import_seconds'] * 1000:.0f}ms, warm-up {result['warm_up_seconds'] * 1000:.0f}ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main_cli()
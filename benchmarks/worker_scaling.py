@@ -0,0 +1,215 @@
+"""
+Throughput scaling with the number of uvicorn worker processes
+
+For each worker count (--workers 1,2,4) the API is started with
+WEB_CONCURRENCY set, pointed at benchmarks/mock_providers.py and at fresh
+SQLite files for the shared provider state, persona cache and job queue, and
+then driven closed-loop: --clients client processes each keep --concurrency
+requests in flight for --duration seconds. Client load is spread over
+processes so the load generator is not the single-core bottleneck it would
+be with one event loop.
+
+A small pool of distinct answer sets (--distinct) is used, so after the
+warm-up /generate-persona is served from the persona cache and the run
+measures the server's own CPU cost (validation, cache lookup, serialization)
+rather than mock provider latency. With several workers most of those hits
+come from the shared SQLite tier the first time a worker sees an answer set.
+/generate-persona/basic is CPU-only to begin with.
+
+After each run /workers is polled until every worker has been seen, so the
+output also confirms all processes joined the shared provider state.
+
+Throughput can only scale up to the number of cores: run this on a
+multi-core machine, with --clients around half the cores.
+
+Usage:
+    python benchmarks/worker_scaling.py --workers 1,2,4,8 --duration 20
+    python benchmarks/worker_scaling.py --endpoints basic --clients 4 --output scaling.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from load_test import ENDPOINTS, git_revision, percentile, random_answers, stop_servers, wait_until_up  # noqa: E402
+
+
+def client_process(base_url: str, path: str, answer_sets: List[Dict[str, Any]], concurrency: int,
+                   duration: float, seed: int, results) -> None:
+    """Closed loop: `concurrency` requests in flight until `duration` runs out"""
+
+    async def run():
+        rng = random.Random(seed)
+        latencies: List[float] = []
+        errors = 0
+        deadline = time.perf_counter() + duration
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=30.0, limits=limits) as client:
+
+            async def loop():
+                nonlocal errors
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        response = await client.post(path, json=rng.choice(answer_sets))
+                        ok = response.status_code == 200
+                    except httpx.HTTPError:
+                        ok = False
+                    if ok:
+                        latencies.append(time.perf_counter() - started)
+                    else:
+                        errors += 1
+
+            await asyncio.gather(*(loop() for _ in range(concurrency)))
+        return latencies, errors
+
+    results.put(asyncio.run(run()))
+
+
+def drive(base_url: str, path: str, answer_sets: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    results = multiprocessing.Queue()
+    clients = [
+        multiprocessing.Process(
+            target=client_process,
+            args=(base_url, path, answer_sets, args.concurrency, args.duration, args.seed + number, results),
+        )
+        for number in range(args.clients)
+    ]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    outcomes = [results.get() for _ in clients]
+    elapsed = time.perf_counter() - started
+    for client in clients:
+        client.join()
+
+    latencies = sorted(latency for client_latencies, _ in outcomes for latency in client_latencies)
+    errors = sum(client_errors for _, client_errors in outcomes)
+    return {
+        "path": path,
+        "ok": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else None,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+    }
+
+
+def seen_workers(base_url: str, expected: int, timeout: float = 10.0) -> List[Dict[str, Any]]:
+    """Live workers in the shared state, waiting for every worker's first sync"""
+    deadline = time.monotonic() + timeout
+    workers: List[Dict[str, Any]] = []
+    while time.monotonic() < deadline:
+        workers = httpx.get(f"{base_url}/workers", timeout=5.0).json()["workers"]
+        if len(workers) >= expected:
+            break
+        time.sleep(0.5)
+    return workers
+
+
+def start_api(workers: int, port: int, mock_url: str, state_dir: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "mock", "GOOGLE_API_KEY": "mock", "ANTHROPIC_API_KEY": "mock",
+        "OPENAI_BASE_URL": f"{mock_url}/v1",
+        "GOOGLE_GEMINI_BASE_URL": mock_url,
+        "ANTHROPIC_BASE_URL": mock_url,
+        "WEB_CONCURRENCY": str(workers),
+        # Fresh files per run, shared by that run's workers
+        "SHARED_STATE_DB": os.path.join(state_dir, "shared_state.db"),
+        "PERSONA_CACHE_DB": os.path.join(state_dir, "persona_cache.db"),
+        "JOB_QUEUE_DB": os.path.join(state_dir, "persona_jobs.db"),
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts to compare")
+    parser.add_argument("--endpoints", default="generate-persona,basic", help=f"Comma-separated, from {', '.join(ENDPOINTS)}")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per endpoint and worker count")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of load before measuring")
+    parser.add_argument("--clients", type=int, default=2, help="Load-generating processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight per client process")
+    parser.add_argument("--distinct", type=int, default=200, help="Distinct answer sets (cache hits after the warm-up)")
+    parser.add_argument("--api-port", type=int, default=8101)
+    parser.add_argument("--mock-port", type=int, default=8201)
+    parser.add_argument("--mock-args", default="--median 0.05", help="Extra arguments for mock_providers.py")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    counts = [int(count) for count in args.workers.split(",")]
+    names = args.endpoints.split(",")
+    rng = random.Random(args.seed)
+    answer_sets = [random_answers(rng) for _ in range(args.distinct)]
+    base_url = f"http://127.0.0.1:{args.api_port}"
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+
+    mock = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARKS_DIR, "mock_providers.py"), "--port", str(args.mock_port),
+         *args.mock_args.split()],
+        cwd=REPO_DIR,
+    )
+    results: Dict[str, Dict[str, Any]] = {name: {} for name in names}
+    print(f"{os.cpu_count()} CPUs, {args.clients} client processes x {args.concurrency} in flight")
+    print(f"{'endpoint':<18}{'workers':>8}{'req/s':>10}{'speedup':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}{'joined':>8}")
+    try:
+        wait_until_up(f"{mock_url}/_mock/config")
+        for count in counts:
+            with tempfile.TemporaryDirectory() as state_dir:
+                api = start_api(count, args.api_port, mock_url, state_dir)
+                try:
+                    wait_until_up(f"{base_url}/health", timeout=60.0)
+                    for name in names:
+                        if args.warmup:
+                            drive(base_url, ENDPOINTS[name], answer_sets, argparse.Namespace(**{**vars(args), "duration": args.warmup}))
+                        result = drive(base_url, ENDPOINTS[name], answer_sets, args)
+                        result["workers_joined"] = len(seen_workers(base_url, count)) if count > 1 else 1
+                        results[name][count] = result
+                        baseline = results[name].get(counts[0])
+                        speedup = result["rps"] / baseline["rps"] if baseline and baseline["rps"] else 0.0
+                        print(
+                            f"{name:<18}{count:>8}{result['rps']:>10.0f}{speedup:>8.2f}x"
+                            f"{result['p50_ms'] or 0:>9.1f}{result['p99_ms'] or 0:>9.1f}{result['errors']:>8}"
+                            f"{result['workers_joined']:>8}"
+                        )
+                finally:
+                    stop_servers([api])
+    finally:
+        stop_servers([mock])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                **git_revision(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "cpus": os.cpu_count(),
+                "config": {key: value for key, value in vars(args).items() if key != "output"},
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,363 @@
+"""
+Offline bulk re-persona pipeline
+
+Re-generates personas for a corpus of stored quiz submissions, e.g. after
+the persona prompt changes. Submissions are streamed from a JSONL file
+(one QuizAnswers object per line, or {"id": ..., "answers": {...}}) and
+generated with bounded concurrency through the same provider chain as the API.
+
+Results are written incrementally to JSONL or SQLite (chosen by the output
+extension). The output doubles as the checkpoint: on restart, lines that
+already have a successful result for the current prompt version are skipped,
+so a crashed run resumes where it stopped. Failed lines are retried.
+
+With --batch-api the corpus is submitted to the OpenAI Batch API instead, and
+the batch id is kept in a state file next to the output so a restarted run
+keeps polling the same batch rather than resubmitting it. Point
+OPENAI_BASE_URL at benchmarks/mock_batch_server.py to try it locally.
+
+Usage:
+    python bulk_repersona.py submissions.jsonl personas.jsonl --concurrency 16
+    python bulk_repersona.py submissions.jsonl personas.db --batch-api
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+import main
+from prompt import PROMPT_VERSION, PersonaPrompt
+
+# USD per million (input, output) tokens, used for the cost estimate
+PRICE_PER_MILLION_TOKENS = {
+    "OpenAI": (0.15, 0.60),
+    "Gemini": (0.10, 0.40),
+    "Claude": (3.00, 15.00),
+}
+# Batch API requests are billed at half the synchronous price
+BATCH_API_DISCOUNT = 0.5
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for cost reporting"""
+    return max(1, len(text) // 4)
+
+
+def read_submissions(path: str) -> Iterator[Tuple[int, Optional[str], Any]]:
+    """
+    Yield (line_number, submission_id, answers) from a JSONL corpus
+
+    `answers` is the exception for lines that are not valid JSON, so they are
+    recorded as failures instead of aborting the run.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, e
+                continue
+            if isinstance(record, dict) and isinstance(record.get("answers"), dict):
+                yield line_number, record.get("id"), record["answers"]
+            else:
+                yield line_number, None, record
+
+
+class JsonlOutput:
+    """Append-only JSONL results; the last record for a line wins"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._trim_partial_line()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _trim_partial_line(self):
+        # A crash can leave half a record at the end of the file
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def completed(self, prompt_version: str) -> Set[int]:
+        status: Dict[int, bool] = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    status[record["line"]] = (
+                        record["status"] == "ok" and record["prompt_version"] == prompt_version
+                    )
+        return {line for line, ok in status.items() if ok}
+
+    def write(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SqliteOutput:
+    """Results table keyed by input line number"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS personas ("
+            "line INTEGER PRIMARY KEY, id TEXT, status TEXT NOT NULL, prompt_version TEXT NOT NULL, "
+            "provider TEXT, persona TEXT, error TEXT, completed_at TEXT NOT NULL)"
+        )
+
+    def completed(self, prompt_version: str) -> Set[int]:
+        rows = self._conn.execute(
+            "SELECT line FROM personas WHERE status = 'ok' AND prompt_version = ?", (prompt_version,)
+        )
+        return {line for (line,) in rows}
+
+    def write(self, record: Dict[str, Any]):
+        persona = record.get("persona")
+        self._conn.execute(
+            "INSERT OR REPLACE INTO personas VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                record["line"], record.get("id"), record["status"], record["prompt_version"],
+                record.get("provider"), json.dumps(persona, ensure_ascii=False) if persona else None,
+                record.get("error"), record["completed_at"],
+            ),
+        )
+
+    def close(self):
+        self._conn.close()
+
+
+def open_output(path: str):
+    if path.endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteOutput(path)
+    return JsonlOutput(path)
+
+
+class Progress:
+    """Throughput and estimated cost, reported periodically to stderr"""
+
+    def __init__(self, skipped: int, interval: float, discount: float = 1.0):
+        self.started = time.perf_counter()
+        self.skipped = skipped
+        self.interval = interval
+        self.discount = discount
+        self.succeeded = 0
+        self.failed = 0
+        self.tokens: Dict[str, list] = {}
+        self._last_report = self.started
+
+    def record(self, provider: Optional[str], prompt: str, output: Optional[str]):
+        if output is None:
+            self.failed += 1
+            return
+        self.succeeded += 1
+        tokens = self.tokens.setdefault(provider or "unknown", [0, 0])
+        tokens[0] += estimate_tokens(prompt)
+        tokens[1] += estimate_tokens(output)
+        if time.perf_counter() - self._last_report >= self.interval:
+            self.report()
+
+    def cost(self) -> float:
+        total = 0.0
+        for provider, (tokens_in, tokens_out) in self.tokens.items():
+            price_in, price_out = PRICE_PER_MILLION_TOKENS.get(provider, (0.0, 0.0))
+            total += (tokens_in * price_in + tokens_out * price_out) / 1_000_000
+        return total * self.discount
+
+    def report(self, final: bool = False):
+        self._last_report = time.perf_counter()
+        elapsed = self._last_report - self.started
+        done = self.succeeded + self.failed
+        rate = done / elapsed if elapsed else 0.0
+        label = "done" if final else "progress"
+        print(
+            f"[{label}] {done} generated ({self.succeeded} ok, {self.failed} failed, {self.skipped} skipped) "
+            f"in {elapsed:.1f}s = {rate:.2f}/s, est. cost ${self.cost():.4f}",
+            file=sys.stderr,
+        )
+        if final:
+            for provider, (tokens_in, tokens_out) in sorted(self.tokens.items()):
+                print(f"  {provider}: ~{tokens_in} input / ~{tokens_out} output tokens", file=sys.stderr)
+
+
+def result_record(line: int, submission_id, persona=None, error: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "line": line,
+        "id": submission_id,
+        "status": "ok" if persona is not None else "failed",
+        "prompt_version": PROMPT_VERSION,
+        "provider": persona.provider if persona is not None else None,
+        "persona": persona.model_dump() if persona is not None else None,
+        "error": error,
+        "completed_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def run_live(args, output, done: Set[int]):
+    """Generate through the live provider chain with bounded concurrency"""
+    progress = Progress(len(done), args.report_interval)
+    slots = asyncio.Semaphore(args.concurrency)
+    tasks = set()
+
+    async def generate(line: int, submission_id, answers):
+        try:
+            if isinstance(answers, Exception):
+                raise answers
+            quiz = main.QuizAnswers(**answers)
+            prompt = main.build_persona_prompt(quiz.model_dump(exclude_none=True))
+            persona = await main.generate_persona_with_ai(quiz)
+        except Exception as e:
+            output.write(result_record(line, submission_id, error=str(getattr(e, "detail", e))))
+            progress.record(None, "", None)
+        else:
+            output.write(result_record(line, submission_id, persona))
+            progress.record(persona.provider, prompt.system + prompt.user, persona.model_dump_json())
+        finally:
+            slots.release()
+
+    for line, submission_id, answers in read_submissions(args.input):
+        if line in done:
+            continue
+        if args.limit is not None and progress.succeeded + progress.failed + len(tasks) >= args.limit:
+            break
+        await slots.acquire()
+        task = asyncio.create_task(generate(line, submission_id, answers))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    progress.report(final=True)
+
+
+async def run_batch_api(args, output, done: Set[int]):
+    """Submit the pending corpus as one OpenAI batch job and collect the results"""
+    client = main.openai_client.get()
+    if client is None:
+        raise SystemExit("--batch-api needs OPENAI_API_KEY (and optionally OPENAI_BASE_URL)")
+    state_path = args.output + ".batch.json"
+    progress = Progress(len(done), args.report_interval, discount=BATCH_API_DISCOUNT)
+
+    prompts: Dict[str, Tuple[int, Any, PersonaPrompt]] = {}
+    for line, submission_id, answers in read_submissions(args.input):
+        if line in done:
+            continue
+        if args.limit is not None and len(prompts) >= args.limit:
+            break
+        try:
+            if isinstance(answers, Exception):
+                raise answers
+            quiz = main.QuizAnswers(**answers)
+        except Exception as e:
+            output.write(result_record(line, submission_id, error=str(e)))
+            progress.record(None, "", None)
+            continue
+        prompts[f"line-{line}"] = (line, submission_id, main.build_persona_prompt(quiz.model_dump(exclude_none=True)))
+
+    if not prompts:
+        progress.report(final=True)
+        return
+
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            batch_id = json.load(f)["batch_id"]
+        print(f"Resuming batch {batch_id}", file=sys.stderr)
+    else:
+        requests_jsonl = "".join(
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": main.openai_chat_params(prompt),
+            }, ensure_ascii=False) + "\n"
+            for custom_id, (_, _, prompt) in prompts.items()
+        )
+        upload = await client.files.create(
+            file=("repersona.jsonl", io.BytesIO(requests_jsonl.encode("utf-8"))),
+            purpose="batch",
+        )
+        batch = await client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        batch_id = batch.id
+        with open(state_path, "w") as f:
+            json.dump({"batch_id": batch_id, "prompt_version": PROMPT_VERSION}, f)
+        print(f"Submitted batch {batch_id} with {len(prompts)} requests", file=sys.stderr)
+
+    while True:
+        batch = await client.batches.retrieve(batch_id)
+        if batch.status in ("completed", "failed", "expired", "cancelled"):
+            break
+        print(f"Batch {batch_id}: {batch.status}", file=sys.stderr)
+        await asyncio.sleep(args.poll_interval)
+
+    if batch.status != "completed" or not batch.output_file_id:
+        os.remove(state_path)
+        raise SystemExit(f"Batch {batch_id} ended with status {batch.status}")
+
+    content = await client.files.content(batch.output_file_id)
+    for raw in content.text.splitlines():
+        if not raw.strip():
+            continue
+        result = json.loads(raw)
+        if result["custom_id"] not in prompts:
+            continue
+        line, submission_id, prompt = prompts[result["custom_id"]]
+        try:
+            if result.get("error"):
+                raise Exception(result["error"])
+            text = result["response"]["body"]["choices"][0]["message"]["content"]
+            persona = main.PersonaResponse(**json.loads(text), generated_at=datetime.now(timezone.utc).isoformat())
+            persona.provider = "OpenAI"
+        except Exception as e:
+            output.write(result_record(line, submission_id, error=str(e)))
+            progress.record(None, "", None)
+        else:
+            output.write(result_record(line, submission_id, persona))
+            progress.record("OpenAI", prompt.system + prompt.user, text)
+
+    os.remove(state_path)
+    progress.report(final=True)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of quiz submissions")
+    parser.add_argument("output", help="Results file (.jsonl, or .db/.sqlite for SQLite)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Generations in flight at once")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many new submissions")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between progress reports")
+    parser.add_argument("--batch-api", action="store_true", help="Submit through the OpenAI Batch API")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="Seconds between batch status polls")
+    args = parser.parse_args()
+
+    output = open_output(args.output)
+    try:
+        done = output.completed(PROMPT_VERSION)
+        if done:
+            print(f"Resuming: {len(done)} submissions already done for prompt {PROMPT_VERSION}", file=sys.stderr)
+        runner = run_batch_api if args.batch_api else run_live
+        asyncio.run(runner(args, output, done))
+    finally:
+        output.close()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -8,22 +8,32 @@ import { Button } from './components/ui/Button';
 // Default API URL (can be overridden by .env)
 const API_URL = import.meta.env.VITE_API_URL || 'https://investor-dna-559078627637.asia-south1.run.app';
 
+// One id per quiz run: progress posts let the backend start generating early,
+// and the final submit picks that generation up
+const newSessionId = () => (crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`);
+
 function App() {
   const [view, setView] = useState('intro'); // intro, quiz, result
   const [isLoading, setIsLoading] = useState(false);
   const [personaResult, setPersonaResult] = useState(null);
   const [inputData, setInputData] = useState(null);
   const [error, setError] = useState(null);
+  const [sessionId, setSessionId] = useState(newSessionId);
 
   const startQuiz = () => setView('quiz');
 
+  const handleQuizProgress = (answers) => {
+    // Best effort: a lost progress post only means no head start
+    axios.post(`${API_URL}/quiz/progress`, { session_id: sessionId, answers }).catch(() => {});
+  };
+
   const handleQuizSubmit = async (answers) => {
     setIsLoading(true);
     setInputData(answers);
     setError(null);
 
     try {
-      const response = await axios.post(`${API_URL}/generate-persona`, answers);
+      const response = await axios.post(`${API_URL}/generate-persona`, answers, { params: { session_id: sessionId } });
       setPersonaResult(response.data);
       setView('result');
     } catch (err) {
@@ -37,6 +47,7 @@ function App() {
   const resetQuiz = () => {
     setPersonaResult(null);
     setInputData(null);
+    setSessionId(newSessionId());
     setView('intro');
   };
 
@@ -96,7 +107,7 @@ function App() {
                   {error}
                 </div>
               )}
-              <QuizView onSubmit={handleQuizSubmit} isLoading={isLoading} />
+              <QuizView onSubmit={handleQuizSubmit} onProgress={handleQuizProgress} isLoading={isLoading} />
             </motion.div>
           )}
 
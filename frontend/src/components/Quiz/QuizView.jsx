@@ -14,7 +14,7 @@ const STEPS = [
     { id: 'structures', title: 'Final Details', description: 'Deal types and unique insights' }
 ];
 
-const QuizView = ({ onSubmit, isLoading }) => {
+const QuizView = ({ onSubmit, onProgress, isLoading }) => {
     const [currentStep, setCurrentStep] = useState(0);
     const [answers, setAnswers] = useState({
         risk_tolerance: 3,
@@ -40,7 +40,10 @@ const QuizView = ({ onSubmit, isLoading }) => {
     };
 
     const nextStep = () => {
-        if (currentStep < STEPS.length - 1) setCurrentStep(c => c + 1);
+        if (currentStep < STEPS.length - 1) {
+            onProgress?.(answers);
+            setCurrentStep(c => c + 1);
+        }
         else onSubmit(answers);
     };
 
@@ -0,0 +1,197 @@
+"""
+Hedged provider racing for persona generation
+
+The primary provider is started first. If it has not answered within its hedge
+delay (by default its rolling p90 latency), the next provider is started in
+parallel; a provider that fails outright is replaced immediately, whether or
+not other calls are still running. The first successful result wins, every
+other call is cancelled, and the whole race is bounded by a per-request
+deadline.
+
+Latencies are learned from winners and from the calls that were still running
+when the race ended (cancelled losers and calls cut off by the deadline), so a
+provider that is usually beaten or times out still raises its own delay.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class AllProvidersFailed(Exception):
+    """Every provider in the race raised"""
+
+    def __init__(self, errors: List[Tuple[str, Exception]]):
+        self.errors = errors
+        super().__init__("; ".join(f"{name}: {error}" for name, error in errors))
+
+
+class DeadlineExceeded(Exception):
+    """No provider answered before the request deadline"""
+
+    def __init__(self, deadline: float, errors: List[Tuple[str, Exception]], timed_out: List[str] = ()):
+        self.deadline = deadline
+        self.errors = errors
+        self.timed_out = list(timed_out)
+        super().__init__(f"No provider answered within {deadline:.1f}s")
+
+
+class LatencyTracker:
+    """Rolling window of call latencies (seconds) for one provider"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+        return ordered[rank]
+
+
+class HedgePolicy:
+    """
+    Decides how long to wait on a provider before hedging to the next one
+
+    Until a provider has `min_samples` latency samples the fixed
+    `default_delay` is used; after that the delay is its rolling
+    `percentile` latency. `enabled=False` gives plain sequential fallback.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        default_delay: float = 4.0,
+        percentile: float = 90,
+        min_samples: int = 20,
+        window: int = 200,
+    ):
+        self.enabled = enabled
+        self.default_delay = default_delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.trackers: Dict[str, LatencyTracker] = {}
+
+    def tracker(self, provider: str) -> LatencyTracker:
+        if provider not in self.trackers:
+            self.trackers[provider] = LatencyTracker(self.window)
+        return self.trackers[provider]
+
+    def record_unfinished(self, provider: str, seconds: float):
+        """
+        A call that was still running after `seconds` (cancelled or timed out)
+
+        Its latency is at least that long. The lower bound is only recorded
+        when it exceeds the current delay: a hedge cancelled just after it
+        was launched says nothing about how slow the provider is.
+        """
+        if seconds > self.hedge_delay(provider):
+            self.tracker(provider).record(seconds)
+
+    def hedge_delay(self, provider: str) -> float:
+        if not self.enabled:
+            return math.inf
+        tracker = self.tracker(provider)
+        if len(tracker) < self.min_samples:
+            return self.default_delay
+        return tracker.percentile(self.percentile)
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "samples": len(tracker),
+                "p50_seconds": tracker.percentile(50),
+                f"p{self.percentile:g}_seconds": tracker.percentile(self.percentile),
+                "hedge_delay_seconds": self.hedge_delay(name) if self.enabled else None,
+            }
+            for name, tracker in self.trackers.items()
+        }
+
+
+ProviderCall = Tuple[str, Callable[[], Awaitable]]
+
+
+async def race_providers(
+    calls: Sequence[ProviderCall],
+    policy: HedgePolicy,
+    deadline: float,
+    log: Callable[[str], None] = print,
+    release: Optional[Callable[[str], None]] = None,
+):
+    """
+    Run provider calls with hedging and return (provider_name, result)
+
+    Raises AllProvidersFailed if every provider raised, or DeadlineExceeded if
+    none succeeded within `deadline` seconds. Losing calls are cancelled (and
+    their running time recorded), and `release(name)` is called for every
+    provider that was never started, so a half-open probe claimed for it is
+    handed back.
+    """
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    queue = list(calls)
+    pending: Dict[asyncio.Task, Tuple[str, float]] = {}
+    errors: List[Tuple[str, Exception]] = []
+    next_hedge_at = math.inf
+
+    def launch(reason: str):
+        nonlocal next_hedge_at
+        name, call = queue.pop(0)
+        log(f"Attempting generation with {name} ({reason})...")
+        pending[asyncio.ensure_future(call())] = (name, time.perf_counter())
+        next_hedge_at = loop.time() + policy.hedge_delay(name)
+
+    try:
+        launch("primary")
+        while pending or queue:
+            if not pending:
+                launch("fallback")
+                continue
+
+            wake_at = min(end, next_hedge_at) if queue else end
+            done, _ = await asyncio.wait(
+                pending, timeout=max(0.0, wake_at - loop.time()), return_when=asyncio.FIRST_COMPLETED
+            )
+
+            failed = 0
+            for task in done:
+                name, started = pending.pop(task)
+                error = task.exception()
+                if error is None:
+                    policy.tracker(name).record(time.perf_counter() - started)
+                    return name, task.result()
+                log(f"{name} failed: {error}")
+                errors.append((name, error))
+                failed += 1
+            # Each failure is replaced now rather than at the next hedge time
+            for _ in range(min(failed, len(queue))):
+                launch("fallback")
+
+            if not done:
+                if loop.time() >= end:
+                    raise DeadlineExceeded(deadline, errors, [name for name, _ in pending.values()])
+                if queue and loop.time() >= next_hedge_at:
+                    launch("hedge")
+
+        raise AllProvidersFailed(errors)
+    finally:
+        now = time.perf_counter()
+        for name, started in pending.values():
+            policy.record_unfinished(name, now - started)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        if release is not None:
+            for name, _ in queue:
+                release(name)
@@ -0,0 +1,171 @@
+"""
+Shared pooled HTTP transport for the provider SDKs
+
+The OpenAI, Anthropic and Gemini clients all speak HTTP through httpx, so a
+pooled client with tuned limits is handed to all three instead of each
+building its own default stack. Recent OpenAI and Anthropic SDKs are built on
+the `httpx2` fork and reject `httpx` objects, so `PooledClients` keeps one
+client per httpx package, each with the same settings, and SDKs on the same
+package share it. Connections are kept alive between calls
+(HTTP/2 when the optional `h2` package is installed, so concurrent calls to
+one provider share a connection), timeouts are explicit rather than the SDKs'
+ten-minute defaults, and `warm_up` can open the TCP and TLS connections to
+each provider before the first user request needs them.
+"""
+
+import asyncio
+import importlib
+import importlib.util
+import os
+import threading
+import time
+from types import ModuleType
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+
+class TransportConfig:
+    """Pool and timeout settings, read from HTTP_* environment variables by `from_env`"""
+
+    def __init__(
+        self,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        write_timeout: float = 10.0,
+        pool_timeout: float = 5.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        http2: bool = True,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.pool_timeout = pool_timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        # HTTP/2 needs the h2 package; without it httpx would refuse to start
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+
+    @classmethod
+    def from_env(cls) -> "TransportConfig":
+        return cls(
+            connect_timeout=float(os.environ.get("HTTP_CONNECT_TIMEOUT_SECONDS", "5")),
+            read_timeout=float(os.environ.get("HTTP_READ_TIMEOUT_SECONDS", "60")),
+            write_timeout=float(os.environ.get("HTTP_WRITE_TIMEOUT_SECONDS", "10")),
+            pool_timeout=float(os.environ.get("HTTP_POOL_TIMEOUT_SECONDS", "5")),
+            max_connections=int(os.environ.get("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            keepalive_expiry=float(os.environ.get("HTTP_KEEPALIVE_EXPIRY_SECONDS", "60")),
+            http2=os.environ.get("HTTP2_ENABLED", "true").lower() == "true",
+        )
+
+    def timeout(self, module: ModuleType = httpx):
+        return module.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+    def limits(self, module: ModuleType = httpx):
+        return module.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "connect_timeout_seconds": self.connect_timeout,
+            "read_timeout_seconds": self.read_timeout,
+            "write_timeout_seconds": self.write_timeout,
+            "pool_timeout_seconds": self.pool_timeout,
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry_seconds": self.keepalive_expiry,
+            "http2": self.http2,
+        }
+
+
+def build_http_client(config: TransportConfig, module: ModuleType = httpx):
+    """A pooled AsyncClient from `module` (httpx or a compatible fork such as httpx2)"""
+    return module.AsyncClient(timeout=config.timeout(module), limits=config.limits(module), http2=config.http2)
+
+
+def httpx_module(sdk: ModuleType) -> ModuleType:
+    """
+    The httpx package an SDK's default HTTP client is built on
+
+    Read from the base classes of the SDK's `DefaultAsyncHttpxClient`; SDKs
+    too old to export one use httpx.
+    """
+    default_client = getattr(sdk, "DefaultAsyncHttpxClient", None)
+    for cls in getattr(default_client, "__mro__", ()):
+        package = cls.__module__.partition(".")[0]
+        if cls.__name__ == "AsyncClient" and package != sdk.__name__.partition(".")[0]:
+            return importlib.import_module(package)
+    return httpx
+
+
+class PooledClients:
+    """One pooled AsyncClient per httpx package, built on first request"""
+
+    def __init__(self, config: TransportConfig):
+        self.config = config
+        self.clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, module: ModuleType = httpx):
+        with self._lock:
+            if module.__name__ not in self.clients:
+                self.clients[module.__name__] = build_http_client(self.config, module)
+            return self.clients[module.__name__]
+
+    async def aclose(self):
+        for client in list(self.clients.values()):
+            await client.aclose()
+        self.clients.clear()
+
+
+def origin(url: str) -> str:
+    parts = urlsplit(str(url))
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+async def warm_up(
+    client,
+    urls: Iterable[str],
+    connections: int = 1,
+    timeout: float = 5.0,
+) -> Dict[str, Dict[str, object]]:
+    """
+    Open `connections` pooled connections to each URL's origin
+
+    Each connection is established by a HEAD request to the origin; the
+    status does not matter, only that DNS, TCP and TLS are done and the
+    connection is back in the pool. Failures are reported, never raised.
+    """
+
+    async def open_connection(url: str) -> Optional[str]:
+        try:
+            await client.head(url, timeout=timeout)
+        except Exception as e:
+            # httpx.HTTPError or its counterpart in the client's own package
+            return str(e) or type(e).__name__
+        return None
+
+    async def warm_origin(url: str) -> Dict[str, object]:
+        started = time.perf_counter()
+        errors = [e for e in await asyncio.gather(*(open_connection(url) for _ in range(connections))) if e]
+        return {
+            "seconds": time.perf_counter() - started,
+            "connections": connections - len(errors),
+            "error": errors[0] if errors else None,
+        }
+
+    origins = list(dict.fromkeys(origin(url) for url in urls))
+    return dict(zip(origins, await asyncio.gather(*(warm_origin(url) for url in origins))))
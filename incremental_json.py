@@ -0,0 +1,78 @@
+"""
+Incremental parsing of a streamed JSON object
+
+LLM providers stream the persona JSON a few tokens at a time. The parser is fed
+those text chunks and hands back each top-level member as soon as its value
+is complete, so a field like `persona_tags` can be shown long before the
+whole object has arrived.
+"""
+
+import json
+from typing import Any, List, Tuple
+
+
+class IncrementalObjectParser:
+    """
+    Yields (key, value) pairs for the top-level members of one JSON object
+
+    Text before the opening brace (such as a ```json fence) and anything after
+    the closing brace is ignored.
+    """
+
+    def __init__(self):
+        self._member: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.started = False
+        self.complete = False
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk and return the members it completed, in order"""
+        members = []
+        for ch in text:
+            if self.complete:
+                break
+            if not self.started:
+                if ch == "{":
+                    self.started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                self._member.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.complete = True
+                    member = self._finish_member()
+                    if member is not None:
+                        members.append(member)
+                    continue
+            elif ch == "," and self._depth == 1:
+                member = self._finish_member()
+                if member is not None:
+                    members.append(member)
+                continue
+            self._member.append(ch)
+        return members
+
+    def _finish_member(self):
+        text = "".join(self._member).strip()
+        self._member = []
+        if not text:
+            return None
+        # One "key": value pair is itself a valid object body
+        return next(iter(json.loads("{" + text + "}").items()))
@@ -0,0 +1,297 @@
+"""
+Durable persona job queue backed by SQLite
+
+`POST /jobs` only writes a row, so no HTTP request or instance is held open
+for the length of an LLM call, and a restart loses nothing: jobs that were
+running when the process died have an expired lease and are picked up again.
+
+A pool of `JobWorkers` drains the queue through a handler coroutine. Failed
+attempts are retried with exponential backoff and full jitter (so a provider
+outage does not turn into synchronized retry waves) until `max_attempts`.
+`max_depth` bounds the number of queued jobs; past it `enqueue` raises
+`QueueFull` so callers can shed load instead of growing the backlog.
+
+The queue methods block on SQLite (claims wait for the write lock), so async
+code calls them through `asyncio.to_thread`, as the workers do, rather than
+on the event loop.
+"""
+
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class QueueFull(Exception):
+    pass
+
+
+class SQLiteJobQueue:
+    """
+    Jobs table with statuses queued -> running -> done | failed
+
+    A claimed job holds a lease; a running job whose lease expired (the
+    worker crashed or the process restarted) is claimable again.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_depth: int = 10000,
+        max_attempts: int = 3,
+        lease_seconds: float = 120,
+        retry_base_seconds: float = 2,
+        retry_max_seconds: float = 60,
+        ttl_seconds: float = 86400,
+    ):
+        self.path = path
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.ttl_seconds = ttl_seconds
+        self.enqueued = 0
+        self.rejected = 0
+        self.retries = 0
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL, "
+            "result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, available_at REAL NOT NULL, "
+            "started_at REAL, finished_at REAL, lease_expires REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_available ON jobs (status, available_at)")
+
+    def enqueue(self, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            depth = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if depth >= self.max_depth:
+                self.rejected += 1
+                raise QueueFull(f"{depth} jobs queued (limit {self.max_depth})")
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, payload, created_at, available_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, json.dumps(payload, ensure_ascii=False), now, now),
+            )
+            self.enqueued += 1
+        return job_id
+
+    def claim(self) -> Optional[Tuple[str, Dict[str, Any], int, float]]:
+        """
+        Take the oldest available job: (id, payload, attempt number, seconds
+        it waited since it was enqueued), or None when nothing is due
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Two index-friendly lookups rather than one OR across statuses
+                row = self._conn.execute(
+                    "SELECT id, payload, attempts, created_at FROM jobs "
+                    "WHERE status = 'running' AND lease_expires < ? LIMIT 1",
+                    (now,),
+                ).fetchone() or self._conn.execute(
+                    "SELECT id, payload, attempts, created_at FROM jobs "
+                    "WHERE status = 'queued' AND available_at <= ? ORDER BY available_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                        "started_at = ?, lease_expires = ? WHERE id = ?",
+                        (now, now + self.lease_seconds, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, payload, attempts, created_at = row
+        return job_id, json.loads(payload), attempts + 1, now - created_at
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, finished_at = ?, lease_expires = NULL WHERE id = ?",
+                (json.dumps(result, ensure_ascii=False), time.time(), job_id),
+            )
+            self.completed += 1
+
+    def retry_or_fail(self, job_id: str, attempt: int, error: str, fallback: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Requeue a failed attempt after a jittered backoff, or mark the job
+        failed (storing `fallback` as its result) once attempts run out.
+        Returns True if the job will be retried.
+        """
+        now = time.time()
+        if attempt < self.max_attempts:
+            delay = random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt))
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = ?, available_at = ?, lease_expires = NULL WHERE id = ?",
+                    (error, now + delay, job_id),
+                )
+                self.retries += 1
+            return True
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, result = ?, finished_at = ?, lease_expires = NULL WHERE id = ?",
+                (error, json.dumps(fallback, ensure_ascii=False) if fallback is not None else None, now, job_id),
+            )
+            self.failed += 1
+        return False
+
+    def release(self, job_id: str):
+        """Return a running job to the queue without counting the interrupted attempt"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = attempts - 1, lease_expires = NULL "
+                "WHERE id = ? AND status = 'running'",
+                (job_id,),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, result, error, attempts, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        status, result, error, attempts, created_at, started_at, finished_at = row
+        return {
+            "job_id": job_id,
+            "status": status,
+            "result": json.loads(result) if result is not None else None,
+            "error": error,
+            "attempts": attempts,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+        }
+
+    def purge(self) -> int:
+        """Delete finished jobs older than ttl_seconds"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+        return cursor.rowcount
+
+    def depth(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def oldest_queued_age(self) -> float:
+        """Seconds the oldest still-queued job has been waiting since it was enqueued"""
+        with self._lock:
+            oldest = self._conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        return time.time() - oldest if oldest is not None else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "depth": self.depth(),
+            "oldest_queued_age_seconds": self.oldest_queued_age(),
+            "max_depth": self.max_depth,
+            "max_attempts": self.max_attempts,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+class JobWorkers:
+    """
+    Fixed pool of coroutines draining a SQLiteJobQueue
+
+    `handler(payload)` returns the job result; an exception counts as a failed
+    attempt and is retried per the queue's policy. When attempts run out,
+    `fallback(payload, error)` supplies the result stored with the failure.
+    Idle workers sleep until `notify()` or `poll_seconds`, whichever is first;
+    polling also picks up retries whose backoff has elapsed.
+    """
+
+    def __init__(
+        self,
+        queue: SQLiteJobQueue,
+        handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        fallback: Optional[Callable[[Dict[str, Any], str], Dict[str, Any]]] = None,
+        concurrency: int = 4,
+        poll_seconds: float = 1.0,
+        on_claim: Optional[Callable[[float], None]] = None,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.fallback = fallback
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        # Called with the seconds each claimed job spent waiting in the queue
+        self.on_claim = on_claim
+        self.busy = 0
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            claimed = await asyncio.to_thread(self.queue.claim)
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id, payload, attempt, waited = claimed
+            if self.on_claim is not None:
+                self.on_claim(waited)
+            self.busy += 1
+            try:
+                result = await self.handler(payload)
+            except asyncio.CancelledError:
+                # Shutdown: hand the job back so the next start picks it up straight away
+                await asyncio.to_thread(self.queue.release, job_id)
+                raise
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                fallback = None
+                if self.fallback is not None and attempt >= self.queue.max_attempts:
+                    fallback = self.fallback(payload, error)
+                retried = await asyncio.to_thread(self.queue.retry_or_fail, job_id, attempt, error, fallback)
+                print(f"Job {job_id} attempt {attempt} failed ({'retrying' if retried else 'giving up'}): {error}")
+            else:
+                await asyncio.to_thread(self.queue.complete, job_id, result)
+            finally:
+                self.busy -= 1
@@ -0,0 +1,113 @@
+"""
+Tolerant recovery of a JSON object from LLM output
+
+Even with structured outputs, a response can arrive wrapped in a ```json
+fence, with prose around it, with trailing commas, or cut off mid-object when
+the model hits its token limit. Re-asking another provider for that costs a
+full round trip, so these cases are repaired locally when possible.
+
+`repair_json_object` applies the cheapest fix that works and reports which
+one was needed, so recovery rates can be tracked per repair kind.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+FENCE_PATTERN = re.compile(r"```(?:json|JSON)?\s*(.*?)\s*```", re.DOTALL)
+TRAILING_COMMA_PATTERN = re.compile(r",(\s*[}\]])")
+
+
+def _loads_object(text: str) -> Optional[Dict[str, Any]]:
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def _outer_object(text: str) -> Optional[str]:
+    """Text from the first '{' to the last '}' (drops fences and prose around the object)"""
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1:
+        return None
+    return text[start:end + 1] if end > start else text[start:]
+
+
+def _close_truncated(text: str) -> Optional[str]:
+    """
+    Close a JSON object that was cut off
+
+    Scans the text tracking strings and open brackets, cuts back to the last
+    point where a complete member ended, and appends the missing closers.
+    """
+    stack: List[str] = []
+    in_string = False
+    escape = False
+    # Position after the last complete value inside the object, with the stack at that point
+    safe: Optional[Tuple[int, List[str]]] = None
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack:
+                return None
+            stack.pop()
+            if not stack:
+                return text[:i + 1]
+            safe = (i + 1, list(stack))
+        elif ch == ",":
+            safe = (i, list(stack))
+
+    if not stack:
+        return None
+    if safe is None:
+        return "{}"
+    cut, open_brackets = safe
+    return text[:cut] + "".join(reversed(open_brackets))
+
+
+def repair_json_object(text: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Parse `text` as a JSON object, repairing it if needed
+
+    Returns (object, repair), where repair is None for clean JSON or one of
+    "extracted" (fence or prose removed), "trailing_comma" or "truncated".
+    Raises ValueError when nothing recovers an object.
+    """
+    data = _loads_object(text)
+    if data is not None:
+        return data, None
+
+    fenced = FENCE_PATTERN.search(text)
+    candidate = fenced.group(1) if fenced else _outer_object(text)
+    if candidate is None:
+        raise ValueError("no JSON object found in response")
+    data = _loads_object(candidate)
+    if data is not None:
+        return data, "extracted"
+
+    without_commas = TRAILING_COMMA_PATTERN.sub(r"\1", candidate)
+    data = _loads_object(without_commas)
+    if data is not None:
+        return data, "trailing_comma"
+
+    # Output cut off mid-object: close it, scanning from the first brace to the end
+    closed = _close_truncated(TRAILING_COMMA_PATTERN.sub(r"\1", text[text.find("{"):]))
+    if closed is not None:
+        data = _loads_object(closed)
+        if data is not None:
+            return data, "truncated"
+
+    raise ValueError("response is not a recoverable JSON object")
@@ -0,0 +1,57 @@
+"""
+Provider SDK clients built on first use
+
+Importing `openai`, `anthropic` and `google.genai` takes longer than
+starting the rest of the API, and an instance that only serves rule-based
+tags or health checks never needs them. Each client is described by a
+factory that does its own SDK import; `get()` runs it once, on the first AI
+request or from the background preload that starts after the server is up.
+Request handlers use `aget()`, which runs a first build in a worker thread so
+the import never blocks the event loop.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class LazyClient:
+    """
+    A provider client created by `factory` the first time it is needed
+
+    `enabled=False` (no API key) makes `get()` return None without importing
+    anything. The lock lets the background preload thread and a request's
+    `aget()` thread race for the first build safely.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], enabled: bool = True):
+        self.name = name
+        self.factory = factory
+        self.enabled = enabled
+        self.client: Optional[Any] = None
+        self.load_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.client is not None
+
+    def get(self) -> Optional[Any]:
+        if self.client is not None or not self.enabled:
+            return self.client
+        with self._lock:
+            if self.client is None:
+                started = time.perf_counter()
+                self.client = self.factory()
+                self.load_seconds = time.perf_counter() - started
+        return self.client
+
+    async def aget(self) -> Optional[Any]:
+        """`get()` for async code: a client not built yet is built off the event loop"""
+        if self.client is not None or not self.enabled:
+            return self.client
+        return await asyncio.to_thread(self.get)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "loaded": self.loaded, "load_seconds": self.load_seconds}
@@ -3,26 +3,77 @@ AI-Powered Investor Persona Generation API
 Uses OpenAI (with Gemini and Claude fallback) to generate nuanced investor personas from quiz responses
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
-import anthropic
-import openai
-from google import genai
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import TYPE_CHECKING, List, Optional, Dict, Any, AsyncIterator, Awaitable, Callable, Union
+import asyncio
+import inspect
+import time
+import httpx
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 import json
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from prompt import PERSONA_GENERATION_PROMPT
+from prompt import PROMPT_ENCODING, PROMPT_TEMPLATES, PROMPT_VERSION, PersonaPrompt
+from quiz_encoding import encode_answers
+from hedging import AllProvidersFailed, DeadlineExceeded, HedgePolicy, race_providers
+from persona_cache import LRUCache, PersonaCache, SQLitePersonaStore, persona_cache_key
+from persona_index import PersonaIndex, parse_weights
+from archetypes import ArchetypeKeys, ArchetypeStore
+from packed_answers import AnswerCodec
+from singleflight import SingleFlight
+from speculation import SpeculativeSessions
+from incremental_json import IncrementalObjectParser
+from json_repair import repair_json_object
+from persona_jobs import JobLimitExceeded, PersonaJob, PersonaJobs, SQLiteJobStore
+from webhooks import CallbackPolicy, CallbackRejected
+from job_queue import JobWorkers, QueueFull, SQLiteJobQueue
+from http_transport import PooledClients, TransportConfig, httpx_module, warm_up
+from lazy_clients import LazyClient
+from rate_limits import ProviderThrottled, RateLimitScheduler
+from router import ProviderRouter
+from shared_state import SharedProviderStats
+from rule_engine import RuleEngine, load_rules
+from opportunities import OpportunityIndex, load_catalog
+from token_usage import TokenUsage
+from metrics import MetricsMiddleware, MetricsRegistry, current_endpoint
 import warnings
 
+if TYPE_CHECKING:
+    from google.genai import types as genai_types
+
 # Suppress Pydantic warnings from third-party libraries (like google-genai)
 warnings.filterwarnings("ignore", message='Field name ".*" shadows an attribute in parent "Operation"')
 
 load_dotenv()
 
-app = FastAPI(title="Investor Persona Generator API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs once startup is complete, so it never delays the first /health
+    preload = None
+    if PROVIDER_LOADING == "background" or HTTP_WARMUP_ENABLED:
+        preload = asyncio.create_task(preload_providers())
+    seeding = None
+    if persona_index is not None and persona_cache.persistent is not None:
+        seeding = asyncio.create_task(seed_persona_index())
+    await start_job_workers()
+    if shared_provider_stats is not None:
+        shared_provider_stats.start()
+    yield
+    if preload is not None:
+        preload.cancel()
+    if seeding is not None:
+        seeding.cancel()
+    await stop_job_workers()
+    if shared_provider_stats is not None:
+        await shared_provider_stats.stop()
+    if http_clients is not None:
+        await http_clients.aclose()
+
+app = FastAPI(title="Investor Persona Generator API", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -33,24 +84,226 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus-style metrics (GET /metrics). Recording is a dict update per
+# sample; component stats are only read when /metrics is scraped.
+metrics_registry = MetricsRegistry()
+request_seconds = metrics_registry.histogram(
+    "persona_http_request_duration_seconds", "Request latency by route", ["endpoint", "method", "status"]
+)
+stage_seconds = metrics_registry.histogram(
+    "persona_generation_stage_seconds",
+    "Time spent per generation stage: prompt_build, network, parse, validate",
+    ["endpoint", "provider", "stage"]
+)
+generations_total = metrics_registry.counter(
+    "persona_generations_total", "AI personas served, by the provider (or cache) that produced them", ["endpoint", "provider"]
+)
+fallbacks_total = metrics_registry.counter(
+    "persona_fallbacks_total",
+    "Fallbacks taken: kind=provider when a later provider served the request, kind=nearest when the persona of the closest "
+    "stored answers was served, kind=rules when rule-based tags were returned",
+    ["endpoint", "kind"]
+)
+parses_total = metrics_registry.counter(
+    "persona_parses_total", "Provider responses parsed into a persona", ["provider"]
+)
+parse_failures_total = metrics_registry.counter(
+    "persona_parse_failures_total",
+    "Provider responses rejected as unrecoverable JSON (parse) or by the schema (validate); each one costs a fallback call",
+    ["provider", "stage"]
+)
+parse_repairs_total = metrics_registry.counter(
+    "persona_parse_repairs_total",
+    "Malformed provider responses recovered locally, by repair: extracted, trailing_comma, truncated",
+    ["provider", "repair"]
+)
+webhook_deliveries_total = metrics_registry.counter(
+    "persona_webhook_deliveries_total", "Progressive persona webhook deliveries by result: delivered, failed, rejected (callback host no longer allowed)", ["result"]
+)
+queue_wait_seconds = metrics_registry.histogram(
+    "persona_job_queue_wait_seconds", "Time queued jobs waited before a worker picked them up"
+)
+rate_limit_wait_seconds = metrics_registry.histogram(
+    "persona_rate_limit_wait_seconds", "Time provider calls waited for rate-limit capacity", ["provider"]
+)
+app.add_middleware(MetricsMiddleware, histogram=request_seconds)
+
+
+# Provider models (part of the persona cache key)
+OPENAI_MODEL = "gpt-4o-mini"
+GEMINI_MODEL = "gemini-2.0-flash"
+CLAUDE_MODEL = "claude-3-sonnet-20240229"
+MODEL_CHAIN = f"{OPENAI_MODEL}|{GEMINI_MODEL}|{CLAUDE_MODEL}"
 
-# OpenAI Client
-if os.environ.get("OPENAI_API_KEY"):
-    openai_client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-else:
-    openai_client = None
+# Provider HTTP transport: with HTTP_TRANSPORT=shared (default) the SDKs send
+# through pooled keep-alive clients with explicit timeouts, one per httpx
+# package they are built on; "sdk" leaves each SDK on its own default stack.
+HTTP_TRANSPORT = os.environ.get("HTTP_TRANSPORT", "shared")
+transport_config = TransportConfig.from_env()
+http_clients = PooledClients(transport_config) if HTTP_TRANSPORT == "shared" else None
+# Provider -> the pooled client its SDK was given, for the warm-up
+provider_http_clients: Dict[str, Any] = {}
+# Opens connections to each configured provider once the server is up
+HTTP_WARMUP_ENABLED = os.environ.get("HTTP_WARMUP_ENABLED", "false").lower() == "true"
+HTTP_WARMUP_CONNECTIONS = int(os.environ.get("HTTP_WARMUP_CONNECTIONS", "2"))
+HTTP_WARMUP_TIMEOUT_SECONDS = float(os.environ.get("HTTP_WARMUP_TIMEOUT_SECONDS", "5"))
+# The SDKs read the same variables; the warm-up needs the URLs without loading them
+PROVIDER_BASE_URLS = {
+    "OpenAI": os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+    "Gemini": os.environ.get("GOOGLE_GEMINI_BASE_URL", "https://generativelanguage.googleapis.com"),
+    "Claude": os.environ.get("ANTHROPIC_BASE_URL", "https://api.anthropic.com"),
+}
 
-# Google Gemini Configuration
-if os.environ.get("GOOGLE_API_KEY"):
-    gemini_client = genai.Client(api_key=os.environ.get("GOOGLE_API_KEY"))
-else:
-    gemini_client = None
+# Provider SDK loading: "background" (default) imports the SDKs and builds the
+# clients in a thread after startup, "lazy" in a thread on the first AI
+# request, and "eager" at import time as before.
+PROVIDER_LOADING = os.environ.get("PROVIDER_LOADING", "background")
+
+def sdk_transport_args(provider: str, sdk) -> Dict[str, Any]:
+    """Constructor arguments giving the OpenAI or Anthropic SDK the pooled client for its httpx package"""
+    if http_clients is None:
+        return {}
+    module = httpx_module(sdk)
+    provider_http_clients[provider] = http_clients.get(module)
+    return {"http_client": provider_http_clients[provider], "timeout": transport_config.timeout(module)}
+
+def build_openai_client():
+    import openai
+    return openai.AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), **sdk_transport_args("OpenAI", openai))
+
+def build_gemini_client():
+    # Async calls go through (await gemini_client.aget()).aio
+    from google import genai
+    from google.genai import types as genai_types
+    http_options = None
+    if http_clients is not None:
+        provider_http_clients["Gemini"] = http_clients.get(httpx)
+        http_options = genai_types.HttpOptions(
+            # Gemini takes its timeout in milliseconds
+            timeout=int(transport_config.read_timeout * 1000),
+            httpx_async_client=provider_http_clients["Gemini"],
+        )
+    return genai.Client(api_key=os.environ.get("GOOGLE_API_KEY"), http_options=http_options)
 
-# Anthropic Client
-if os.environ.get("ANTHROPIC_API_KEY"):
-    claude_client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
-else:
-    claude_client = None
+def build_claude_client():
+    import anthropic
+    return anthropic.AsyncAnthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"), **sdk_transport_args("Claude", anthropic))
+
+openai_client = LazyClient("OpenAI", build_openai_client, enabled=bool(os.environ.get("OPENAI_API_KEY")))
+gemini_client = LazyClient("Gemini", build_gemini_client, enabled=bool(os.environ.get("GOOGLE_API_KEY")))
+claude_client = LazyClient("Claude", build_claude_client, enabled=bool(os.environ.get("ANTHROPIC_API_KEY")))
+provider_clients = {client.name: client for client in (openai_client, gemini_client, claude_client)}
+
+def load_provider_clients():
+    for client in provider_clients.values():
+        client.get()
+
+if PROVIDER_LOADING == "eager":
+    load_provider_clients()
+
+async def preload_providers():
+    """Background startup work: build the clients off the event loop, then warm up connections"""
+    try:
+        if PROVIDER_LOADING == "background":
+            await asyncio.to_thread(load_provider_clients)
+        await warm_up_providers()
+    except Exception as e:
+        # A client that failed to build is retried (and reports its error) on first use
+        print(f"Provider preload failed: {e}")
+
+async def warm_up_providers():
+    """
+    Pre-open pooled connections to the configured providers (HTTP_WARMUP_ENABLED)
+
+    Each provider is warmed through the pool its SDK sends on, so the clients
+    are built first if they are not yet.
+    """
+    if not HTTP_WARMUP_ENABLED or http_clients is None:
+        return
+    await asyncio.to_thread(load_provider_clients)
+    warm_ups = [
+        warm_up(provider_http_clients[name], [PROVIDER_BASE_URLS[name]], HTTP_WARMUP_CONNECTIONS, HTTP_WARMUP_TIMEOUT_SECONDS)
+        for name, client in provider_clients.items()
+        if client.enabled and name in provider_http_clients
+    ]
+    for results in await asyncio.gather(*warm_ups):
+        for url, result in results.items():
+            status = f"failed: {result['error']}" if result["error"] else f"{result['connections']} connections"
+            print(f"Warm-up {url}: {status} in {result['seconds'] * 1000:.0f}ms")
+
+# Worker processes: uvicorn starts WEB_CONCURRENCY copies of this app. With
+# more than one, provider health and progressive jobs are shared through
+# SHARED_STATE_DB, the persona cache gets a shared SQLite tier and rate limits
+# are split evenly.
+WORKER_COUNT = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+SHARED_STATE_DB = os.environ.get("SHARED_STATE_DB", "shared_state.db" if WORKER_COUNT > 1 else "")
+SHARED_STATE_INTERVAL_SECONDS = float(os.environ.get("SHARED_STATE_INTERVAL_SECONDS", "1"))
+
+# Provider hedging: start the next provider in parallel once the current one is
+# slower than its rolling latency percentile, and cap the whole request.
+hedge_policy = HedgePolicy(
+    enabled=os.environ.get("HEDGE_STRATEGY", "hedged") == "hedged",
+    default_delay=float(os.environ.get("HEDGE_DELAY_SECONDS", "4.0")),
+    percentile=float(os.environ.get("HEDGE_PERCENTILE", "90")),
+    min_samples=int(os.environ.get("HEDGE_MIN_SAMPLES", "20")),
+)
+GENERATION_DEADLINE_SECONDS = float(os.environ.get("GENERATION_DEADLINE_SECONDS", "30"))
+
+# Provider router: rolling health per provider, circuit breakers and
+# dynamic ordering by expected latency and success rate. Only providers with
+# an API key are routed; the others would just fail and trip their breakers.
+provider_router = ProviderRouter(
+    [name for name, client in provider_clients.items() if client.enabled],
+    window=int(os.environ.get("ROUTER_WINDOW", "50")),
+    min_requests=int(os.environ.get("ROUTER_MIN_REQUESTS", "10")),
+    failure_threshold=float(os.environ.get("ROUTER_FAILURE_THRESHOLD", "0.5")),
+    consecutive_failures=int(os.environ.get("ROUTER_CONSECUTIVE_FAILURES", "3")),
+    cooldown_seconds=float(os.environ.get("ROUTER_COOLDOWN_SECONDS", "30")),
+    stats_ttl_seconds=float(os.environ.get("ROUTER_STATS_TTL_SECONDS", "300")),
+    adaptive_order=os.environ.get("ROUTER_ADAPTIVE_ORDER", "true").lower() == "true",
+    neutral_errors=(ProviderThrottled,),
+)
+shared_provider_stats = SharedProviderStats(
+    SHARED_STATE_DB,
+    provider_router,
+    hedge_policy,
+    interval=SHARED_STATE_INTERVAL_SECONDS,
+) if SHARED_STATE_DB else None
+if shared_provider_stats is not None:
+    provider_router.on_outcome = shared_provider_stats.record
+
+# Client-side rate limits: per-provider request and token buckets (per minute),
+# corrected from the providers' rate-limit headers and 429 responses. A call
+# waits up to RATE_LIMIT_MAX_WAIT_SECONDS for capacity, otherwise the next
+# provider with spare capacity is used. The limits (and the headers) are
+# account-wide, so each worker process gets an equal share.
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+rate_limiter = RateLimitScheduler(
+    {
+        "OpenAI": (float(os.environ.get("OPENAI_RPM", "500")), float(os.environ.get("OPENAI_TPM", "200000"))),
+        "Gemini": (float(os.environ.get("GEMINI_RPM", "2000")), float(os.environ.get("GEMINI_TPM", "4000000"))),
+        "Claude": (float(os.environ.get("CLAUDE_RPM", "50")), float(os.environ.get("CLAUDE_TPM", "40000"))),
+    } if RATE_LIMIT_ENABLED else {},
+    max_wait=float(os.environ.get("RATE_LIMIT_MAX_WAIT_SECONDS", "2")),
+    on_wait=lambda provider, seconds: rate_limit_wait_seconds.observe(seconds, provider),
+    share=1 / WORKER_COUNT,
+)
+# Output tokens reserved per call on top of the prompt, until headers correct it
+PERSONA_OUTPUT_TOKENS_ESTIMATE = int(os.environ.get("PERSONA_OUTPUT_TOKENS_ESTIMATE", "800"))
+
+# Batch generation: default and maximum number of items generated concurrently
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "64"))
+
+# Durable job queue (POST /jobs): SQLite file drained by JOB_WORKERS coroutines
+JOB_QUEUE_ENABLED = os.environ.get("JOB_QUEUE_ENABLED", "true").lower() == "true"
+JOB_QUEUE_DB = os.environ.get("JOB_QUEUE_DB", "persona_jobs.db")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_QUEUE_MAX_DEPTH = int(os.environ.get("JOB_QUEUE_MAX_DEPTH", "10000"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_SECONDS = float(os.environ.get("JOB_RETRY_BASE_SECONDS", "2"))
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "120"))
+JOB_TTL_SECONDS = float(os.environ.get("JOB_TTL_SECONDS", "86400"))
 
 # Request Models
 class QuizAnswers(BaseModel):
@@ -73,188 +326,1056 @@ class QuizAnswers(BaseModel):
     key_lesson: Optional[str] = None
     priority_focus: Optional[str] = None
 
-class PersonaResponse(BaseModel):
+class PersonaContent(BaseModel):
+    """The persona fields a provider generates, enforced as its structured-output schema"""
     persona_tags: List[str]
     persona_summary: str
     investment_style: str
     strengths: List[str]
     considerations: List[str]
     recommended_opportunities: List[str]
+
+class PersonaResponse(PersonaContent):
     generated_at: str
+    provider: Optional[str] = None
+
+# OpenAI strict mode and Claude tool input both take plain JSON schema;
+# strict mode also requires closing the object to extra properties
+PERSONA_JSON_SCHEMA = {**PersonaContent.model_json_schema(), "additionalProperties": False}
+PERSONA_TOOL_NAME = "record_persona"
+
+# Rule-based tags: Data/output.json compiled into per-option lookup tables
+rule_engine = RuleEngine(load_rules())
+
+# Opportunity matching: the listing catalog at OPPORTUNITIES_PATH (JSON or
+# CSV), indexed by the quiz options and persona tags each listing fits
+OPPORTUNITIES_PATH = os.environ.get("OPPORTUNITIES_PATH")
+opportunity_index = None
+if OPPORTUNITIES_PATH:
+    try:
+        opportunity_index = OpportunityIndex(load_catalog(OPPORTUNITIES_PATH))
+        print(f"Loaded {len(opportunity_index.listings)} opportunities from {OPPORTUNITIES_PATH}")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Opportunity catalog not loaded: {e}")
+
+class OpportunityMatchRequest(BaseModel):
+    answers: QuizAnswers
+    # Tags of a generated persona; the rule-based tags for `answers` are used when omitted
+    persona_tags: Optional[List[str]] = None
+    limit: int = Field(10, ge=1, le=100)
+
+# Persona cache: in-process LRU, plus a SQLite tier when PERSONA_CACHE_DB is
+# set (by default with several workers, so they share generated personas)
+PERSONA_CACHE_DB = os.environ.get("PERSONA_CACHE_DB", "persona_cache.db" if WORKER_COUNT > 1 else "")
+persona_cache = PersonaCache(
+    LRUCache(
+        max_entries=int(os.environ.get("PERSONA_CACHE_MAX_ENTRIES", "10000")),
+        ttl_seconds=float(os.environ.get("PERSONA_CACHE_TTL_SECONDS", "86400")),
+    ),
+    persistent=SQLitePersonaStore(
+        PERSONA_CACHE_DB,
+        ttl_seconds=float(os.environ.get("PERSONA_CACHE_TTL_SECONDS", "86400")),
+    ) if PERSONA_CACHE_DB else None,
+    loads=lambda data: PersonaResponse(**data),
+    dumps=lambda persona: persona.model_dump(),
+)
+PERSONA_CACHE_ENABLED = os.environ.get("PERSONA_CACHE_ENABLED", "true").lower() == "true"
+
+# Degraded-mode serving: every generated persona is indexed by its packed
+# answers, and when the providers fail the persona of the closest stored
+# answers within PERSONA_INDEX_MAX_DISTANCE (0..1) is served instead. The
+# index is in memory; with PERSONA_CACHE_DB it is seeded at startup from the
+# personas kept there (by every worker), otherwise it starts empty and only
+# holds this process's own generations, so it is a best-effort fallback.
+PERSONA_INDEX_ENABLED = os.environ.get("PERSONA_INDEX_ENABLED", "true").lower() == "true"
+PERSONA_INDEX_MAX_DISTANCE = float(os.environ.get("PERSONA_INDEX_MAX_DISTANCE", "0.25"))
+# Also answer /generate-persona from the index (with X-Persona-Source and
+# X-Persona-Match-Distance headers) instead of failing; off by default since
+# that endpoint promises a persona generated for these exact answers
+PERSONA_INDEX_FULL_FALLBACK = os.environ.get("PERSONA_INDEX_FULL_FALLBACK", "false").lower() == "true"
+answer_codec = AnswerCodec()
+persona_index = PersonaIndex(
+    answer_codec,
+    max_entries=int(os.environ.get("PERSONA_INDEX_MAX_ENTRIES", "100000")),
+    weights=parse_weights(os.environ["PERSONA_INDEX_WEIGHTS"]) if os.environ.get("PERSONA_INDEX_WEIGHTS") else None,
+    loads=lambda data: PersonaResponse(**data),
+    dumps=lambda persona: persona.model_dump(),
+) if PERSONA_INDEX_ENABLED else None
+
+# Archetypes: personas precomputed per combination of the main answer fields
+# (precompute_archetypes.py), memory-mapped from ARCHETYPES_PATH and served
+# by /generate-persona for submissions without a free-text lesson
+ARCHETYPES_PATH = os.environ.get("ARCHETYPES_PATH")
+archetype_store = None
+if ARCHETYPES_PATH:
+    try:
+        archetype_store = ArchetypeStore(ARCHETYPES_PATH, ArchetypeKeys(answer_codec))
+    except (OSError, ValueError) as e:
+        print(f"Archetypes not loaded: {e}")
+    else:
+        if archetype_store.prompt_version != PROMPT_VERSION:
+            print(f"Archetypes not loaded: {ARCHETYPES_PATH} was generated for prompt "
+                  f"{archetype_store.prompt_version}, not {PROMPT_VERSION}")
+            archetype_store.close()
+            archetype_store = None
+
+# Coalesces concurrent generations for the same canonical answers
+persona_flights = SingleFlight()
+
+# Speculative generation: the frontends post partial answers to /quiz/progress
+# and a persona is generated in the background once the dominant fields are
+# known; /generate-persona?session_id= serves it if it saw every final answer
+# and they are within SPECULATION_MAX_DISTANCE of the ones it was generated
+# from. Speculative starts are capped per session,
+# in flight and per minute (an account-wide budget, split across workers).
+SPECULATION_ENABLED = os.environ.get("SPECULATION_ENABLED", "true").lower() == "true"
+speculative_sessions = SpeculativeSessions(
+    lambda answers: generate_persona_with_ai(QuizAnswers(**answers)),
+    weights=parse_weights(os.environ["SPECULATION_WEIGHTS"]) if os.environ.get("SPECULATION_WEIGHTS") else None,
+    max_distance=float(os.environ.get("SPECULATION_MAX_DISTANCE", "0.15")),
+    max_per_session=int(os.environ.get("SPECULATION_MAX_PER_SESSION", "3")),
+    max_in_flight=int(os.environ.get("SPECULATION_MAX_IN_FLIGHT", "32")),
+    starts_per_minute=float(os.environ.get("SPECULATION_STARTS_PER_MINUTE", "120")) / WORKER_COUNT,
+    ttl_seconds=float(os.environ.get("SPECULATION_SESSION_TTL_SECONDS", "900")),
+) if SPECULATION_ENABLED else None
+
+class QuizProgress(BaseModel):
+    # Chosen by the frontend once per quiz run and sent again with the final submit
+    session_id: str = Field(..., min_length=1, max_length=64)
+    answers: QuizAnswers
+
+# Provider-reported token usage, including prompt-cache reads
+token_usage = TokenUsage()
+
+# Progressive hybrid: AI personas still being generated after the rule-based
+# tags were returned, picked up by poll, SSE or webhook. With SHARED_STATE_DB
+# the jobs are also kept there, so a poll that reaches another worker finds them.
+PERSONA_JOBS_TTL_SECONDS = float(os.environ.get("PERSONA_JOBS_TTL_SECONDS", "3600"))
+persona_jobs = PersonaJobs(
+    max_jobs=int(os.environ.get("PERSONA_JOBS_MAX", "10000")),
+    ttl_seconds=PERSONA_JOBS_TTL_SECONDS,
+    store=SQLiteJobStore(SHARED_STATE_DB, PERSONA_JOBS_TTL_SECONDS) if SHARED_STATE_DB else None,
+    max_pending_seconds=float(os.environ.get("PERSONA_JOBS_MAX_PENDING_SECONDS", "600")),
+)
+JOB_MAX_WAIT_SECONDS = float(os.environ.get("JOB_MAX_WAIT_SECONDS", "30"))
+WEBHOOK_TIMEOUT_SECONDS = float(os.environ.get("WEBHOOK_TIMEOUT_SECONDS", "5"))
+WEBHOOK_ATTEMPTS = int(os.environ.get("WEBHOOK_ATTEMPTS", "3"))
+# Callback URLs are only accepted for these hosts (comma separated, ".example.com"
+# for subdomains), and never when they resolve to private or internal addresses;
+# unset, callbacks are off
+callback_policy = CallbackPolicy(os.environ.get("WEBHOOK_ALLOWED_HOSTS", "").split(","))
+# Keeps background generations referenced until they finish
+job_tasks = set()
+
+# Scrape-time metrics read straight from the components' own counters
+metrics_registry.collector(
+    "persona_cache_lookups_total", "counter", "Persona cache lookups by result",
+    lambda: [
+        ({"result": "memory_hit"}, persona_cache.memory_hits),
+        ({"result": "persistent_hit"}, persona_cache.persistent_hits),
+        ({"result": "miss"}, persona_cache.misses),
+    ]
+)
+metrics_registry.collector(
+    "persona_archetype_lookups_total", "counter",
+    "Archetype lookups by /generate-persona: hit, miss (combination not precomputed), free_text (has a key_lesson)",
+    lambda: [
+        ({"result": result}, getattr(archetype_store, attribute))
+        for result, attribute in (("hit", "hits"), ("miss", "misses"), ("free_text", "free_text"))
+    ] if archetype_store else []
+)
+metrics_registry.collector(
+    "persona_speculations_total", "counter",
+    "Speculative generations from quiz progress: started, restarted (answers moved on), wasted (never served)",
+    lambda: [
+        ({"outcome": outcome}, getattr(speculative_sessions, attribute))
+        for outcome, attribute in (("started", "started"), ("restarted", "restarted"), ("wasted", "wasted"))
+    ] if speculative_sessions else []
+)
+metrics_registry.collector(
+    "persona_speculations_skipped_total", "counter",
+    "Speculative generations not started, by limit: session_limit, in_flight_limit, rate_limit",
+    lambda: [({"reason": reason}, count) for reason, count in speculative_sessions.skipped.items()] if speculative_sessions else []
+)
+metrics_registry.collector(
+    "persona_speculation_claims_total", "counter",
+    "Submits with a quiz session: hit (speculative persona served), changed (answers changed or added), failed, none",
+    lambda: [({"result": result}, count) for result, count in speculative_sessions.claims.items()] if speculative_sessions else []
+)
+metrics_registry.collector(
+    "persona_speculation_saved_seconds_total", "counter",
+    "Generation time users did not wait for because the persona was generated speculatively",
+    lambda: [({}, speculative_sessions.saved_seconds)] if speculative_sessions else []
+)
+metrics_registry.collector(
+    "persona_singleflight_calls_saved_total", "counter", "Provider calls avoided by coalescing identical requests",
+    lambda: [({}, persona_flights.coalesced)]
+)
+metrics_registry.collector(
+    "persona_tokens_total", "counter",
+    "Provider-reported tokens; kind=input includes cached_input, which was served from the prompt cache",
+    lambda: [
+        ({"provider": provider, "kind": kind}, usage[f"{kind}_tokens"])
+        for provider, usage in token_usage.stats().items()
+        for kind in ("input", "cached_input", "cache_write", "output")
+    ]
+)
+metrics_registry.collector(
+    "persona_prompt_cache_hits_total", "counter", "Provider calls that read part of the prompt from the provider's prompt cache",
+    lambda: [({"provider": provider}, usage["cache_hit_calls"]) for provider, usage in token_usage.stats().items()]
+)
+metrics_registry.collector(
+    "persona_jobs_pending", "gauge", "Progressive hybrid jobs whose AI persona is still being generated",
+    lambda: [({}, persona_jobs.stats()["pending"])]
+)
+metrics_registry.collector(
+    "persona_jobs_total", "counter", "Progressive hybrid jobs by outcome: completed, failed, rejected (too many pending)",
+    lambda: [({"outcome": outcome}, persona_jobs.stats()[outcome]) for outcome in ("completed", "failed", "rejected")]
+)
+# Read from SQLite in a worker thread by /metrics before it renders; the
+# collectors run on the event loop and must not wait on the queue's lock
+job_queue_gauges: Dict[str, Any] = {"depth": {}, "oldest_queued_age": 0.0}
+metrics_registry.collector(
+    "persona_job_queue_depth", "gauge", "Durable queue jobs by status",
+    lambda: [({"status": status}, count) for status, count in job_queue_gauges["depth"].items()] if job_queue else []
+)
+metrics_registry.collector(
+    "persona_job_queue_oldest_age_seconds", "gauge", "Age of the oldest job still waiting in the durable queue",
+    lambda: [({}, job_queue_gauges["oldest_queued_age"])] if job_queue else []
+)
+metrics_registry.collector(
+    "persona_job_queue_events_total", "counter", "Durable queue events: enqueued, rejected (queue full), retried, completed, failed",
+    lambda: [
+        ({"event": event}, getattr(job_queue, attribute))
+        for event, attribute in (("enqueued", "enqueued"), ("rejected", "rejected"), ("retried", "retries"), ("completed", "completed"), ("failed", "failed"))
+    ] if job_queue else []
+)
+metrics_registry.collector(
+    "persona_job_workers_busy", "gauge", "Queue workers currently generating a persona",
+    lambda: [({}, job_workers.busy)] if job_workers else []
+)
+metrics_registry.collector(
+    "persona_rate_limit_events_total", "counter",
+    "Rate limiter events: queued (waited for capacity), rejected (skipped for lack of capacity), rate_limited (provider answered 429)",
+    lambda: [
+        ({"provider": name, "event": event}, getattr(limits, event))
+        for name, limits in rate_limiter.providers.items()
+        for event in ("queued", "rejected", "rate_limited")
+    ]
+)
+metrics_registry.collector(
+    "persona_rate_limit_available", "gauge", "Capacity left in each provider's request and token bucket",
+    lambda: [
+        ({"provider": name, "bucket": bucket}, getattr(limits, bucket).available())
+        for name, limits in rate_limiter.providers.items()
+        for bucket in ("requests", "tokens")
+    ]
+)
+metrics_registry.collector(
+    "persona_provider_circuit_open", "gauge", "1 while a provider's circuit breaker is open or half-open",
+    lambda: [({"provider": name}, int(health.state != "closed")) for name, health in provider_router.providers.items()]
+)
 
 # Persona Generation Prompt
+# The static instructions go in the system prompt and the answers in the user
+# message, so every provider sees an identical prefix it can cache.
+
+def openai_chat_params(prompt: PersonaPrompt) -> Dict[str, Any]:
+    """Chat completion parameters shared by live, streamed and batch OpenAI requests"""
+    return {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": prompt.system},
+            {"role": "user", "content": prompt.user}
+        ],
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "investor_persona", "strict": True, "schema": PERSONA_JSON_SCHEMA}
+        },
+        "temperature": 0.7
+    }
+
+def claude_message_params(prompt: PersonaPrompt) -> Dict[str, Any]:
+    """
+    Message parameters for Claude
+
+    The persona is returned as the input of a forced tool call, so Claude is
+    held to the schema instead of writing free text. The system prompt (and
+    the tool definition before it) is marked for prompt caching.
+    """
+    return {
+        "model": CLAUDE_MODEL,
+        "max_tokens": 2000,
+        "temperature": 0.7,
+        "tools": [
+            {
+                "name": PERSONA_TOOL_NAME,
+                "description": "Record the generated investor persona",
+                "input_schema": PERSONA_JSON_SCHEMA
+            }
+        ],
+        "tool_choice": {"type": "tool", "name": PERSONA_TOOL_NAME},
+        "system": [
+            {
+                "type": "text",
+                "text": prompt.system,
+                "cache_control": {"type": "ephemeral"}
+            }
+        ],
+        "messages": [
+            {
+                "role": "user",
+                "content": prompt.user
+            }
+        ]
+    }
+
+def gemini_config(prompt: PersonaPrompt) -> "genai_types.GenerateContentConfig":
+    """Gemini request config: static system instruction and JSON output constrained to the persona schema"""
+    from google.genai import types as genai_types
+    return genai_types.GenerateContentConfig(
+        system_instruction=prompt.system,
+        response_mime_type="application/json",
+        response_schema=PersonaContent
+    )
+
+# Token usage: each provider reports how much of the prompt came from its cache
+
+def record_openai_usage(usage, seconds: Optional[float] = None):
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    token_usage.record(
+        "OpenAI",
+        input_tokens=usage.prompt_tokens,
+        output_tokens=usage.completion_tokens,
+        cached_tokens=getattr(details, "cached_tokens", None) or 0,
+        seconds=seconds,
+    )
 
-def generate_persona_with_openai(prompt: str) -> PersonaResponse:
+def record_gemini_usage(usage, seconds: Optional[float] = None):
+    if usage is None:
+        return
+    token_usage.record(
+        "Gemini",
+        input_tokens=usage.prompt_token_count or 0,
+        output_tokens=usage.candidates_token_count or 0,
+        cached_tokens=usage.cached_content_token_count or 0,
+        seconds=seconds,
+    )
+
+def record_claude_usage(usage, seconds: Optional[float] = None):
+    # Anthropic's input_tokens excludes cache reads and writes
+    cached = getattr(usage, "cache_read_input_tokens", None) or 0
+    written = getattr(usage, "cache_creation_input_tokens", None) or 0
+    token_usage.record(
+        "Claude",
+        input_tokens=usage.input_tokens + cached + written,
+        output_tokens=usage.output_tokens,
+        cached_tokens=cached,
+        cache_write_tokens=written,
+        seconds=seconds,
+    )
+
+def parse_persona(provider: str, payload: Union[str, Dict[str, Any]], endpoint: str) -> PersonaResponse:
+    """
+    Decode and validate a provider's persona, timing and counting outcomes per stage
+
+    `payload` is the response text, or the already-decoded object for Claude's
+    tool input. Text that is not clean JSON (fences, prose, trailing commas,
+    truncation) is repaired locally rather than failing over to another
+    provider; the repair is counted once the result also validates.
+    """
+    started = time.perf_counter()
+    parses_total.inc(provider)
+    repair = None
+    if isinstance(payload, str):
+        try:
+            data, repair = repair_json_object(payload)
+        except ValueError:
+            parse_failures_total.inc(provider, "parse")
+            raise
+    else:
+        data = payload
+    parsed = time.perf_counter()
+    stage_seconds.observe(parsed - started, endpoint, provider, "parse")
+    try:
+        persona = PersonaResponse(**data, generated_at=datetime.now(timezone.utc).isoformat())
+    except (TypeError, ValidationError):
+        parse_failures_total.inc(provider, "validate")
+        raise
+    stage_seconds.observe(time.perf_counter() - parsed, endpoint, provider, "validate")
+    if repair:
+        parse_repairs_total.inc(provider, repair)
+    return persona
+
+# Rate limiting: calls reserve capacity before they are sent, and 429s block
+# the provider in the scheduler instead of counting against its health
+
+def estimate_call_tokens(prompt: PersonaPrompt) -> int:
+    """Tokens reserved for one call: ~4 characters per prompt token plus the expected output"""
+    return (len(prompt.system) + len(prompt.user)) // 4 + PERSONA_OUTPUT_TOKENS_ESTIMATE
+
+async def parse_raw_response(raw):
+    """Parse a `with_raw_response` result; newer SDKs return an async parse()"""
+    parsed = raw.parse()
+    if inspect.isawaitable(parsed):
+        parsed = await parsed
+    return parsed
+
+def throttled_error(provider: str, error: Exception) -> Optional[ProviderThrottled]:
+    """
+    ProviderThrottled for a provider's 429 response, recorded with the scheduler; None for other errors
+
+    Matched on the status the SDK errors carry (`status_code` for OpenAI and
+    Anthropic, `code` for Gemini), so checking an error never imports an SDK.
+    """
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status != 429:
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    retry_after = rate_limiter.record_rate_limited(provider, headers)
+    return ProviderThrottled(provider, retry_after, "HTTP 429 from provider")
+
+def schedule_providers(tokens: int) -> List[str]:
+    """
+    Router order adjusted for rate-limit capacity
+
+    Providers the scheduler leaves out release any half-open probe the
+    router handed them. Raises 429 with Retry-After when every healthy
+    provider is out of capacity, and 503 when all are circuit-broken or
+    none is configured.
+    """
+    if not provider_router.providers:
+        raise HTTPException(status_code=503, detail="No AI provider API keys are configured")
+    healthy = provider_router.order()
+    if not healthy:
+        raise HTTPException(
+            status_code=503,
+            detail=f"All AI providers are circuit-broken; retry in {provider_router.retry_after():.0f}s"
+        )
+    order = rate_limiter.order(healthy, tokens)
+    for name in healthy:
+        if name not in order:
+            provider_router.release(name)
+    if not order:
+        retry_after = rate_limiter.retry_after(healthy, tokens)
+        raise HTTPException(
+            status_code=429,
+            detail=f"All AI providers are at their rate limits; retry in {retry_after:.1f}s",
+            headers={"Retry-After": str(max(1, round(retry_after)))}
+        )
+    return order
+
+def admitted(name: str, tokens: int, call: Callable[[], Awaitable[PersonaResponse]]) -> Callable[[], Awaitable[PersonaResponse]]:
+    """Wrap a provider call so it first reserves rate-limit capacity"""
+    async def admitted_call():
+        await rate_limiter.acquire(name, tokens)
+        return await call()
+    return admitted_call
+
+async def generate_persona_with_openai(prompt: PersonaPrompt) -> PersonaResponse:
     """Generate persona using OpenAI GPT-4"""
-    if not openai_client:
+    client = await openai_client.aget()
+    if client is None:
         raise Exception("OpenAI API Key not configured")
         
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert investment advisor."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.7
-        )
+        endpoint = current_endpoint.get()
+        started = time.perf_counter()
+        raw = await client.chat.completions.with_raw_response.create(**openai_chat_params(prompt))
+        network_seconds = time.perf_counter() - started
+        rate_limiter.update_from_headers("OpenAI", raw.headers)
+        response = await parse_raw_response(raw)
+        stage_seconds.observe(network_seconds, endpoint, "OpenAI", "network")
+        record_openai_usage(response.usage, network_seconds)
         content = response.choices[0].message.content
-        data = json.loads(content)
-        return PersonaResponse(**data, generated_at=datetime.utcnow().isoformat())
+        return parse_persona("OpenAI", content, endpoint)
     except Exception as e:
+        throttled = throttled_error("OpenAI", e)
+        if throttled:
+            raise throttled from e
         raise Exception(f"OpenAI Error: {str(e)}")
 
-def generate_persona_with_gemini(prompt: str) -> PersonaResponse:
+async def generate_persona_with_gemini(prompt: PersonaPrompt) -> PersonaResponse:
     """Generate persona using Google Gemini"""
-    if not gemini_client:
+    client = await gemini_client.aget()
+    if client is None:
         raise Exception("Google API Key not configured")
     
     try:
-        # Gemini sometimes adds markdown code blocks, so we might need to clean it
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
+        endpoint = current_endpoint.get()
+        started = time.perf_counter()
+        response = await client.aio.models.generate_content(
+            model=GEMINI_MODEL,
+            contents=prompt.user,
+            config=gemini_config(prompt)
         )
-        text = response.text
+        network_seconds = time.perf_counter() - started
+        stage_seconds.observe(network_seconds, endpoint, "Gemini", "network")
+        record_gemini_usage(response.usage_metadata, network_seconds)
         
-        # Clean potential markdown formatting
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-            
-        data = json.loads(text.strip())
-        return PersonaResponse(**data, generated_at=datetime.utcnow().isoformat())
+        # Gemini sometimes adds markdown code blocks, so clean them before parsing
+        return parse_persona("Gemini", response.text, endpoint)
     except Exception as e:
+        throttled = throttled_error("Gemini", e)
+        if throttled:
+            raise throttled from e
         raise Exception(f"Gemini Error: {str(e)}")
 
-def generate_persona_with_claude(prompt: str) -> PersonaResponse:
+async def generate_persona_with_claude(prompt: PersonaPrompt) -> PersonaResponse:
     """Generate persona using Anthropic Claude"""
-    if not claude_client:
+    client = await claude_client.aget()
+    if client is None:
         raise Exception("Anthropic API Key not configured")
 
     try:
-        message = claude_client.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=2000,
-            temperature=0.7,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        )
-        response_text = message.content[0].text
-        data = json.loads(response_text)
-        return PersonaResponse(**data, generated_at=datetime.utcnow().isoformat())
+        endpoint = current_endpoint.get()
+        started = time.perf_counter()
+        raw = await client.messages.with_raw_response.create(**claude_message_params(prompt))
+        network_seconds = time.perf_counter() - started
+        rate_limiter.update_from_headers("Claude", raw.headers)
+        message = await parse_raw_response(raw)
+        stage_seconds.observe(network_seconds, endpoint, "Claude", "network")
+        record_claude_usage(message.usage, network_seconds)
+        # The forced tool call carries the persona as structured input
+        for block in message.content:
+            if block.type == "tool_use":
+                return parse_persona("Claude", block.input, endpoint)
+        return parse_persona("Claude", "".join(block.text for block in message.content if block.type == "text"), endpoint)
     except Exception as e:
+        throttled = throttled_error("Claude", e)
+        if throttled:
+            raise throttled from e
         raise Exception(f"Claude Error: {str(e)}")
 
-def generate_persona_with_ai(answers: QuizAnswers) -> PersonaResponse:
+# Streaming Providers: each yields raw text deltas of the persona JSON
+
+async def stream_persona_with_openai(prompt: PersonaPrompt) -> AsyncIterator[str]:
+    """Stream persona JSON text from OpenAI"""
+    client = await openai_client.aget()
+    if client is None:
+        raise Exception("OpenAI API Key not configured")
+    
+    stream = await client.chat.completions.create(
+        **openai_chat_params(prompt),
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+        if chunk.usage:
+            record_openai_usage(chunk.usage)
+
+async def stream_persona_with_gemini(prompt: PersonaPrompt) -> AsyncIterator[str]:
+    """Stream persona JSON text from Google Gemini"""
+    client = await gemini_client.aget()
+    if client is None:
+        raise Exception("Google API Key not configured")
+    
+    stream = await client.aio.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=prompt.user,
+        config=gemini_config(prompt)
+    )
+    usage = None
+    async for chunk in stream:
+        usage = chunk.usage_metadata or usage
+        if chunk.text:
+            yield chunk.text
+    record_gemini_usage(usage)
+
+async def stream_persona_with_claude(prompt: PersonaPrompt) -> AsyncIterator[str]:
+    """Stream persona JSON text from Anthropic Claude"""
+    client = await claude_client.aget()
+    if client is None:
+        raise Exception("Anthropic API Key not configured")
+    
+    async with client.messages.stream(**claude_message_params(prompt)) as stream:
+        async for event in stream:
+            # The tool input arrives as partial JSON deltas
+            if event.type == "content_block_delta":
+                if event.delta.type == "input_json_delta":
+                    yield event.delta.partial_json
+                elif event.delta.type == "text_delta":
+                    yield event.delta.text
+        message = await stream.get_final_message()
+    record_claude_usage(message.usage)
+
+def build_persona_prompt(quiz_dict: Dict[str, Any], encoding: str = PROMPT_ENCODING) -> PersonaPrompt:
+    """Render the static system prompt and the per-request answers (see PROMPT_ENCODING)"""
+    system, user = PROMPT_TEMPLATES[encoding]
+    return PersonaPrompt(system=system, user=user.format(quiz_data=encode_answers(quiz_dict, encoding)))
+
+async def generate_persona_with_ai(answers: QuizAnswers) -> PersonaResponse:
     """
     Generate investor persona using AI with fallbacks:
     1. OpenAI (Primary)
     2. Gemini (First Fallback)
     3. Claude (Final Fallback)
+
+    The order is the default; the provider router skips circuit-broken
+    providers and promotes faster, healthier ones as statistics accumulate.
+
+    Fallbacks are hedged: if a provider has not answered within its hedge
+    delay (rolling p90 latency by default) the next one starts in parallel,
+    the first valid persona wins and the others are cancelled.
+
+    All provider calls go through the async SDK clients, so a slow LLM call
+    never blocks the event loop serving /health or /generate-persona/basic.
+
+    Results are cached on the canonical answers, prompt version and model
+    chain, so repeated answer sets skip the provider round trip entirely,
+    and concurrent identical requests are coalesced into one provider call.
     """
     
-    # Prepare quiz data for the prompt
     quiz_dict = answers.model_dump(exclude_none=True)
-    quiz_data = json.dumps(quiz_dict, indent=2)
-    formatted_prompt = PERSONA_GENERATION_PROMPT.format(quiz_data=quiz_data)
+    cache_key = persona_cache_key(quiz_dict, PROMPT_VERSION, MODEL_CHAIN)
     
-    errors = []
+    if PERSONA_CACHE_ENABLED:
+        cached = await persona_cache.aget(cache_key)
+        if cached is not None:
+            generations_total.inc(current_endpoint.get(), "cache")
+            return cached.model_copy()
+    
+    # Identical answers already being generated share that provider call
+    persona = await persona_flights.do(cache_key, lambda: generate_persona_uncached(quiz_dict, cache_key))
+    generations_total.inc(current_endpoint.get(), persona.provider)
+    return persona.model_copy()
+
+async def generate_persona_uncached(quiz_dict: Dict[str, Any], cache_key: str) -> PersonaResponse:
+    """Race the providers for one answer set and store the winner in the cache"""
+    
+    endpoint = current_endpoint.get()
+    with stage_seconds.time(endpoint, "none", "prompt_build"):
+        formatted_prompt = build_persona_prompt(quiz_dict)
+    
+    provider_calls = {
+        "OpenAI": lambda: generate_persona_with_openai(formatted_prompt),
+        "Gemini": lambda: generate_persona_with_gemini(formatted_prompt),
+        "Claude": lambda: generate_persona_with_claude(formatted_prompt),
+    }
+    tokens = estimate_call_tokens(formatted_prompt)
+    calls = [
+        (name, provider_router.track(name, admitted(name, tokens, provider_calls[name])))
+        for name in schedule_providers(tokens)
+    ]
     
-    # 1. Try OpenAI
     try:
-        print("Attempting generation with OpenAI...")
-        return generate_persona_with_openai(formatted_prompt)
-    except Exception as e:
-        print(f"OpenAI failed: {e}")
-        errors.append(f"OpenAI: {str(e)}")
-        
-    # 2. Try Gemini
+        provider, persona = await race_providers(
+            calls, hedge_policy, GENERATION_DEADLINE_SECONDS, release=provider_router.release
+        )
+    except DeadlineExceeded as e:
+        for name in e.timed_out:
+            provider_router.record_failure(name, TimeoutError(f"no answer within {e.deadline:g}s"))
+        errors = [f"{name}: {str(error)}" for name, error in e.errors]
+        raise HTTPException(
+            status_code=504,
+            detail=f"AI generation exceeded the {e.deadline:g}s deadline. Errors: {'; '.join(errors)}"
+        )
+    except AllProvidersFailed as e:
+        errors = [f"{name}: {str(error)}" for name, error in e.errors]
+        if all(isinstance(error, ProviderThrottled) for _, error in e.errors):
+            retry_after = min(error.retry_after for _, error in e.errors)
+            raise HTTPException(
+                status_code=429,
+                detail=f"All AI providers are rate limited. Errors: {'; '.join(errors)}",
+                headers={"Retry-After": str(max(1, round(retry_after)))}
+            )
+        raise HTTPException(
+            status_code=500,
+            detail=f"All AI generation attempts failed. Errors: {'; '.join(errors)}"
+        )
+    
+    if provider != calls[0][0]:
+        fallbacks_total.inc(endpoint, "provider")
+    persona.provider = provider
+    await store_persona(quiz_dict, cache_key, persona)
+    return persona
+
+async def store_persona(quiz_dict: Dict[str, Any], cache_key: str, persona: PersonaResponse):
+    """Keep a freshly generated persona in the cache and the nearest-neighbour index"""
+    if PERSONA_CACHE_ENABLED:
+        await persona_cache.aset(cache_key, persona, quiz_dict)
+    if persona_index is not None:
+        persona_index.add(quiz_dict, persona)
+
+async def seed_persona_index(page_size: int = 1000):
+    """Index the personas kept in the SQLite cache tier, so a restart does not empty the fallback"""
+    started = time.perf_counter()
+    after = seeded = 0
+    while True:
+        rows = await asyncio.to_thread(persona_cache.persistent.answered, after, page_size)
+        if not rows:
+            break
+        # Added on the event loop, a page at a time, as the index is not thread-safe
+        for after, quiz_dict, data in rows:
+            try:
+                persona_index.add(quiz_dict, persona_cache.loads(data))
+            except (ValidationError, TypeError):
+                # Written by an older version with a different persona shape
+                continue
+            seeded += 1
+    print(f"Persona index seeded with {seeded} personas from {PERSONA_CACHE_DB} in {time.perf_counter() - started:.1f}s")
+
+def nearest_persona(answers: QuizAnswers) -> Optional[Dict[str, Any]]:
+    """The stored persona for the closest answers within PERSONA_INDEX_MAX_DISTANCE, with its distance"""
+    if persona_index is None:
+        return None
+    match = persona_index.nearest(answers.model_dump(exclude_none=True), PERSONA_INDEX_MAX_DISTANCE)
+    if match is None:
+        return None
+    persona, distance = match
+    return {"persona": persona, "match_distance": round(distance, 4)}
+
+def generate_persona_rules_based(answers: QuizAnswers) -> List[str]:
+    """Fallback: Generate basic persona tags using the compiled rules from Data/output.json"""
+    return rule_engine.tags(answers.model_dump(exclude_none=True))
+
+# Batch Generation
+
+def parse_ndjson_items(body: bytes) -> List[Any]:
+    """
+    Parse an NDJSON body into a list of items
+
+    Lines that are not valid JSON become the exception itself, so they are
+    reported per item instead of failing the whole batch.
+    """
+    items = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError as e:
+            items.append(e)
+    return items
+
+async def generate_batch_item(index: int, item: Any) -> Dict[str, Any]:
+    """Generate one batch entry, falling back to rule-based tags if AI fails"""
+    if isinstance(item, Exception):
+        return {"index": index, "method": "invalid-input", "error": str(item)}
+    try:
+        answers = QuizAnswers(**item)
+    except (TypeError, ValidationError) as e:
+        return {"index": index, "method": "invalid-input", "error": str(e)}
+    
     try:
-        print("Attempting generation with Gemini (Fallback 1)...")
-        return generate_persona_with_gemini(formatted_prompt)
+        persona = await generate_persona_with_ai(answers)
+        return {"index": index, "method": "ai", "persona": persona.model_dump()}
     except Exception as e:
-        print(f"Gemini failed: {e}")
-        errors.append(f"Gemini: {str(e)}")
+        fallbacks_total.inc(current_endpoint.get(), "rules")
+        return {
+            "index": index,
+            "method": "rule-based-fallback",
+            "persona_tags": generate_persona_rules_based(answers),
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "error": str(e)
+        }
+
+async def stream_batch(items: List[Any], concurrency: int) -> AsyncIterator[bytes]:
+    """
+    Fan batch items out with at most `concurrency` generations in flight and
+    yield NDJSON lines in completion order
+    """
+    slots = asyncio.Semaphore(concurrency)
+    results: asyncio.Queue = asyncio.Queue()
+    tasks = set()
+    
+    async def run_item(index: int, item: Any):
+        try:
+            results.put_nowait(await generate_batch_item(index, item))
+        finally:
+            slots.release()
+    
+    async def feed():
+        try:
+            # Taking a slot before starting the next item keeps at most
+            # `concurrency` tasks alive instead of one per batch entry
+            for index, item in enumerate(items):
+                await slots.acquire()
+                task = asyncio.create_task(run_item(index, item))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        except Exception as e:
+            results.put_nowait(e)
+        results.put_nowait(None)
+    
+    feeder = asyncio.create_task(feed())
+    try:
+        while True:
+            result = await results.get()
+            if result is None:
+                break
+            if isinstance(result, Exception):
+                raise result
+            yield (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+    finally:
+        feeder.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+# Streaming Generation
+
+def sse_event(event: str, data: Dict[str, Any]) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+def complete_streamed_persona(provider: str, fields: Dict[str, Any], raw: str, endpoint: str) -> PersonaResponse:
+    """Validate the incrementally parsed fields, repairing the full streamed text if they fall short"""
+    validate_started = time.perf_counter()
+    try:
+        persona = PersonaResponse(**fields, generated_at=datetime.now(timezone.utc).isoformat())
+    except ValidationError:
+        return parse_persona(provider, raw, endpoint)
+    parses_total.inc(provider)
+    stage_seconds.observe(time.perf_counter() - validate_started, endpoint, provider, "validate")
+    return persona
+
+async def stream_persona_events(answers: QuizAnswers) -> AsyncIterator[bytes]:
+    """
+    Server-sent events for one persona generation
+    
+    Emits a `field` event for each top-level persona field as soon as the
+    provider has streamed it completely (with `elapsed_ms` since the request
+    started, i.e. time to that useful byte), then a `done` event with the
+    validated persona. Providers are tried in the router's current order, but
+    a fallback is only possible while no field has been sent; a failure after
+    that ends the stream with an `error` event.
+    """
+    started = time.perf_counter()
+    endpoint = current_endpoint.get()
+    quiz_dict = answers.model_dump(exclude_none=True)
+    cache_key = persona_cache_key(quiz_dict, PROMPT_VERSION, MODEL_CHAIN)
+    
+    def field_event(field: str, value: Any, provider: Optional[str]) -> bytes:
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        return sse_event("field", {"field": field, "value": value, "provider": provider, "elapsed_ms": elapsed_ms})
+    
+    if PERSONA_CACHE_ENABLED:
+        cached = await persona_cache.aget(cache_key)
+        if cached is not None:
+            persona = cached.model_dump()
+            for field in PersonaResponse.model_fields:
+                if field not in ("generated_at", "provider"):
+                    yield field_event(field, persona[field], persona["provider"])
+            generations_total.inc(endpoint, "cache")
+            yield sse_event("done", {**persona, "cached": True})
+            return
+    
+    with stage_seconds.time(endpoint, "none", "prompt_build"):
+        formatted_prompt = build_persona_prompt(quiz_dict)
+    streams = {
+        "OpenAI": stream_persona_with_openai,
+        "Gemini": stream_persona_with_gemini,
+        "Claude": stream_persona_with_claude,
+    }
+    tokens = estimate_call_tokens(formatted_prompt)
+    try:
+        order = schedule_providers(tokens)
+    except HTTPException as e:
+        yield sse_event("error", {"detail": e.detail})
+        return
+    errors = []
+    
+    attempted = 0
+    try:
+        for provider in order:
+            attempted += 1
+            print(f"Attempting streamed generation with {provider}...")
+            fields = {}
+            raw = []
+            attempt_started = time.perf_counter()
+            parse_seconds = 0.0
+            try:
+                await rate_limiter.acquire(provider, tokens)
+                parser = IncrementalObjectParser()
+                parser_failed = False
+                async for text in streams[provider](formatted_prompt):
+                    raw.append(text)
+                    if parser_failed:
+                        continue
+                    feed_started = time.perf_counter()
+                    try:
+                        members = parser.feed(text)
+                    except ValueError:
+                        # Keep collecting; the full text gets a repair attempt below
+                        parser_failed = True
+                        members = []
+                    parse_seconds += time.perf_counter() - feed_started
+                    for field, value in members:
+                        fields[field] = value
+                        yield field_event(field, value, provider)
+                # Network covers the whole stream minus incremental parsing; time
+                # spent by the client draining events is included
+                stage_seconds.observe(time.perf_counter() - attempt_started - parse_seconds, endpoint, provider, "network")
+                stage_seconds.observe(parse_seconds, endpoint, provider, "parse")
+                persona = complete_streamed_persona(provider, fields, "".join(raw), endpoint)
+            except Exception as e:
+                print(f"{provider} stream failed: {e}")
+                throttled = e if isinstance(e, ProviderThrottled) else throttled_error(provider, e)
+                if throttled:
+                    # Out of capacity says nothing about the provider's health, even mid-stream
+                    provider_router.release(provider)
+                    if fields:
+                        yield sse_event("error", {"detail": f"{provider} stream throttled after {len(fields)} fields: {str(throttled)}"})
+                        return
+                    errors.append(f"{provider}: {str(throttled)}")
+                    continue
+                provider_router.record_failure(provider, e)
+                if fields:
+                    yield sse_event("error", {"detail": f"{provider} stream failed after {len(fields)} fields: {str(e)}"})
+                    return
+                errors.append(f"{provider}: {str(e)}")
+                continue
+            except BaseException:
+                # Client went away mid-stream: no outcome to record for this provider
+                provider_router.release(provider)
+                raise
         
-    # 3. Try Claude
+            # Fields only recovered by repairing the full text have not been sent yet
+            for field in PersonaContent.model_fields:
+                if field not in fields:
+                    yield field_event(field, getattr(persona, field), provider)
+            provider_router.record_success(provider, time.perf_counter() - attempt_started)
+            generations_total.inc(endpoint, provider)
+            if provider != order[0]:
+                fallbacks_total.inc(endpoint, "provider")
+            persona.provider = provider
+            await store_persona(quiz_dict, cache_key, persona)
+            yield sse_event("done", persona.model_dump())
+            return
+    
+        yield sse_event("error", {"detail": f"All AI generation attempts failed. Errors: {'; '.join(errors)}"})
+    finally:
+        # Providers the loop never reached give back a half-open probe claimed for them
+        for provider in order[attempted:]:
+            provider_router.release(provider)
+
+# Progressive Hybrid
+
+async def deliver_webhook(job: PersonaJob):
+    """POST the finished job to its callback URL, retrying with backoff"""
+    async with httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT_SECONDS) as client:
+        for attempt in range(WEBHOOK_ATTEMPTS):
+            try:
+                await callback_policy.check(job.callback_url)
+            except CallbackRejected as e:
+                print(f"Webhook for job {job.id} not delivered: {e}")
+                webhook_deliveries_total.inc("rejected")
+                return
+            try:
+                response = await client.post(job.callback_url, json=job.to_dict())
+                if response.status_code < 500:
+                    webhook_deliveries_total.inc("delivered" if response.status_code < 400 else "failed")
+                    return
+                error = f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                error = str(e) or type(e).__name__
+            print(f"Webhook for job {job.id} failed (attempt {attempt + 1}): {error}")
+            if attempt + 1 < WEBHOOK_ATTEMPTS:
+                await asyncio.sleep(2 ** attempt)
+    webhook_deliveries_total.inc("failed")
+
+async def run_persona_job(job: PersonaJob, answers: QuizAnswers):
+    """Generate the AI persona for a progressive job, then notify its webhook"""
     try:
-        print("Attempting generation with Claude (Fallback 2)...")
-        return generate_persona_with_claude(formatted_prompt)
+        persona = await generate_persona_with_ai(answers)
+        await persona_jobs.finish(job, persona.model_dump())
     except Exception as e:
-        print(f"Claude failed: {e}")
-        errors.append(f"Claude: {str(e)}")
-    
-    # If all fail
-    raise HTTPException(
-        status_code=500,
-        detail=f"All AI generation attempts failed. Errors: {'; '.join(errors)}"
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        print(f"Persona job {job.id} failed: {detail}")
+        await persona_jobs.fail(job, detail)
+    if job.callback_url:
+        await deliver_webhook(job)
+
+async def start_persona_job(answers: QuizAnswers, callback_url: Optional[str]) -> PersonaJob:
+    try:
+        job = await persona_jobs.create(callback_url)
+    except JobLimitExceeded as e:
+        raise HTTPException(status_code=503, detail=f"Too many pending persona jobs: {str(e)}")
+    # The task inherits the request's context, so its metrics keep the hybrid endpoint label
+    task = asyncio.create_task(run_persona_job(job, answers))
+    job_tasks.add(task)
+    task.add_done_callback(job_tasks.discard)
+    return job
+
+async def stream_job_events(job: PersonaJob) -> AsyncIterator[bytes]:
+    """SSE for one job: `pending` right away, keep-alive comments, then `done` or `error`"""
+    if not job.done:
+        yield sse_event("pending", {"job_id": job.id})
+    while not await persona_jobs.wait(job, 15):
+        yield b": keep-alive\n\n"
+    if job.status == "done":
+        yield sse_event("done", job.result)
+    else:
+        yield sse_event("error", {"detail": job.error})
+
+# Durable Job Queue
+
+job_queue: Optional[SQLiteJobQueue] = None
+job_workers: Optional[JobWorkers] = None
+
+async def run_queued_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Worker handler: one attempt through the provider chain"""
+    token = current_endpoint.set("/jobs")
+    try:
+        persona = await generate_persona_with_ai(QuizAnswers(**payload))
+    except HTTPException as e:
+        raise Exception(e.detail)
+    finally:
+        current_endpoint.reset(token)
+    return {"method": "ai", "persona": persona.model_dump()}
+
+def queued_job_fallback(payload: Dict[str, Any], error: str) -> Dict[str, Any]:
+    """Result stored with a job whose attempts all failed"""
+    answers = QuizAnswers(**payload)
+    nearest = nearest_persona(answers)
+    if nearest is not None:
+        fallbacks_total.inc("/jobs", "nearest")
+        return {
+            "method": "nearest-persona-fallback",
+            "persona": nearest["persona"].model_dump(),
+            "match_distance": nearest["match_distance"],
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+        }
+    fallbacks_total.inc("/jobs", "rules")
+    return {
+        "method": "rule-based-fallback",
+        "persona_tags": generate_persona_rules_based(answers),
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+async def start_job_workers():
+    global job_queue, job_workers
+    if not JOB_QUEUE_ENABLED:
+        return
+    # Opening the file and purging may wait on another worker's write lock
+    job_queue = await asyncio.to_thread(
+        SQLiteJobQueue,
+        JOB_QUEUE_DB,
+        max_depth=JOB_QUEUE_MAX_DEPTH,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        lease_seconds=JOB_LEASE_SECONDS,
+        retry_base_seconds=JOB_RETRY_BASE_SECONDS,
+        ttl_seconds=JOB_TTL_SECONDS,
     )
+    purged = await asyncio.to_thread(job_queue.purge)
+    depth = await asyncio.to_thread(job_queue.depth)
+    job_workers = JobWorkers(
+        job_queue,
+        run_queued_job,
+        fallback=queued_job_fallback,
+        concurrency=JOB_WORKERS,
+        on_claim=queue_wait_seconds.observe,
+    )
+    job_workers.start()
+    print(f"Job queue {JOB_QUEUE_DB}: {depth['queued']} queued, {purged} expired jobs purged, {JOB_WORKERS} workers")
 
-def generate_persona_rules_based(answers: QuizAnswers) -> List[str]:
-    """Fallback: Generate basic persona tags using rules"""
-    tags = []
-    
-    # Risk tolerance
-    if answers.risk_tolerance:
-        if answers.risk_tolerance <= 2:
-            tags.append('Low risk, stable')
-        elif answers.risk_tolerance == 3:
-            tags.append('Mid risk - balanced')
-        elif answers.risk_tolerance >= 4:
-            tags.append('High risk, high upside')
-    
-    # Involvement level
-    if answers.involvement_level:
-        if 'Capital partner' in answers.involvement_level:
-            tags.append('Capital partner')
-        elif 'Co pilot' in answers.involvement_level:
-            tags.append('Hands-on hybrid')
-        elif 'Operator' in answers.involvement_level:
-            tags.append('Active operator')
-    
-    # Time horizon
-    if answers.time_horizon:
-        if 'Less than 2' in answers.time_horizon:
-            tags.append('Short term')
-        elif '2-4' in answers.time_horizon:
-            tags.append('Medium term')
-        else:
-            tags.append('Long term')
-    
-    # Customer segment
-    if answers.customer_segment:
-        if 'B2C' in answers.customer_segment:
-            tags.append('B2C focused')
-        if 'B2B' in answers.customer_segment:
-            tags.append('B2B focused')
-    
-    # Experience
-    if answers.experience_level:
-        if 'new' in answers.experience_level.lower():
-            tags.append('New investor')
-        elif 'seasoned' in answers.experience_level.lower() or 'small or mid' in answers.experience_level.lower():
-            tags.append('Experienced operator')
-    
-    # Priority focus
-    if answers.priority_focus:
-        if 'People' in answers.priority_focus:
-            tags.append('People first')
-        if 'Process' in answers.priority_focus:
-            tags.append('Systems focused')
-        if 'Profit' in answers.priority_focus:
-            tags.append('Returns driven')
-    
-    # Remove duplicates and limit to 6
-    return list(set(tags))[:6]
+async def stop_job_workers():
+    if job_workers is not None:
+        await job_workers.stop()
 
 # API Endpoints
 
@@ -264,23 +1385,188 @@ async def root():
         "message": "Investor Persona Generator API",
         "version": "1.0",
         "endpoints": {
-            "/generate-persona": "POST - Generate AI-powered investor persona",
+            "/generate-persona": "POST - Generate AI-powered investor persona (?session_id= serves the quiz session's speculative persona)",
+            "/quiz/progress": "POST - Partial answers of a quiz session; starts a speculative generation once the dominant fields are known",
+            "/speculation/stats": "GET - Speculative generation hit rate, wasted calls and latency saved",
             "/generate-persona/basic": "POST - Generate rule-based persona tags only",
+            "/generate-persona/hybrid": "POST - Generate AI persona and rule-based tags (?progressive=true: tags now, AI persona via job)",
+            "/generate-persona/jobs/{job_id}": "GET - Progressive hybrid job status and AI persona (?wait=seconds to long-poll)",
+            "/generate-persona/jobs/{job_id}/events": "GET - Server-sent event when a progressive hybrid job finishes",
+            "/generate-persona/stream": "POST - Stream an AI persona field by field as server-sent events",
+            "/generate-persona/batch": "POST - Generate personas for a JSON array or NDJSON stream, streamed back as NDJSON",
+            "/jobs": "POST - Queue a persona generation; returns 202 with a job id",
+            "/jobs/{job_id}": "GET - Queued job status, attempts and result",
+            "/jobs/stats": "GET - Job queue depth, oldest job age and worker pool state",
+            "/providers": "GET - Provider router state, circuit breakers and ordering",
+            "/providers/latency": "GET - Provider latency and hedge thresholds",
+            "/providers/rate-limits": "GET - Client-side rate-limit buckets, queue waits and throttle events",
+            "/providers/transport": "GET - Shared provider HTTP transport settings and SDK client loading",
+            "/cache/stats": "GET - Persona cache and request coalescing counters",
+            "/match-opportunities": "POST - Rank catalog listings for quiz answers and persona tags",
+            "/opportunities/stats": "GET - Opportunity catalog size and index terms",
+            "/archetypes/stats": "GET - Precomputed archetype file and its coverage of /generate-persona traffic",
+            "/metrics": "GET - Prometheus metrics: request and per-stage latency histograms, fallbacks, parse failures, tokens",
+            "/providers/usage": "GET - Provider token usage and prompt-cache hits",
+            "/workers": "GET - Worker processes and the provider health they share",
             "/health": "GET - Health check"
         }
     }
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
+
+@app.get("/providers/latency")
+async def provider_latency():
+    """Rolling provider latencies and the hedge delays derived from them"""
+    return {
+        "strategy": "hedged" if hedge_policy.enabled else "sequential",
+        "deadline_seconds": GENERATION_DEADLINE_SECONDS,
+        "providers": hedge_policy.stats()
+    }
+
+@app.get("/providers")
+async def provider_status():
+    """Provider router state: circuit breakers, health statistics and current order"""
+    return provider_router.snapshot()
+
+@app.get("/providers/rate-limits")
+async def provider_rate_limits():
+    """Request and token bucket levels per provider, with queued, rejected and 429 counts"""
+    return {"enabled": RATE_LIMIT_ENABLED, **rate_limiter.snapshot()}
+
+@app.get("/providers/transport")
+async def provider_transport():
+    """Pool limits, timeouts and protocol of the HTTP client the provider SDKs share"""
+    return {
+        "mode": HTTP_TRANSPORT,
+        "pools": sorted(http_clients.clients) if http_clients is not None else [],
+        "warm_up": HTTP_WARMUP_ENABLED,
+        **transport_config.to_dict(),
+        "provider_loading": PROVIDER_LOADING,
+        "clients": {name: client.stats() for name, client in provider_clients.items()},
+    }
+
+@app.get("/providers/usage")
+async def provider_usage():
+    """Provider-reported token usage, with the share of input served from prompt caches"""
+    return {
+        "prompt_version": PROMPT_VERSION,
+        "prompt_encoding": PROMPT_ENCODING,
+        "providers": token_usage.stats()
+    }
+
+@app.get("/workers")
+async def worker_status():
+    """This worker process, the shared provider-health sync and the other live workers"""
+    if shared_provider_stats is None:
+        return {"worker_count": WORKER_COUNT, "pid": os.getpid(), "shared_state": None, "persona_cache_db": PERSONA_CACHE_DB or None, "workers": []}
+    return {
+        "worker_count": WORKER_COUNT,
+        "pid": os.getpid(),
+        "shared_state": shared_provider_stats.stats(),
+        "persona_cache_db": PERSONA_CACHE_DB or None,
+        "workers": await asyncio.to_thread(shared_provider_stats.workers),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition of request, stage, token and cache metrics"""
+    if job_queue is not None:
+        job_queue_gauges["depth"] = await asyncio.to_thread(job_queue.depth)
+        job_queue_gauges["oldest_queued_age"] = await asyncio.to_thread(job_queue.oldest_queued_age)
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Persona cache hit/miss counters, occupancy and coalesced requests"""
+    return {
+        "enabled": PERSONA_CACHE_ENABLED,
+        "prompt_version": PROMPT_VERSION,
+        "prompt_encoding": PROMPT_ENCODING,
+        "model_chain": MODEL_CHAIN,
+        # Counts the SQLite tier's rows, which may wait on another worker's lock
+        **await asyncio.to_thread(persona_cache.stats),
+        "singleflight": persona_flights.stats(),
+        "nearest_index": {
+            **persona_index.stats(),
+            "max_distance": PERSONA_INDEX_MAX_DISTANCE,
+            "full_fallback": PERSONA_INDEX_FULL_FALLBACK,
+            "memory_bytes": persona_index.nbytes(),
+        } if persona_index is not None else {"enabled": False}
+    }
+
+@app.post("/match-opportunities")
+async def match_opportunities(request: OpportunityMatchRequest):
+    """
+    Rank the listings in the opportunity catalog for an investor
+    
+    Listings score by the weighted quiz options (sectors, ticket size,
+    geography, deal structures, involvement) and persona tags they share
+    with the investor; `match` is the score relative to a listing matching
+    everything.
+    """
+    if opportunity_index is None:
+        raise HTTPException(status_code=503, detail="No opportunity catalog loaded (set OPPORTUNITIES_PATH)")
+    tags = request.persona_tags if request.persona_tags is not None else generate_persona_rules_based(request.answers)
+    return {
+        "opportunities": opportunity_index.match(request.answers.model_dump(exclude_none=True), tags, request.limit),
+        "persona_tags": tags,
+        "catalog_size": len(opportunity_index.listings),
+    }
+
+@app.get("/opportunities/stats")
+async def opportunity_stats():
+    if opportunity_index is None:
+        return {"enabled": False, "path": OPPORTUNITIES_PATH}
+    return {"enabled": True, "path": OPPORTUNITIES_PATH, **opportunity_index.stats()}
+
+@app.get("/archetypes/stats")
+async def archetype_stats(top: int = 20):
+    """Loaded archetype file, coverage of traffic so far and the most requested uncovered combinations"""
+    if archetype_store is None:
+        return {"enabled": False, "path": ARCHETYPES_PATH}
+    return {"enabled": True, **archetype_store.stats(top)}
+
+@app.post("/quiz/progress")
+async def quiz_progress(progress: QuizProgress):
+    """
+    Record a quiz session's answers so far
+
+    Once the fields that dominate the persona are answered, a persona is
+    generated in the background for the final submit to reuse.
+    """
+    if speculative_sessions is None:
+        return {"session_id": progress.session_id, "enabled": False, "speculating": False}
+    return {"enabled": True, **speculative_sessions.progress(progress.session_id, progress.answers.model_dump(exclude_none=True))}
+
+@app.get("/speculation/stats")
+async def speculation_stats():
+    if speculative_sessions is None:
+        return {"enabled": False}
+    return {"enabled": True, **speculative_sessions.stats()}
 
 @app.post("/generate-persona", response_model=PersonaResponse)
-async def generate_full_persona(answers: QuizAnswers):
+async def generate_full_persona(answers: QuizAnswers, response: Response, session_id: Optional[str] = None):
     """
     Generate comprehensive AI-powered investor persona
     
     This endpoint uses Claude AI to create a detailed, nuanced persona
     based on quiz responses.
+    
+    With the `session_id` of a quiz whose progress was posted to
+    /quiz/progress, the persona generated speculatively from the partial
+    answers is served (awaited if still running) when it saw every final
+    answer and they are close enough to the ones it was generated from,
+    marked by X-Persona-Source: speculative.
+    
+    Submissions without a key_lesson whose combination of the archetype
+    fields was precomputed (ARCHETYPES_PATH) are answered from the archetype
+    file, marked by X-Persona-Source: archetype.
+    
+    With PERSONA_INDEX_FULL_FALLBACK set, a provider outage or overload is
+    answered with the persona of the closest stored answers instead, marked
+    by the X-Persona-Source: nearest and X-Persona-Match-Distance headers.
     """
     if not os.environ.get("OPENAI_API_KEY") and not os.environ.get("GOOGLE_API_KEY") and not os.environ.get("ANTHROPIC_API_KEY"):
         raise HTTPException(
@@ -288,7 +1574,30 @@ async def generate_full_persona(answers: QuizAnswers):
             detail="No AI API keys configured (OPENAI_API_KEY, GOOGLE_API_KEY, or ANTHROPIC_API_KEY)"
         )
     
-    return generate_persona_with_ai(answers)
+    if session_id and speculative_sessions is not None:
+        speculative = await speculative_sessions.claim(session_id, answers.model_dump(exclude_none=True))
+        if speculative is not None:
+            generations_total.inc(current_endpoint.get(), "speculative")
+            response.headers["X-Persona-Source"] = "speculative"
+            return speculative
+    
+    if archetype_store is not None:
+        archetype = archetype_store.get(answers.model_dump(exclude_none=True))
+        if archetype is not None:
+            generations_total.inc(current_endpoint.get(), "archetype")
+            response.headers["X-Persona-Source"] = "archetype"
+            return PersonaResponse(**archetype)
+    
+    try:
+        return await generate_persona_with_ai(answers)
+    except HTTPException as e:
+        nearest = nearest_persona(answers) if PERSONA_INDEX_FULL_FALLBACK and e.status_code in (429, 500, 503, 504) else None
+        if nearest is None:
+            raise
+        fallbacks_total.inc(current_endpoint.get(), "nearest")
+        response.headers["X-Persona-Source"] = "nearest"
+        response.headers["X-Persona-Match-Distance"] = str(nearest["match_distance"])
+        return nearest["persona"]
 
 @app.post("/generate-persona/basic")
 async def generate_basic_persona(answers: QuizAnswers):
@@ -301,20 +1610,29 @@ async def generate_basic_persona(answers: QuizAnswers):
     
     return {
         "persona_tags": tags,
-        "generated_at": datetime.utcnow().isoformat(),
+        "generated_at": datetime.now(timezone.utc).isoformat(),
         "method": "rule-based"
     }
 
 @app.post("/generate-persona/hybrid")
-async def generate_hybrid_persona(answers: QuizAnswers):
+async def generate_hybrid_persona(answers: QuizAnswers, progressive: bool = False, callback_url: Optional[str] = None):
     """
     Generate persona with both AI and rule-based approaches
     
     Useful for comparison or as a backup strategy.
+    
+    With `progressive=true` the rule-based tags are returned immediately with
+    a job id, and the AI persona is delivered later: poll
+    /generate-persona/jobs/{job_id}, subscribe to its /events stream, or pass
+    `callback_url` to have the finished job POSTed there (only to hosts
+    listed in WEBHOOK_ALLOWED_HOSTS).
     """
+    if progressive:
+        return await start_progressive_hybrid(answers, callback_url)
+    
     try:
         # Try AI first
-        ai_persona = generate_persona_with_ai(answers)
+        ai_persona = await generate_persona_with_ai(answers)
         rule_tags = generate_persona_rules_based(answers)
         
         return {
@@ -323,14 +1641,159 @@ async def generate_hybrid_persona(answers: QuizAnswers):
             "method": "hybrid"
         }
     except Exception as e:
-        # Fallback to rules if AI fails
         rule_tags = generate_persona_rules_based(answers)
+        # Serve the persona generated for the most similar answers if there is one
+        nearest = nearest_persona(answers)
+        if nearest is not None:
+            fallbacks_total.inc(current_endpoint.get(), "nearest")
+            return {
+                "ai_persona": nearest["persona"],
+                "rule_based_tags": rule_tags,
+                "match_distance": nearest["match_distance"],
+                "error": str(e),
+                "method": "nearest-persona-fallback"
+            }
+        # Fallback to rules if AI fails
+        fallbacks_total.inc(current_endpoint.get(), "rules")
         return {
             "persona_tags": rule_tags,
             "error": str(e),
             "method": "rule-based-fallback"
         }
 
+async def start_progressive_hybrid(answers: QuizAnswers, callback_url: Optional[str]) -> Dict[str, Any]:
+    if callback_url:
+        try:
+            await callback_policy.check(callback_url)
+        except CallbackRejected as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    rule_tags = generate_persona_rules_based(answers)
+    
+    # A cached persona needs no job at all
+    if PERSONA_CACHE_ENABLED:
+        quiz_dict = answers.model_dump(exclude_none=True)
+        cached = await persona_cache.aget(persona_cache_key(quiz_dict, PROMPT_VERSION, MODEL_CHAIN))
+        if cached is not None:
+            generations_total.inc(current_endpoint.get(), "cache")
+            return {"ai_persona": cached, "rule_based_tags": rule_tags, "status": "done", "method": "hybrid"}
+    
+    job = await start_persona_job(answers, callback_url)
+    return {
+        "rule_based_tags": rule_tags,
+        "job_id": job.id,
+        "status": job.status,
+        "poll_url": f"/generate-persona/jobs/{job.id}",
+        "events_url": f"/generate-persona/jobs/{job.id}/events",
+        "method": "hybrid-progressive",
+    }
+
+@app.get("/generate-persona/jobs/{job_id}")
+async def get_persona_job(job_id: str, wait: float = 0):
+    """Status of a progressive hybrid job; `wait` holds the request until it finishes (capped)"""
+    job = await persona_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    await persona_jobs.wait(job, min(max(wait, 0), JOB_MAX_WAIT_SECONDS))
+    return job.to_dict()
+
+@app.get("/generate-persona/jobs/{job_id}/events")
+async def get_persona_job_events(job_id: str):
+    """Server-sent events for a progressive hybrid job"""
+    job = await persona_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return StreamingResponse(
+        stream_job_events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/generate-persona/stream")
+async def generate_streamed_persona(answers: QuizAnswers):
+    """
+    Stream an AI-powered persona as server-sent events
+    
+    Each persona field is pushed as soon as it is complete (persona_tags
+    first), so clients can render results before generation finishes.
+    """
+    return StreamingResponse(
+        stream_persona_events(answers),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/generate-persona/batch")
+async def generate_batch_personas(request: Request, concurrency: int = BATCH_CONCURRENCY):
+    """
+    Generate personas for a batch of quiz submissions
+    
+    Accepts a JSON array or an NDJSON stream of quiz answers and streams back
+    NDJSON results in completion order, each tagged with its input index.
+    Items whose AI generation fails fall back to rule-based tags.
+    """
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    
+    # The body is read up front: StreamingResponse listens for client
+    # disconnects on the same receive channel, so it cannot be consumed lazily
+    body = await request.body()
+    if "ndjson" in request.headers.get("content-type", ""):
+        items = parse_ndjson_items(body)
+    else:
+        try:
+            items = json.loads(body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON body: {str(e)}")
+        if not isinstance(items, list):
+            raise HTTPException(
+                status_code=400,
+                detail="Batch body must be a JSON array or an NDJSON stream of quiz answers"
+            )
+    
+    return StreamingResponse(stream_batch(items, concurrency), media_type="application/x-ndjson")
+
+@app.post("/jobs", status_code=202)
+async def enqueue_persona_job(answers: QuizAnswers):
+    """
+    Queue a persona generation instead of holding the request open for it
+    
+    The job is stored durably and generated by the worker pool, with retries;
+    poll GET /jobs/{job_id} for the result. Returns 429 when the queue is full.
+    """
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue is not enabled")
+    try:
+        job_id = await asyncio.to_thread(job_queue.enqueue, answers.model_dump(exclude_none=True))
+    except QueueFull as e:
+        oldest_age = await asyncio.to_thread(job_queue.oldest_queued_age)
+        return JSONResponse(
+            status_code=429,
+            content={"detail": f"Job queue is full: {str(e)}"},
+            headers={"Retry-After": str(max(1, round(oldest_age)))}
+        )
+    job_workers.notify()
+    return {"job_id": job_id, "status": "queued", "poll_url": f"/jobs/{job_id}"}
+
+@app.get("/jobs/stats")
+async def job_queue_stats():
+    """Queue depth per status, age of the oldest queued job and busy workers"""
+    if job_queue is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        **(await asyncio.to_thread(job_queue.stats)),
+        "workers": JOB_WORKERS,
+        "workers_busy": job_workers.busy,
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_queued_job(job_id: str):
+    """Status (queued, running, done, failed), attempts and result of a queued job"""
+    job = await asyncio.to_thread(job_queue.get, job_id) if job_queue is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Several workers need the app as an import string, so each process loads it
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=WORKER_COUNT)
\ No newline at end of file
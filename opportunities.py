@@ -0,0 +1,201 @@
+"""
+Opportunity matching over a local listing catalog
+
+Listings come from a JSON file (a list, or {"opportunities": [...]}) or a CSV
+with one row per listing. Each listing describes the business with the same
+vocabulary as the quiz:
+
+    sector          Data/Questions.json `sectors` options
+    ticket_size     `ticket_size` options
+    geography       `geo_scope` options
+    deal_structure  `deal_structures` options
+    involvement     `involvement_level` options
+    tags            persona tags the listing suits ("Long term", "Capital partner")
+
+Values may be lists (CSV: separated by ";") and may be fragments of the
+option text ("Co pilot", "Across India"), matched case-insensitively. Any
+other columns (id, title, url, ...) are passed through to the results.
+
+At load time every listing is posted under one term per matched option and
+tag, giving an inverted index from term to a NumPy array of listing numbers.
+A query turns the investor's answers and persona tags into weighted terms,
+adds each term's weight to the listings in its posting array, and takes the
+top k with argpartition, so scoring touches only listings that share a term
+with the investor.
+"""
+
+import csv
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from quiz_encoding import QUESTIONS
+
+# Catalog column -> quiz field it is matched against
+CATALOG_FIELDS = {
+    "sector": "sectors",
+    "ticket_size": "ticket_size",
+    "geography": "geo_scope",
+    "deal_structure": "deal_structures",
+    "involvement": "involvement_level",
+}
+
+DEFAULT_WEIGHTS = {
+    "sectors": 3.0,
+    "ticket_size": 2.0,
+    "involvement_level": 2.0,
+    "geo_scope": 1.5,
+    "deal_structures": 1.5,
+    "tags": 1.0,
+}
+
+# Answers meaning "anything goes": every listing qualifies equally, so they
+# add no term (a constant score would not change the ranking)
+OPEN_OPTIONS = {
+    "sectors": "I am open if economics are strong",
+    "deal_structures": "I am open to all, show me what is good",
+}
+
+# A ticket size one step away still earns this share of the weight
+ADJACENT_TICKET_CREDIT = 0.5
+
+LIST_SEPARATOR = ";"
+
+Term = Tuple[str, str]
+
+
+def load_catalog(path: str) -> List[Dict[str, Any]]:
+    if path.lower().endswith(".csv"):
+        with open(path, encoding="utf-8", newline="") as f:
+            return [dict(row) for row in csv.DictReader(f)]
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data["opportunities"] if isinstance(data, dict) else data
+
+
+def _values(value: Any) -> List[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(LIST_SEPARATOR) if part.strip()]
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [str(value)]
+
+
+class OpportunityIndex:
+    """Inverted index from quiz options and persona tags to catalog listings"""
+
+    def __init__(
+        self,
+        listings: Sequence[Dict[str, Any]],
+        weights: Optional[Dict[str, float]] = None,
+        questions: Sequence[Dict[str, Any]] = QUESTIONS,
+    ):
+        import numpy as np
+
+        self.np = np
+        self.listings = list(listings)
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.options: Dict[str, List[str]] = {
+            q["name"]: q["options"] for q in questions if q["name"] in CATALOG_FIELDS.values()
+        }
+        # Values that matched no option, per catalog column, for catalog hygiene
+        self.unmatched: Dict[str, int] = {column: 0 for column in CATALOG_FIELDS}
+        self._option_matches: Dict[Tuple[str, str], List[str]] = {}
+
+        postings: Dict[Term, List[int]] = {}
+        self.terms: List[Tuple[Term, ...]] = []
+        for number, listing in enumerate(self.listings):
+            terms = self.listing_terms(listing)
+            self.terms.append(terms)
+            for term in terms:
+                postings.setdefault(term, []).append(number)
+        self.postings: Dict[Term, Any] = {term: np.array(numbers, dtype=np.int32) for term, numbers in postings.items()}
+
+    def match_option(self, field: str, value: str) -> List[str]:
+        """Quiz options a catalog value names: the option itself, or a fragment of its text"""
+        options = self._option_matches.get((field, value))
+        if options is None:
+            needle = value.lower()
+            exact = [option for option in self.options[field] if option.lower() == needle]
+            options = exact or [option for option in self.options[field] if needle in option.lower()]
+            self._option_matches[field, value] = options
+        return options
+
+    def listing_terms(self, listing: Dict[str, Any]) -> Tuple[Term, ...]:
+        terms = []
+        for column, field in CATALOG_FIELDS.items():
+            for value in _values(listing.get(column)):
+                options = self.match_option(field, value)
+                if not options:
+                    self.unmatched[column] += 1
+                terms.extend((field, option) for option in options)
+        terms.extend(("tags", tag.lower()) for tag in _values(listing.get("tags")))
+        return tuple(dict.fromkeys(terms))
+
+    def query_terms(self, answers: Dict[str, Any], tags: Iterable[str] = ()) -> Dict[Term, float]:
+        """Weighted terms for an investor: their answers to the catalog fields plus persona tags"""
+        terms: Dict[Term, float] = {}
+        for field in CATALOG_FIELDS.values():
+            for value in _values(answers.get(field)):
+                if value == OPEN_OPTIONS.get(field) or value not in self.options[field]:
+                    continue
+                terms[field, value] = self.weights[field]
+                if field == "ticket_size":
+                    position = self.options[field].index(value)
+                    for neighbour in (position - 1, position + 1):
+                        if 0 <= neighbour < len(self.options[field]):
+                            term = (field, self.options[field][neighbour])
+                            terms.setdefault(term, self.weights[field] * ADJACENT_TICKET_CREDIT)
+        for tag in tags:
+            terms[("tags", tag.lower())] = self.weights["tags"]
+        return terms
+
+    def scores(self, terms: Dict[Term, float]):
+        np = self.np
+        scores = np.zeros(len(self.listings), dtype=np.float32)
+        for term, weight in terms.items():
+            numbers = self.postings.get(term)
+            if numbers is not None:
+                # A listing appears at most once per posting, so plain fancy-index add is exact
+                scores[numbers] += weight
+        return scores
+
+    def top(self, terms: Dict[Term, float], k: int = 10) -> List[Tuple[int, float]]:
+        """(listing number, score) of the k best-scoring listings with any matching term, best first"""
+        np = self.np
+        scores = self.scores(terms)
+        k = min(k, len(scores))
+        if not k:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        # Highest score first, ties in catalog order
+        ranked = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(int(number), float(scores[number])) for number in ranked if scores[number] > 0]
+
+    def match(self, answers: Dict[str, Any], tags: Iterable[str] = (), k: int = 10) -> List[Dict[str, Any]]:
+        """Ranked listings with their score, score relative to a perfect match, and the terms they matched"""
+        terms = self.query_terms(answers, tags)
+        best_possible = sum(
+            weight for (field, value), weight in terms.items()
+            if field != "ticket_size" or value == answers.get("ticket_size")
+        )
+        results = []
+        for number, score in self.top(terms, k):
+            matched = [term for term in self.terms[number] if term in terms]
+            results.append({
+                **self.listings[number],
+                "score": round(score, 3),
+                "match": round(min(1.0, score / best_possible), 3) if best_possible else 0.0,
+                "matched": [{"field": field, "value": value} for field, value in matched],
+            })
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "listings": len(self.listings),
+            "terms": len(self.postings),
+            "postings": sum(len(numbers) for numbers in self.postings.values()),
+            "weights": self.weights,
+            "unmatched_values": self.unmatched,
+        }
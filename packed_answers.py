@@ -0,0 +1,224 @@
+"""
+Bit-packed quiz answers
+
+Every answer except `key_lesson` comes from a fixed option set in
+Data/Questions.json, so a submission fits in one 64-bit key:
+
+- single choice: the option code (1-based, as in quiz_encoding), 0 if unanswered
+- slider: value - min + 1, 0 if unanswered
+- multi select: a bitmask with bit i set for option i + 1
+
+Fields are packed LSB first in quiz order (57 bits for the current quiz).
+Free text and values outside the option sets (older quiz versions) cannot be
+packed; they go into a side entry, the canonical JSON of just those fields,
+and the top bit of the key marks that a side entry exists. `PackedAnswers`
+interns side entries, so a corpus is a uint64 key array plus a uint32 side
+id array and a table of distinct strings.
+
+Packing follows `canonical_answers`: empty strings and lists mean
+unanswered, and multi-selects decode in quiz order, so
+`canonical_answers(decode(*encode(a))) == canonical_answers(a)`.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from quiz_encoding import QUESTIONS
+
+SIDE_ENTRY_BIT = 1 << 63
+
+SINGLE = "single"
+SLIDER = "slider"
+MULTI = "multi"
+
+
+class PackedField:
+    def __init__(self, name: str, kind: str, shift: int, bits: int, options: Sequence[Any]):
+        self.name = name
+        self.kind = kind
+        self.shift = shift
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.options = list(options)
+        # option -> its code (single, slider) or bit (multi), already shifted into place
+        if kind == MULTI:
+            self.packed = {option: 1 << (shift + i) for i, option in enumerate(self.options)}
+            # mask -> selected options, in quiz order
+            self.decoded = [
+                tuple(option for i, option in enumerate(self.options) if mask >> i & 1) for mask in range(1 << bits)
+            ]
+        else:
+            self.packed = {option: code << shift for code, option in enumerate(self.options, start=1)}
+            self.decoded = [None] + self.options
+
+
+class AnswerCodec:
+    """Packing layout for one version of Data/Questions.json"""
+
+    def __init__(self, questions: Sequence[Dict[str, Any]] = QUESTIONS):
+        self.fields: List[PackedField] = []
+        self.text_fields: List[str] = []
+        shift = 0
+        for q in questions:
+            if q["type"] == "slider":
+                kind, options = SLIDER, list(range(q["min"], q["max"] + 1))
+            elif q.get("options") and q["type"] == "multi":
+                kind, options = MULTI, q["options"]
+            elif q.get("options"):
+                kind, options = SINGLE, q["options"]
+            else:
+                self.text_fields.append(q["name"])
+                continue
+            bits = len(options) if kind == MULTI else len(options).bit_length()
+            self.fields.append(PackedField(q["name"], kind, shift, bits, options))
+            shift += bits
+        if shift > 63:
+            raise ValueError(f"Quiz needs {shift} bits; at most 63 fit next to the side-entry flag")
+        self.bits = shift
+        self.by_name = {field.name: field for field in self.fields}
+        self._decoders = [(f.name, f.shift, f.mask, f.decoded, f.kind == MULTI) for f in self.fields]
+
+    def encode(self, answers: Dict[str, Any]) -> Tuple[int, Optional[str]]:
+        """(key, side entry JSON or None) for an answer dict"""
+        key = 0
+        side = None
+        for name, value in answers.items():
+            if value is None or value == "" or value == []:
+                continue
+            field = self.by_name.get(name)
+            if field is not None:
+                packed = field.packed
+                if type(value) is list:
+                    if field.kind == MULTI:
+                        bits = [packed.get(item) for item in value]
+                        if None not in bits:
+                            for bit in bits:
+                                key |= bit
+                            continue
+                else:
+                    code = packed.get(value)
+                    if code is not None and field.kind != MULTI:
+                        key |= code
+                        continue
+            if side is None:
+                side = {}
+            side[name] = sorted(value) if isinstance(value, list) else value
+        if side is None:
+            return key, None
+        return key | SIDE_ENTRY_BIT, json.dumps(side, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+    def decode(self, key: int, side: Optional[str] = None) -> Dict[str, Any]:
+        """Answer dict for a key and its side entry, in quiz order"""
+        answers = {}
+        for name, shift, mask, decoded, multi in self._decoders:
+            code = (key >> shift) & mask
+            if code:
+                answers[name] = list(decoded[code]) if multi else decoded[code]
+        if side is not None:
+            answers.update(json.loads(side))
+        return answers
+
+    def stable_key(self, key: int, side: Optional[str] = None) -> str:
+        """Process-independent dedup/cache key: the packed key, plus a hash of the side entry if any"""
+        if side is None:
+            return f"{key:016x}"
+        return f"{key:016x}-{hashlib.sha256(side.encode('utf-8')).hexdigest()[:16]}"
+
+
+class PackedAnswers:
+    """
+    Array-backed corpus of packed submissions
+
+    Keys and side ids live in growable NumPy arrays (uint64 and uint32; side
+    id 0 means no side entry), with distinct side entries interned in
+    `strings`. `column(name)` unpacks one field for the whole corpus with
+    vectorized shifts.
+    """
+
+    def __init__(self, codec: AnswerCodec, capacity: int = 1024):
+        import numpy as np
+
+        self.np = np
+        self.codec = codec
+        self.keys = np.zeros(capacity, dtype=np.uint64)
+        self.side_ids = np.zeros(capacity, dtype=np.uint32)
+        self.size = 0
+        # Side id - 1 -> side entry JSON
+        self.strings: List[str] = []
+        self._interned: Dict[str, int] = {}
+
+    @classmethod
+    def from_answers(cls, codec: AnswerCodec, submissions: Iterable[Dict[str, Any]]) -> "PackedAnswers":
+        if not isinstance(submissions, Sequence):
+            submissions = list(submissions)
+        packed = cls(codec, capacity=max(1, len(submissions)))
+        packed.extend(submissions)
+        return packed
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _reserve(self, count: int):
+        if self.size + count <= len(self.keys):
+            return
+        capacity = max(self.size + count, len(self.keys) * 2)
+        for name in ("keys", "side_ids"):
+            grown = self.np.zeros(capacity, dtype=getattr(self, name).dtype)
+            grown[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, grown)
+
+    def intern(self, side: Optional[str]) -> int:
+        if side is None:
+            return 0
+        side_id = self._interned.get(side)
+        if side_id is None:
+            self.strings.append(side)
+            side_id = self._interned[side] = len(self.strings)
+        return side_id
+
+    def append(self, answers: Dict[str, Any]):
+        self.extend((answers,))
+
+    def extend(self, submissions: Iterable[Dict[str, Any]]):
+        encoded = [self.codec.encode(answers) for answers in submissions]
+        self._reserve(len(encoded))
+        end = self.size + len(encoded)
+        self.keys[self.size:end] = [key for key, _ in encoded]
+        self.side_ids[self.size:end] = [self.intern(side) for _, side in encoded]
+        self.size = end
+
+    def side(self, index: int) -> Optional[str]:
+        side_id = int(self.side_ids[index])
+        return self.strings[side_id - 1] if side_id else None
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        if not -self.size <= index < self.size:
+            raise IndexError(index)
+        index %= self.size
+        return self.codec.decode(int(self.keys[index]), self.side(index))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for index in range(self.size):
+            yield self[index]
+
+    def column(self, name: str):
+        """Packed codes of one field for every row (option code, slider offset or bitmask)"""
+        field = self.codec.by_name[name]
+        np = self.np
+        return ((self.keys[:self.size] >> np.uint64(field.shift)) & np.uint64(field.mask)).astype(np.int64)
+
+    def unique_indexes(self):
+        """Index of the first occurrence of each distinct submission"""
+        np = self.np
+        rows = np.stack([self.keys[:self.size], self.side_ids[:self.size].astype(np.uint64)], axis=1)
+        _, first = np.unique(rows, axis=0, return_index=True)
+        return np.sort(first)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held for the stored rows and side entries (excluding spare capacity)"""
+        return (
+            self.size * (self.keys.itemsize + self.side_ids.itemsize)
+            + sum(len(side.encode("utf-8")) for side in self.strings)
+        )
@@ -0,0 +1,251 @@
+"""
+Content-addressed persona cache
+
+Personas are keyed on a canonical hash of the quiz answers plus the prompt
+version and the provider model chain, so identical submissions (in any
+multi-select order) reuse a previously generated persona. Lookups go to an
+in-process LRU with TTL first and, when configured, to a SQLite tier that
+survives restarts. The SQLite tier may be shared by several worker processes
+and wait on their locks, so code on the event loop uses `aget`/`aset`, which
+run it in a worker thread.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def canonical_answers(answers: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalise a quiz answer dict for hashing
+
+    Multi-select lists are sorted so option order does not matter, and empty
+    strings/lists are dropped because they carry the same meaning as an
+    unanswered question.
+    """
+    canonical = {}
+    for field, value in answers.items():
+        if value is None or value == "" or value == []:
+            continue
+        if isinstance(value, list):
+            value = sorted(value)
+        canonical[field] = value
+    return canonical
+
+
+def persona_cache_key(answers: Dict[str, Any], prompt_version: str, model: str) -> str:
+    payload = json.dumps(
+        {"answers": canonical_answers(answers), "prompt_version": prompt_version, "model": model},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Size-bounded LRU with a per-entry TTL"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLitePersonaStore:
+    """
+    Persistent key -> JSON store with the same TTL semantics as LRUCache
+
+    Rows may also keep the quiz answers they were generated for, so a
+    process starting up can rebuild an answer-indexed view (persona_index)
+    from them with `answered`.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 86400):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS personas ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(personas)")]
+        if "answers" not in columns:
+            try:
+                self._conn.execute("ALTER TABLE personas ADD COLUMN answers TEXT")
+            except sqlite3.OperationalError:
+                # Another worker added it first
+                pass
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM personas WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if created_at + self.ttl_seconds < time.time():
+            with self._lock:
+                self._conn.execute("DELETE FROM personas WHERE key = ?", (key,))
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value: dict, answers: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO personas (key, value, created_at, answers) VALUES (?, ?, ?, ?)",
+                (
+                    key,
+                    json.dumps(value, ensure_ascii=False),
+                    time.time(),
+                    json.dumps(answers, ensure_ascii=False) if answers is not None else None,
+                ),
+            )
+
+    def answered(self, after: int = 0, limit: int = 1000) -> List[Tuple[int, Dict[str, Any], dict]]:
+        """
+        Unexpired rows stored with their answers, oldest first: (position,
+        answers, value). Pass the last position back as `after` for the next page.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid, answers, value FROM personas "
+                "WHERE rowid > ? AND answers IS NOT NULL AND created_at >= ? ORDER BY rowid LIMIT ?",
+                (after, time.time() - self.ttl_seconds, limit),
+            ).fetchall()
+        return [(rowid, json.loads(answers), json.loads(value)) for rowid, answers, value in rows]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM personas")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM personas").fetchone()[0]
+
+
+class PersonaCache:
+    """
+    Two-tier persona cache with hit/miss counters
+
+    `loads` turns a dict read back from the persistent tier into the object
+    callers expect (e.g. a PersonaResponse); `dumps` does the reverse. Objects
+    held in memory are returned as-is, so callers must treat them as read-only.
+    """
+
+    def __init__(
+        self,
+        memory: LRUCache,
+        persistent: Optional[SQLitePersonaStore] = None,
+        loads=lambda data: data,
+        dumps=lambda value: value,
+    ):
+        self.memory = memory
+        self.persistent = persistent
+        self.loads = loads
+        self.dumps = dumps
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        value = self._from_memory(key)
+        if value is not None or self.persistent is None:
+            return value
+        return self._from_persistent(key, self.persistent.get(key))
+
+    async def aget(self, key: str):
+        """`get` with the SQLite tier read in a worker thread"""
+        value = self._from_memory(key)
+        if value is not None or self.persistent is None:
+            return value
+        return self._from_persistent(key, await asyncio.to_thread(self.persistent.get, key))
+
+    def _from_memory(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+        elif self.persistent is None:
+            self.misses += 1
+        return value
+
+    def _from_persistent(self, key: str, data: Optional[dict]):
+        if data is None:
+            self.misses += 1
+            return None
+        value = self.loads(data)
+        self.memory.set(key, value)
+        self.persistent_hits += 1
+        return value
+
+    def set(self, key: str, value, answers: Optional[Dict[str, Any]] = None):
+        """Store `value`; the SQLite tier also keeps the `answers` it was generated for"""
+        self.memory.set(key, value)
+        if self.persistent is not None:
+            self.persistent.set(key, self.dumps(value), answers)
+
+    async def aset(self, key: str, value, answers: Optional[Dict[str, Any]] = None):
+        """`set` with the SQLite tier written in a worker thread"""
+        self.memory.set(key, value)
+        if self.persistent is not None:
+            await asyncio.to_thread(self.persistent.set, key, self.dumps(value), answers)
+
+    def clear(self):
+        self.memory.clear()
+        if self.persistent is not None:
+            self.persistent.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        hits = self.memory_hits + self.persistent_hits
+        return {
+            "lookups": lookups,
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_max_entries": self.memory.max_entries,
+            "evictions": self.memory.evictions,
+            "expirations": self.memory.expirations,
+            "ttl_seconds": self.memory.ttl_seconds,
+            "persistent_path": self.persistent.path if self.persistent is not None else None,
+            "persistent_entries": len(self.persistent) if self.persistent is not None else None,
+        }
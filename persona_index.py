@@ -0,0 +1,313 @@
+"""
+Nearest-neighbour index over generated personas
+
+Every persona generated by a provider is stored under its packed answers
+(see packed_answers), so when no provider can answer, the persona generated
+for the most similar answer set can be served instead, with its distance.
+
+Distance is a weighted mismatch over the fields the query answered, scaled
+to 0..1: single choice fields cost their weight when the codes differ, the
+risk slider costs weight * |difference| / range, and multi-select fields
+cost weight * Jaccard distance of the two option sets. Fields the query left
+unanswered cost nothing; fields only the stored persona left unanswered cost
+their full weight.
+
+Search works on the packed keys directly. Adjacent fields are grouped into
+chunks of at most CHUNK_BITS key bits, and for each query every chunk gets a
+table of the combined cost of all its possible values. Rows keep their
+chunk values as offsets into the concatenation of those tables, so scoring
+a partition is one gather per chunk. Rows are partitioned by the
+codes of a few heavy fields; partitions are scanned in order of their lower
+bound (the cost of those fields alone), stopping once no remaining
+partition can beat the best match, which keeps lookups well under a
+millisecond at millions of entries when answers cluster.
+
+Personas are kept as zlib-compressed JSON, a few hundred bytes each; the
+index holds at most `max_entries`, evicting the oldest first.
+"""
+
+import json
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from packed_answers import MULTI, SIDE_ENTRY_BIT, SLIDER, AnswerCodec, PackedField
+
+CHUNK_BITS = 12
+
+DEFAULT_WEIGHTS = {
+    "goal_primary": 3.0,
+    "involvement_level": 3.0,
+    "risk_tolerance": 3.0,
+    "time_horizon": 2.0,
+    "ticket_size": 2.0,
+    "sectors": 2.0,
+    "experience_level": 2.0,
+}
+DEFAULT_PARTITION_FIELDS = ("goal_primary", "involvement_level", "risk_tolerance", "time_horizon")
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """'sectors=3,geo_scope=0.5' -> {'sectors': 3.0, 'geo_scope': 0.5}"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+class _Partition:
+    def __init__(self, np, codes: Tuple[int, ...], chunks: int):
+        self.codes = codes
+        self.keys = np.zeros(16, dtype=np.uint64)
+        # Chunk x row -> position of the row's chunk value in the query's concatenated cost table
+        self.chunk_codes = np.zeros((chunks, 16), dtype=np.uint16)
+        self.blobs: List[bytes] = []
+
+    def find(self, key) -> int:
+        matches = (self.keys[:len(self.blobs)] == key).nonzero()[0]
+        return int(matches[0]) if len(matches) else -1
+
+
+class PersonaIndex:
+    """
+    Packed answers -> persona, searchable by weighted answer distance
+
+    `loads` turns the stored dict back into the object callers expect (e.g. a
+    PersonaResponse) and `dumps` does the reverse, as in PersonaCache.
+    """
+
+    def __init__(
+        self,
+        codec: AnswerCodec,
+        max_entries: int = 1_000_000,
+        weights: Optional[Dict[str, float]] = None,
+        partition_fields: Sequence[str] = DEFAULT_PARTITION_FIELDS,
+        loads: Callable[[Dict[str, Any]], Any] = lambda data: data,
+        dumps: Callable[[Any], Dict[str, Any]] = lambda value: value,
+    ):
+        import numpy as np
+
+        self.np = np
+        self.codec = codec
+        self.max_entries = max_entries
+        self.loads = loads
+        self.dumps = dumps
+        self.weights = {field.name: 1.0 for field in codec.fields}
+        weights = DEFAULT_WEIGHTS if weights is None else weights
+        self.weights.update({name: weight for name, weight in weights.items() if name in self.weights})
+
+        self.chunks: List[List[PackedField]] = []
+        for field in codec.fields:
+            chunk = self.chunks[-1] if self.chunks else None
+            if chunk and field.shift + field.bits - chunk[0].shift <= CHUNK_BITS:
+                chunk.append(field)
+            else:
+                self.chunks.append([field])
+        self._chunk_offsets = []
+        offset = 0
+        for chunk in self.chunks:
+            bits = chunk[-1].shift + chunk[-1].bits - chunk[0].shift
+            self._chunk_offsets.append((chunk[0].shift, (1 << bits) - 1, offset))
+            offset += 1 << bits
+        self._field_cost_cache: Dict[Tuple[str, int], Any] = {}
+        self._popcount = np.array([bin(mask).count("1") for mask in range(1 << CHUNK_BITS)])
+        self.partition_fields = [codec.by_name[name] for name in partition_fields if name in codec.by_name]
+
+        self.partitions: Dict[Tuple[int, ...], _Partition] = {}
+        self._partition_list: List[_Partition] = []
+        # Partition number x partition field -> code, for the lower bounds
+        self._partition_codes = np.zeros((0, len(self.partition_fields)), dtype=np.int64)
+        # Keys in insertion order, for evicting the oldest
+        self._order = np.zeros(min(max_entries, 1024), dtype=np.uint64)
+        self._head = 0
+        self.size = 0
+
+        self.lookups = 0
+        self.matches = 0
+        self.exact_matches = 0
+        self.evictions = 0
+        self.search_seconds = 0.0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _partition(self, key: int, create: bool = False) -> Optional[_Partition]:
+        codes = tuple((key >> field.shift) & field.mask for field in self.partition_fields)
+        partition = self.partitions.get(codes)
+        if partition is None and create:
+            partition = self.partitions[codes] = _Partition(self.np, codes, len(self.chunks))
+            self._partition_list.append(partition)
+            self._partition_codes = self.np.vstack([self._partition_codes, [codes]])
+        return partition
+
+    def add(self, answers: Dict[str, Any], persona: Any):
+        """Store a persona; a persona already stored for the same packed answers is replaced"""
+        key = self.codec.encode(answers)[0] & ~SIDE_ENTRY_BIT
+        blob = zlib.compress(json.dumps(self.dumps(persona), ensure_ascii=False).encode("utf-8"), 1)
+        partition = self._partition(key, create=True)
+        row = partition.find(key)
+        if row >= 0:
+            partition.blobs[row] = blob
+            return
+        if self.size >= self.max_entries:
+            # Full: the ring slot at _head holds the oldest key
+            self._evict(int(self._order[self._head]))
+            self._order[self._head] = key
+            self._head = (self._head + 1) % self.max_entries
+        else:
+            if self.size == len(self._order):
+                grown = self.np.zeros(min(self.max_entries, self.size * 2), dtype=self.np.uint64)
+                grown[:self.size] = self._order
+                self._order = grown
+            self._order[self.size] = key
+        row = len(partition.blobs)
+        if row == len(partition.keys):
+            partition.keys = self.np.concatenate([partition.keys, self.np.zeros_like(partition.keys)])
+            partition.chunk_codes = self.np.concatenate([partition.chunk_codes, self.np.zeros_like(partition.chunk_codes)], axis=1)
+        partition.keys[row] = key
+        partition.chunk_codes[:, row] = [((key >> shift) & mask) + offset for shift, mask, offset in self._chunk_offsets]
+        partition.blobs.append(blob)
+        self.size += 1
+
+    def _evict(self, key: int):
+        partition = self._partition(key)
+        row = partition.find(key) if partition is not None else -1
+        if row < 0:
+            return
+        last = len(partition.blobs) - 1
+        partition.keys[row] = partition.keys[last]
+        partition.chunk_codes[:, row] = partition.chunk_codes[:, last]
+        partition.blobs[row] = partition.blobs[last]
+        partition.blobs.pop()
+        self.size -= 1
+        self.evictions += 1
+
+    def _field_costs(self, field: PackedField, code: int):
+        """Cost of every possible stored code of a field against the query's code"""
+        costs = self._field_cost_cache.get((field.name, code))
+        if costs is None:
+            costs = self._field_cost_cache[field.name, code] = self._compute_field_costs(field, code)
+        return costs
+
+    def _compute_field_costs(self, field: PackedField, code: int):
+        np = self.np
+        weight = self.weights[field.name]
+        stored = np.arange(1 << field.bits)
+        if not code:
+            return np.zeros(len(stored))
+        if field.kind == MULTI:
+            popcount = self._popcount
+            return weight * (1 - popcount[stored & code] / popcount[stored | code])
+        if field.kind == SLIDER:
+            costs = weight * np.abs(stored - code) / max(1, len(field.options) - 1)
+        else:
+            costs = weight * (stored != code)
+        costs[0] = weight
+        costs[len(field.options) + 1:] = weight
+        return costs
+
+    def _query_tables(self, key: int):
+        np = self.np
+        answered = 0.0
+        costs = {}
+        for field in self.codec.fields:
+            code = (key >> field.shift) & field.mask
+            costs[field.name] = self._field_costs(field, code)
+            if code:
+                answered += self.weights[field.name]
+        if not answered:
+            return None
+        scale = 1 / answered
+        tables = []
+        for chunk in self.chunks:
+            # Later fields sit in the higher bits of the chunk index
+            table = costs[chunk[0].name]
+            for field in chunk[1:]:
+                table = np.add.outer(costs[field.name], table).ravel()
+            tables.append(table)
+        table = (np.concatenate(tables) * scale).astype(np.float32)
+        bounds = np.zeros(len(self._partition_list))
+        for column, field in enumerate(self.partition_fields):
+            bounds += costs[field.name][self._partition_codes[:len(bounds), column]] * scale
+        return table, bounds
+
+    def nearest(self, answers: Dict[str, Any], max_distance: float = 1.0) -> Optional[Tuple[Any, float]]:
+        """(persona, distance) of the closest stored answers within max_distance, or None"""
+        started = time.perf_counter()
+        self.lookups += 1
+        try:
+            if not self.size:
+                return None
+            query = self._query_tables(self.codec.encode(answers)[0] & ~SIDE_ENTRY_BIT)
+            if query is None:
+                return None
+            table, bounds = query
+            np = self.np
+            order = bounds.argsort()
+            best, best_distance = None, max_distance
+            # Scan the most promising partition first, then every partition
+            # whose lower bound can still beat that match in one batch
+            position = 0
+            while best is None and position < len(order) and bounds[order[position]] <= best_distance:
+                best, best_distance = self._scan([self._partition_list[order[position]]], table, best, best_distance)
+                position += 1
+            end = position + int(np.searchsorted(bounds[order[position:]], best_distance, side="right"))
+            if end > position:
+                candidates = [self._partition_list[number] for number in order[position:end]]
+                best, best_distance = self._scan(candidates, table, best, best_distance)
+            if best is None:
+                return None
+            self.matches += 1
+            if best_distance <= 0:
+                self.exact_matches += 1
+            return self.loads(json.loads(zlib.decompress(best))), max(0.0, best_distance)
+        finally:
+            self.search_seconds += time.perf_counter() - started
+
+    def _scan(self, partitions: List[_Partition], table, best: Optional[bytes], best_distance: float):
+        partitions = [partition for partition in partitions if partition.blobs]
+        if not partitions:
+            return best, best_distance
+        if len(partitions) == 1:
+            codes = partitions[0].chunk_codes[:, :len(partitions[0].blobs)]
+        else:
+            codes = self.np.concatenate([partition.chunk_codes[:, :len(partition.blobs)] for partition in partitions], axis=1)
+        distances = table.take(codes[0])
+        for column in codes[1:]:
+            distances += table.take(column)
+        row = int(distances.argmin())
+        if distances[row] > best_distance:
+            return best, best_distance
+        distance = float(distances[row])
+        for partition in partitions:
+            if row < len(partition.blobs):
+                return partition.blobs[row], distance
+            row -= len(partition.blobs)
+
+    def clear(self):
+        self.partitions.clear()
+        self._partition_list.clear()
+        self._partition_codes = self._partition_codes[:0]
+        self._head = 0
+        self.size = 0
+
+    def nbytes(self) -> int:
+        """Approximate memory held by keys, chunk codes, insertion order and compressed personas"""
+        return (
+            len(self._order) * 8
+            + sum(partition.keys.nbytes + partition.chunk_codes.nbytes + sum(len(blob) + 33 for blob in partition.blobs) for partition in self._partition_list)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": self.size,
+            "max_entries": self.max_entries,
+            "partitions": len(self.partitions),
+            "evictions": self.evictions,
+            "lookups": self.lookups,
+            "matches": self.matches,
+            "exact_matches": self.exact_matches,
+            "avg_search_ms": self.search_seconds / self.lookups * 1000 if self.lookups else 0.0,
+            "weights": self.weights,
+        }
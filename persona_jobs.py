@@ -0,0 +1,250 @@
+"""
+Handles for AI personas that are still being generated
+
+The progressive hybrid endpoint answers with rule-based tags straight away
+and hands out a job id; the AI persona is attached to the job when it is
+ready. Clients pick it up by polling (optionally long-polling), over SSE, or
+through a webhook. Jobs live in memory for `ttl_seconds` after they finish.
+
+With several worker processes the poll or SSE request usually lands on a
+worker other than the one generating the persona. A `SQLiteJobStore` shared
+by the workers then holds every job as well: the generating worker writes it
+when it is created and when it finishes, and another worker asked for it
+reads it from the file and follows it by polling the file. A pending job
+whose worker exited is reported failed after `max_pending_seconds`.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class JobLimitExceeded(Exception):
+    pass
+
+
+class PersonaJob:
+    __slots__ = ("id", "status", "created_at", "finished_at", "result", "error", "callback_url", "local", "_done")
+
+    def __init__(self, callback_url: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.status = "pending"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.callback_url = callback_url
+        # False for a job another worker is generating, read from the store
+        self.local = True
+        self._done = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status != "pending"
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for the job to finish; True if it has"""
+        if not self.done and timeout > 0:
+            try:
+                await asyncio.wait_for(self._done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.done
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "ai_persona": self.result,
+            "error": self.error,
+        }
+
+
+# (status, created_at, finished_at, result, error) as stored
+JobRow = Tuple[str, float, Optional[float], Optional[Dict[str, Any]], Optional[str]]
+
+
+class SQLiteJobStore:
+    """
+    Progressive jobs in a SQLite file shared by the worker processes
+
+    The methods block; PersonaJobs calls them through `asyncio.to_thread`.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 3600, worker: Optional[str] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS persona_jobs ("
+            "id TEXT PRIMARY KEY, worker TEXT NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL, "
+            "finished_at REAL, result TEXT, error TEXT)"
+        )
+
+    def save(self, job: PersonaJob):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO persona_jobs (id, worker, status, created_at, finished_at, result, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.id, self.worker, job.status, job.created_at, job.finished_at,
+                    json.dumps(job.result, ensure_ascii=False) if job.result is not None else None, job.error,
+                ),
+            )
+            if now - self._last_purge >= 60:
+                self._conn.execute("DELETE FROM persona_jobs WHERE finished_at < ?", (now - self.ttl_seconds,))
+                self._last_purge = now
+
+    def load(self, job_id: str) -> Optional[JobRow]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, created_at, finished_at, result, error FROM persona_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, created_at, finished_at, result, error = row
+        return status, created_at, finished_at, json.loads(result) if result is not None else None, error
+
+
+class PersonaJobs:
+    """
+    Registry of progressive jobs, bounded in count and in how long finished jobs are kept
+
+    Counts and limits are per worker; with a `store`, jobs created by other
+    workers are found through it too.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int = 10000,
+        ttl_seconds: float = 3600,
+        store: Optional[SQLiteJobStore] = None,
+        poll_seconds: float = 0.5,
+        max_pending_seconds: float = 600,
+    ):
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        self.poll_seconds = poll_seconds
+        self.max_pending_seconds = max_pending_seconds
+        self._jobs: "OrderedDict[str, PersonaJob]" = OrderedDict()
+        self.created = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.store_errors = 0
+        self._expired_at = 0.0
+
+    async def _save(self, job: PersonaJob):
+        if self.store is None:
+            return
+        try:
+            await asyncio.to_thread(self.store.save, job)
+        except sqlite3.Error as e:
+            # The job still completes here; only other workers miss the update
+            self.store_errors += 1
+            print(f"Persona job {job.id} not saved to {self.store.path}: {e}")
+
+    async def create(self, callback_url: Optional[str] = None) -> PersonaJob:
+        self._expire()
+        if len(self._jobs) >= self.max_jobs:
+            # Make room by dropping the oldest finished job; pending ones are never dropped
+            oldest_done = next((job_id for job_id, job in self._jobs.items() if job.done), None)
+            if oldest_done is None:
+                self.rejected += 1
+                raise JobLimitExceeded(f"{len(self._jobs)} persona jobs already pending")
+            del self._jobs[oldest_done]
+        job = PersonaJob(callback_url)
+        self._jobs[job.id] = job
+        self.created += 1
+        # Written before the job id is handed out, so any worker can answer a poll for it
+        await self._save(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[PersonaJob]:
+        """This worker's job, or one another worker created (from the store)"""
+        self._expire()
+        job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            row = await asyncio.to_thread(self.store.load, job_id)
+            if row is not None:
+                job = PersonaJob()
+                job.id = job_id
+                job.local = False
+                self._update(job, row)
+        return job
+
+    def _update(self, job: PersonaJob, row: JobRow):
+        job.status, job.created_at, job.finished_at, job.result, job.error = row
+        if job.status == "pending" and time.time() - job.created_at > self.max_pending_seconds:
+            job.status = "failed"
+            job.error = "The worker generating this persona stopped before it finished"
+
+    async def wait(self, job: PersonaJob, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for the job to finish; True if it has"""
+        if job.local:
+            return await job.wait(timeout)
+        deadline = time.monotonic() + timeout
+        while not job.done and time.monotonic() < deadline:
+            await asyncio.sleep(min(self.poll_seconds, deadline - time.monotonic()))
+            row = await asyncio.to_thread(self.store.load, job.id)
+            if row is None:
+                job.status = "failed"
+                job.error = "Job expired"
+            else:
+                self._update(job, row)
+        return job.done
+
+    async def finish(self, job: PersonaJob, result: Dict[str, Any]):
+        job.status = "done"
+        job.result = result
+        job.finished_at = time.time()
+        job._done.set()
+        self.completed += 1
+        await self._save(job)
+
+    async def fail(self, job: PersonaJob, error: str):
+        job.status = "failed"
+        job.error = error
+        job.finished_at = time.time()
+        job._done.set()
+        self.failed += 1
+        await self._save(job)
+
+    def _expire(self):
+        # A full scan, so it runs at most once a second however often jobs are polled
+        now = time.time()
+        if now - self._expired_at < 1:
+            return
+        self._expired_at = now
+        cutoff = now - self.ttl_seconds
+        expired = [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, int]:
+        pending = sum(1 for job in self._jobs.values() if not job.done)
+        return {
+            "created": self.created,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "pending": pending,
+            "retained": len(self._jobs),
+            "store_errors": self.store_errors,
+        }
@@ -0,0 +1,164 @@
+"""
+Offline archetype precomputation
+
+Generates one persona per combination of the archetype fields (see
+archetypes.ARCHETYPE_FIELDS) through the same provider chain as the API and
+writes them to a memory-mapped archetype file for the server to load
+(ARCHETYPES_PATH).
+
+Combinations come from real traffic or from the full answer space:
+
+    --traffic submissions.jsonl   rank combinations by how often they occur
+                                  in a submission corpus (the bulk_repersona
+                                  input format) and take the --top most
+                                  frequent
+    --all                         every combination with all fields answered
+
+Both can be combined. Personas already in the output file for the current
+prompt version are reused, and results are checkpointed to
+<output>.partial.jsonl as they arrive, so an interrupted run resumes without
+paying for the same combinations again.
+
+With --coverage, nothing is generated: the existing file is checked against
+the traffic corpus and the share of submissions it would serve is printed.
+
+Usage:
+    python precompute_archetypes.py archetypes.bin --traffic submissions.jsonl --top 2000
+    python precompute_archetypes.py archetypes.bin --all --concurrency 16
+    python precompute_archetypes.py archetypes.bin --traffic submissions.jsonl --coverage
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from collections import Counter
+from typing import Any, Dict, List
+
+import main
+from archetypes import ArchetypeKeys, ArchetypeStore, write_archetypes
+from bulk_repersona import Progress, read_submissions
+from prompt import PROMPT_VERSION
+
+
+def traffic_counts(path: str, keys: ArchetypeKeys) -> Counter:
+    """Submissions per combination, for submissions an archetype could serve"""
+    counts: Counter = Counter()
+    for _, _, answers in read_submissions(path):
+        if isinstance(answers, dict) and not answers.get("key_lesson"):
+            key = keys.key(answers)
+            if key is not None:
+                counts[key] += 1
+    return counts
+
+
+def load_existing(path: str, keys: ArchetypeKeys) -> Dict[int, Dict[str, Any]]:
+    """Personas from a previous run (the archetype file and checkpoint) for the current prompt"""
+    personas = {}
+    if os.path.exists(path):
+        try:
+            store = ArchetypeStore(path, keys)
+        except ValueError as e:
+            print(f"Ignoring {path}: {e}", file=sys.stderr)
+        else:
+            if store.prompt_version == PROMPT_VERSION:
+                personas.update(store)
+            store.close()
+    checkpoint = path + ".partial.jsonl"
+    if os.path.exists(checkpoint):
+        with open(checkpoint, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # half-written last line
+                if record["prompt_version"] == PROMPT_VERSION:
+                    personas[record["key"]] = record["persona"]
+    return personas
+
+
+async def generate(keys: ArchetypeKeys, wanted: List[int], personas: Dict[int, Dict[str, Any]], args):
+    progress = Progress(len(personas), args.report_interval)
+    slots = asyncio.Semaphore(args.concurrency)
+    checkpoint = open(args.output + ".partial.jsonl", "a", encoding="utf-8")
+
+    async def one(key: int):
+        async with slots:
+            answers = keys.answers(key)
+            try:
+                quiz = main.QuizAnswers(**answers)
+                prompt = main.build_persona_prompt(quiz.model_dump(exclude_none=True))
+                persona = await main.generate_persona_with_ai(quiz)
+            except Exception as e:
+                print(f"{answers}: {getattr(e, 'detail', e)}", file=sys.stderr)
+                progress.record(None, "", None)
+                return
+            personas[key] = persona.model_dump()
+            checkpoint.write(json.dumps({"key": key, "prompt_version": PROMPT_VERSION, "persona": personas[key]}, ensure_ascii=False) + "\n")
+            checkpoint.flush()
+            progress.record(persona.provider, prompt.system + prompt.user, persona.model_dump_json())
+
+    try:
+        await asyncio.gather(*(one(key) for key in wanted))
+    finally:
+        checkpoint.close()
+        progress.report(final=True)
+
+
+def report_coverage(path: str, keys: ArchetypeKeys, traffic: str):
+    store = ArchetypeStore(path, keys)
+    try:
+        for _, _, answers in read_submissions(traffic):
+            if isinstance(answers, dict):
+                store.get(answers)
+        print(json.dumps(store.stats(), indent=2, ensure_ascii=False))
+    finally:
+        store.close()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", help="Archetype file to write (or check with --coverage)")
+    parser.add_argument("--traffic", help="JSONL corpus of submissions to rank combinations by")
+    parser.add_argument("--top", type=int, default=2000, help="Most frequent traffic combinations to generate")
+    parser.add_argument("--all", action="store_true", help="Generate every fully answered combination")
+    parser.add_argument("--concurrency", type=int, default=8, help="Generations in flight at once")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between progress reports")
+    parser.add_argument("--coverage", action="store_true", help="Only report the file's coverage of --traffic")
+    args = parser.parse_args()
+
+    keys = ArchetypeKeys(main.answer_codec)
+    if args.coverage:
+        if not args.traffic:
+            parser.error("--coverage needs --traffic")
+        report_coverage(args.output, keys, args.traffic)
+        return
+    if not args.traffic and not args.all:
+        parser.error("choose combinations with --traffic and/or --all")
+
+    wanted: Dict[int, None] = {}
+    if args.traffic:
+        counts = traffic_counts(args.traffic, keys)
+        covered = sum(count for _, count in counts.most_common(args.top))
+        print(f"{len(counts)} combinations in traffic; the top {args.top} cover "
+              f"{covered / max(1, sum(counts.values())):.1%} of eligible submissions", file=sys.stderr)
+        wanted.update((key, None) for key, _ in counts.most_common(args.top))
+    if args.all:
+        wanted.update((keys.key(answers), None) for answers in keys.combinations())
+
+    personas = load_existing(args.output, keys)
+    pending = [key for key in wanted if key not in personas]
+    print(f"{len(wanted)} combinations wanted, {len(wanted) - len(pending)} already generated", file=sys.stderr)
+    if pending:
+        asyncio.run(generate(keys, pending, personas, args))
+
+    write_archetypes(args.output, keys, personas, PROMPT_VERSION, main.MODEL_CHAIN)
+    checkpoint = args.output + ".partial.jsonl"
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    print(f"Wrote {len(personas)} archetypes to {args.output} ({os.path.getsize(args.output):,} bytes)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main_cli()
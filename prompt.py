@@ -1,12 +1,18 @@
-PERSONA_GENERATION_PROMPT = """You are an expert investment advisor analyzing investor profiles for the Frantiger platform - a marketplace for business opportunities, franchises, and investments.
+import hashlib
+import os
+from typing import NamedTuple
 
-Based on the quiz responses below, generate a comprehensive investor persona. Your analysis should be insightful, nuanced, and actionable.
+from quiz_encoding import ENCODINGS, answer_legend
 
-QUIZ RESPONSES:
-{quiz_data}
+# Static instructions, sent as the system prompt. Everything that is the same
+# for every request lives here, ahead of the answers, so providers can serve it
+# from their prompt cache (Anthropic via cache_control, OpenAI automatically).
+PERSONA_SYSTEM_PROMPT = """You are an expert investment advisor analyzing investor profiles for the Frantiger platform - a marketplace for business opportunities, franchises, and investments.
+
+Based on the quiz responses in the user message, generate a comprehensive investor persona. Your analysis should be insightful, nuanced, and actionable.
 
 Generate a JSON response with the following structure:
-{{
+{
   "persona_tags": [
     "5-6 concise tags that capture the investor's core profile",
     "Examples: 'Low risk, stable', 'Hands-on hybrid', 'Medium term', 'Experienced operator', 'Systems focused'"
@@ -25,7 +31,7 @@ Generate a JSON response with the following structure:
     "3-4 types of specific opportunities that align with this profile",
     "Be concrete: e.g., 'Premium QSR franchise in metro cities' not just 'food sector'"
   ]
-}}
+}
 
 PERSONA TAG GUIDELINES:
 1. Risk Profile: "Low risk, stable" OR "Mid risk - balanced" OR "High risk, high upside"
@@ -38,3 +44,42 @@ PERSONA TAG GUIDELINES:
 Make the analysis specific to their answers. If they mentioned a key lesson, incorporate that wisdom. If they prefer certain sectors, reference those. Be human, insightful, and practical.
 
 Return ONLY valid JSON, no markdown formatting."""
+
+# Per-request part: just the answers
+PERSONA_USER_PROMPT = """QUIZ RESPONSES:
+{quiz_data}"""
+
+# Coded answers are option numbers; the legend is static, so it is appended to
+# the cached system prompt and only the numbers vary per request
+CODED_SYSTEM_PROMPT = PERSONA_SYSTEM_PROMPT + "\n\nANSWER LEGEND:\n" + answer_legend()
+CODED_USER_PROMPT = """QUIZ RESPONSES (numbers are option codes from the ANSWER LEGEND, text is verbatim):
+{quiz_data}"""
+
+# encoding -> (system prompt, user prompt template)
+PROMPT_TEMPLATES = {
+    "verbose": (PERSONA_SYSTEM_PROMPT, PERSONA_USER_PROMPT),
+    "compact": (PERSONA_SYSTEM_PROMPT, PERSONA_USER_PROMPT),
+    "coded": (CODED_SYSTEM_PROMPT, CODED_USER_PROMPT),
+}
+
+# How quiz answers are embedded: verbose (indented JSON), compact or coded
+PROMPT_ENCODING = os.environ.get("PROMPT_ENCODING", "verbose")
+if PROMPT_ENCODING not in ENCODINGS:
+    raise ValueError(f"PROMPT_ENCODING must be one of {', '.join(ENCODINGS)}, got {PROMPT_ENCODING!r}")
+
+
+class PersonaPrompt(NamedTuple):
+    """A rendered persona prompt: cacheable static instructions plus the per-request answers"""
+
+    system: str
+    user: str
+
+
+def prompt_version(encoding: str) -> str:
+    """Hash of the templates and answer encoding, so any prompt edit invalidates cached personas"""
+    system, user = PROMPT_TEMPLATES[encoding]
+    text = f"{encoding}\n{system}\n{user}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+PROMPT_VERSION = prompt_version(PROMPT_ENCODING)
@@ -0,0 +1,102 @@
+"""
+Compact encodings of quiz answers for the persona prompt
+
+The verbose prompt embeds `json.dumps(answers, indent=2)`, repeating option
+strings like "Capital partner - I write the cheque, someone else runs the
+show" on every request. Two denser encodings are offered:
+
+- compact: the same answers as unindented JSON, with non-ASCII kept as-is
+  ("₹5-15 lakh" instead of "\\u20b95-15 lakh")
+- coded: each option becomes its 1-based position in Data/Questions.json,
+  and a static legend of all option texts is added to the prompt template.
+  The legend is the same for every request, so it sits in the cacheable
+  prompt prefix while the per-request part shrinks to a few numbers.
+
+Answers that do not match a known option (e.g. from an older quiz version)
+and free text such as `key_lesson` are passed through verbatim, so coding is
+lossless: `decode_answers(encode_answers(a, "coded"), "coded") == a`.
+"""
+
+import json
+import os
+from typing import Any, Dict, List
+
+ENCODINGS = ("verbose", "compact", "coded")
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Data", "Questions.json")
+
+
+def load_questions(path: str = QUESTIONS_PATH) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["questions"]
+
+
+QUESTIONS = load_questions()
+
+# name -> option text -> code, and the reverse, for single and multi choice questions
+OPTION_CODES: Dict[str, Dict[str, int]] = {
+    q["name"]: {option: i for i, option in enumerate(q["options"], start=1)}
+    for q in QUESTIONS
+    if q.get("options")
+}
+CODE_OPTIONS: Dict[str, Dict[int, str]] = {
+    name: {code: option for option, code in codes.items()} for name, codes in OPTION_CODES.items()
+}
+
+
+def answer_legend() -> str:
+    """Static legend of option codes, one line per question in quiz order"""
+    lines = []
+    for q in QUESTIONS:
+        if q.get("options"):
+            choices = "; ".join(f"{i}={option}" for i, option in enumerate(q["options"], start=1))
+            kind = " (list, pick many)" if q["type"] == "multi" else ""
+            lines.append(f"{q['name']}{kind}: {choices}")
+        elif q["type"] == "slider":
+            labels = "; ".join(
+                f"{value}={label}"
+                for value, label in zip(range(q["min"], q["max"] + 1), q["labels"])
+                if label
+            )
+            lines.append(f"{q['name']}: scale {q['min']}-{q['max']}, {labels}")
+        else:
+            lines.append(f"{q['name']}: free text, verbatim")
+    return "\n".join(lines)
+
+
+def _code(name: str, value: Any) -> Any:
+    codes = OPTION_CODES.get(name)
+    if codes is None:
+        return value
+    if isinstance(value, list):
+        return [codes.get(v, v) for v in value]
+    return codes.get(value, value)
+
+
+def _uncode(name: str, value: Any) -> Any:
+    options = CODE_OPTIONS.get(name)
+    if options is None:
+        return value
+    if isinstance(value, list):
+        return [options.get(v, v) if isinstance(v, int) else v for v in value]
+    return options.get(value, value) if isinstance(value, int) else value
+
+
+def encode_answers(quiz_dict: Dict[str, Any], encoding: str = "verbose") -> str:
+    """Render quiz answers for the prompt in the given encoding"""
+    if encoding == "verbose":
+        return json.dumps(quiz_dict, indent=2)
+    if encoding == "compact":
+        return json.dumps(quiz_dict, separators=(",", ":"), ensure_ascii=False)
+    if encoding == "coded":
+        coded = {name: _code(name, value) for name, value in quiz_dict.items()}
+        return json.dumps(coded, separators=(",", ":"), ensure_ascii=False)
+    raise ValueError(f"Unknown prompt encoding {encoding!r}; expected one of {', '.join(ENCODINGS)}")
+
+
+def decode_answers(text: str, encoding: str = "verbose") -> Dict[str, Any]:
+    """Inverse of encode_answers"""
+    data = json.loads(text)
+    if encoding == "coded":
+        return {name: _uncode(name, value) for name, value in data.items()}
+    return data
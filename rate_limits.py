@@ -0,0 +1,296 @@
+"""
+Client-side rate limiting per provider
+
+Each provider gets two token buckets, one for requests and one for tokens,
+sized from its static per-minute limits. A call reserves one request and its
+estimated tokens before it is sent; when a bucket is short the call waits for
+the refill if that fits in `max_wait`, and otherwise fails fast with
+`ProviderThrottled` so the race moves on to a provider with spare capacity
+instead of firing a request that would come back as a 429.
+
+The buckets are corrected from what the providers report: OpenAI's
+`x-ratelimit-*` and Anthropic's `anthropic-ratelimit-*` response headers set
+the remaining capacity, and a 429 (or any `retry-after`) blocks the provider
+until the server says it may be called again.
+
+Limits and headers are account-wide. When several processes share the
+account, each scheduler is given its `share` of it: the configured limits and
+every header's limit and remaining count are scaled by it, so a response does
+not hand one worker the whole account's budget back.
+"""
+
+import asyncio
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+# (limit, remaining, reset) header names per bucket, by provider header style
+OPENAI_HEADERS = {
+    "requests": ("x-ratelimit-limit-requests", "x-ratelimit-remaining-requests", "x-ratelimit-reset-requests"),
+    "tokens": ("x-ratelimit-limit-tokens", "x-ratelimit-remaining-tokens", "x-ratelimit-reset-tokens"),
+}
+ANTHROPIC_HEADERS = {
+    "requests": ("anthropic-ratelimit-requests-limit", "anthropic-ratelimit-requests-remaining", "anthropic-ratelimit-requests-reset"),
+    "tokens": ("anthropic-ratelimit-tokens-limit", "anthropic-ratelimit-tokens-remaining", "anthropic-ratelimit-tokens-reset"),
+}
+
+
+class ProviderThrottled(Exception):
+    """A provider call was not sent (or was rejected with a 429) for lack of rate-limit capacity"""
+
+    def __init__(self, provider: str, retry_after: float, detail: str = "rate limit capacity exhausted"):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(f"{provider} throttled: {detail}; retry in {retry_after:.1f}s")
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds until a rate-limit window resets
+
+    Accepts plain seconds ("20"), OpenAI durations ("1s", "6m0s", "120ms")
+    and Anthropic RFC 3339 timestamps.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(number + unit for number, unit in parts) == value:
+        return sum(float(number) * _UNIT_SECONDS[unit] for number, unit in parts)
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if reset_at.tzinfo is None:
+        reset_at = reset_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    try:
+        return int(float(headers[name]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """`capacity` units refilled evenly over `period` seconds"""
+
+    def __init__(self, capacity: float, period: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(capacity)
+        self.period = period
+        self.clock = clock
+        self.level = float(capacity)
+        self.updated = clock()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> float:
+        self._refill()
+        return self.level
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken; a request larger than the bucket only waits for a full one"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        # May go negative, so a reservation larger than the bucket is paid back by waiting
+        self.level -= amount
+
+    def sync(self, limit: Optional[float], remaining: Optional[float]):
+        """Adopt the server's view of this window"""
+        self._refill()
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.capacity, float(remaining))
+
+
+class ProviderLimits:
+    def __init__(self, name: str, requests_per_minute: float, tokens_per_minute: float, clock: Callable[[], float]):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute, clock=clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock=clock)
+        self.blocked_until = 0.0
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.rate_limited = 0
+        self.wait_seconds = 0.0
+
+
+class RateLimitScheduler:
+    """
+    Admits provider calls against per-provider request and token budgets
+
+    `limits` maps a provider to its account-wide (requests per minute,
+    tokens per minute), of which this scheduler may use `share`. Providers
+    without an entry are not limited. `on_wait(provider, seconds)` is called
+    for every admitted call with the time it spent queued.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[float, float]],
+        max_wait: float = 2.0,
+        on_wait: Optional[Callable[[str, float], None]] = None,
+        share: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_wait = max_wait
+        self.on_wait = on_wait
+        self.share = share
+        self.clock = clock
+        self.providers: Dict[str, ProviderLimits] = {
+            name: ProviderLimits(name, rpm * share, tpm * share, clock) for name, (rpm, tpm) in limits.items()
+        }
+
+    def wait_time(self, name: str, tokens: int) -> float:
+        """Seconds until `name` could take a call of `tokens` estimated tokens"""
+        limits = self.providers.get(name)
+        if limits is None:
+            return 0.0
+        return max(
+            limits.blocked_until - self.clock(),
+            limits.requests.wait_time(1),
+            limits.tokens.wait_time(tokens),
+            0.0,
+        )
+
+    def order(self, names: Iterable[str], tokens: int) -> List[str]:
+        """
+        Reorder providers by spare capacity
+
+        Providers that can take the call now keep their relative order and go
+        first, then those that would need a short queue wait, shortest first.
+        Providers that could not be called within `max_wait` are left out
+        (and counted as rejected) rather than sent a request that would 429.
+        """
+        ready, queued = [], []
+        for position, name in enumerate(names):
+            wait = self.wait_time(name, tokens)
+            if wait <= 0:
+                ready.append(name)
+            elif wait <= self.max_wait:
+                queued.append((wait, position, name))
+            else:
+                self.providers[name].rejected += 1
+        return ready + [name for _, _, name in sorted(queued)]
+
+    def retry_after(self, names: Iterable[str], tokens: int) -> float:
+        """Seconds until the first of `names` has capacity again"""
+        waits = [self.wait_time(name, tokens) for name in names]
+        return min(waits) if waits else 0.0
+
+    async def acquire(self, name: str, tokens: int):
+        """
+        Reserve one request and `tokens` for a call to `name`
+
+        Waits for the buckets to refill for up to `max_wait`; raises
+        ProviderThrottled straight away when the wait would be longer.
+        """
+        limits = self.providers.get(name)
+        if limits is None:
+            return
+        started = self.clock()
+        deadline = started + self.max_wait
+        limits.waiting += 1
+        try:
+            while True:
+                wait = self.wait_time(name, tokens)
+                if wait <= 0:
+                    break
+                if self.clock() + wait > deadline:
+                    limits.rejected += 1
+                    raise ProviderThrottled(name, wait)
+                await asyncio.sleep(wait)
+        finally:
+            limits.waiting -= 1
+        limits.requests.take(1)
+        limits.tokens.take(tokens)
+        waited = self.clock() - started
+        limits.admitted += 1
+        if waited > 0:
+            limits.queued += 1
+            limits.wait_seconds += waited
+        if self.on_wait is not None:
+            self.on_wait(name, waited)
+
+    def update_from_headers(self, name: str, headers: Optional[Mapping[str, str]]):
+        """Sync the buckets from OpenAI or Anthropic rate-limit response headers, scaled to `share`"""
+        limits = self.providers.get(name)
+        if limits is None or headers is None:
+            return
+        for style in (OPENAI_HEADERS, ANTHROPIC_HEADERS):
+            for bucket_name, (limit_header, remaining_header, reset_header) in style.items():
+                remaining = _header_int(headers, remaining_header)
+                if remaining is None:
+                    continue
+                limit = _header_int(headers, limit_header)
+                bucket = getattr(limits, bucket_name)
+                bucket.sync(limit * self.share if limit else None, remaining * self.share)
+                reset = parse_reset(headers.get(reset_header))
+                if remaining == 0 and reset:
+                    self._block(limits, reset)
+        retry_after = parse_reset(headers.get("retry-after"))
+        if retry_after:
+            self._block(limits, retry_after)
+
+    def record_rate_limited(self, name: str, headers: Optional[Mapping[str, str]] = None, retry_after: Optional[float] = None) -> float:
+        """
+        A provider answered 429: block it until its retry-after (or one request
+        interval when it gives none) and return that wait
+        """
+        limits = self.providers.get(name)
+        if limits is None:
+            return retry_after or 0.0
+        limits.rate_limited += 1
+        self.update_from_headers(name, headers)
+        if retry_after is None:
+            retry_after = parse_reset(headers.get("retry-after")) if headers is not None else None
+        if retry_after is None:
+            retry_after = 1 / limits.requests.rate
+        self._block(limits, retry_after)
+        return max(0.0, limits.blocked_until - self.clock())
+
+    def _block(self, limits: ProviderLimits, seconds: float):
+        limits.blocked_until = max(limits.blocked_until, self.clock() + seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        providers = {}
+        for name, limits in self.providers.items():
+            providers[name] = {
+                "requests_per_minute": limits.requests.capacity,
+                "tokens_per_minute": limits.tokens.capacity,
+                "requests_available": limits.requests.available(),
+                "tokens_available": limits.tokens.available(),
+                "blocked_seconds": max(0.0, limits.blocked_until - self.clock()),
+                "waiting": limits.waiting,
+                "admitted": limits.admitted,
+                "queued": limits.queued,
+                "rejected": limits.rejected,
+                "rate_limited": limits.rate_limited,
+                "mean_queue_wait_seconds": limits.wait_seconds / limits.queued if limits.queued else None,
+            }
+        return {"max_wait_seconds": self.max_wait, "providers": providers}
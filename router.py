@@ -0,0 +1,267 @@
+"""
+Health-scored provider routing with circuit breakers
+
+Each provider keeps a rolling window of call outcomes and success latencies.
+A provider whose recent error rate (or run of consecutive failures) crosses the
+threshold has its circuit opened and is skipped for a cooldown; after that a
+single half-open probe request decides whether it closes again. Closed
+providers are ordered by expected time to a successful answer, so traffic
+shifts away from a degraded provider without any manual reordering.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderHealth:
+    def __init__(self, name: str, rank: int, window: int):
+        self.name = name
+        self.rank = rank
+        # (timestamp, succeeded, latency seconds or None)
+        self.samples = deque(maxlen=window)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.open_reason: Optional[str] = None
+        self.probe_in_flight = False
+        self.last_error: Optional[str] = None
+        self.successes = 0
+        self.failures = 0
+        self.times_opened = 0
+
+    def prune(self, cutoff: float):
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+
+    @property
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(not ok for _, ok, _ in self.samples) / len(self.samples)
+
+    def latency_percentile(self, pct: float) -> Optional[float]:
+        latencies = sorted(latency for _, ok, latency in self.samples if ok)
+        if not latencies:
+            return None
+        return latencies[max(0, math.ceil(pct / 100 * len(latencies)) - 1)]
+
+
+class ProviderRouter:
+    """
+    Tracks provider health and decides the order providers are tried in
+
+    Expected time to success is estimated as median success latency divided
+    by success rate; providers without latency samples use `default_latency`
+    and ties keep the configured order. Samples older than `stats_ttl_seconds`
+    are forgotten, so a provider demoted after an incident drifts back to the
+    default estimate and gets traffic again.
+
+    Exceptions of the `neutral_errors` types (e.g. a call held back by the
+    rate limiter) say nothing about provider health and are not recorded.
+
+    `on_outcome(name, succeeded, seconds, error)` is called for every call
+    recorded here, and `record_remote` replays an outcome observed elsewhere
+    (another worker process), so routers can share what they see.
+    """
+
+    def __init__(
+        self,
+        providers: List[str],
+        window: int = 50,
+        min_requests: int = 10,
+        failure_threshold: float = 0.5,
+        consecutive_failures: int = 3,
+        cooldown_seconds: float = 30.0,
+        default_latency: float = 5.0,
+        stats_ttl_seconds: float = 300.0,
+        adaptive_order: bool = True,
+        neutral_errors: Tuple[type, ...] = (),
+        on_outcome: Optional[Callable[[str, bool, Optional[float], Optional[str]], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.window = window
+        self.min_requests = min_requests
+        self.failure_threshold = failure_threshold
+        self.consecutive_failures = consecutive_failures
+        self.cooldown_seconds = cooldown_seconds
+        self.default_latency = default_latency
+        self.stats_ttl_seconds = stats_ttl_seconds
+        self.adaptive_order = adaptive_order
+        self.neutral_errors = neutral_errors
+        self.on_outcome = on_outcome
+        self.clock = clock
+        self.providers: Dict[str, ProviderHealth] = {
+            name: ProviderHealth(name, rank, window) for rank, name in enumerate(providers)
+        }
+
+    def expected_latency(self, health: ProviderHealth) -> float:
+        latency = health.latency_percentile(50)
+        if latency is None:
+            latency = self.default_latency
+        return latency / max(1 - health.error_rate, 0.05)
+
+    def _refresh(self, health: ProviderHealth):
+        """Drop stale samples and move an open circuit to half-open after its cooldown"""
+        health.prune(self.clock() - self.stats_ttl_seconds)
+        if health.state == OPEN and self.clock() - health.opened_at >= self.cooldown_seconds:
+            health.state = HALF_OPEN
+
+    def order(self, claim_probe: bool = True) -> List[str]:
+        """
+        Providers to try for the next request, best first
+
+        A half-open provider is put first as the probe, unless a probe is
+        already in flight; open providers are left out entirely. With
+        `claim_probe` the probe slot is taken here, so concurrent requests
+        do not all probe the same recovering provider.
+        """
+        probes, closed = [], []
+        for health in self.providers.values():
+            self._refresh(health)
+            if health.state == CLOSED:
+                closed.append(health)
+            elif health.state == HALF_OPEN and not health.probe_in_flight:
+                probes.append(health)
+
+        if self.adaptive_order:
+            closed.sort(key=lambda h: (self.expected_latency(h), h.rank))
+        else:
+            closed.sort(key=lambda h: h.rank)
+        probes = probes[:1]
+        if claim_probe:
+            for health in probes:
+                health.probe_in_flight = True
+        return [h.name for h in probes + closed]
+
+    def retry_after(self) -> float:
+        """Seconds until the next open circuit becomes eligible for a probe"""
+        waits = [
+            self.cooldown_seconds - (self.clock() - h.opened_at)
+            for h in self.providers.values()
+            if h.state == OPEN
+        ]
+        return max(0.0, min(waits)) if waits else 0.0
+
+    def record_success(self, name: str, seconds: float):
+        health = self.providers[name]
+        health.probe_in_flight = False
+        self._success(health, seconds, self.clock())
+        if self.on_outcome is not None:
+            self.on_outcome(name, True, seconds, None)
+
+    def record_failure(self, name: str, error: Exception):
+        health = self.providers[name]
+        health.probe_in_flight = False
+        self._failure(health, str(error), self.clock())
+        if self.on_outcome is not None:
+            self.on_outcome(name, False, None, str(error))
+
+    def record_remote(self, name: str, succeeded: bool, seconds: Optional[float], error: Optional[str], age: float):
+        """Replay an outcome another process observed `age` seconds ago; it leaves this process's probe slot alone"""
+        health = self.providers.get(name)
+        if health is None or age > self.stats_ttl_seconds:
+            return
+        if succeeded:
+            self._success(health, seconds, self.clock() - age)
+        else:
+            self._failure(health, error or "failed", self.clock() - age)
+
+    def _success(self, health: ProviderHealth, seconds: float, at: float):
+        health.samples.append((at, True, seconds))
+        health.successes += 1
+        health.consecutive_failures = 0
+        if health.state != CLOSED:
+            health.state = CLOSED
+            health.opened_at = None
+            health.open_reason = None
+            # Failures from before the outage would reopen it immediately
+            health.samples.clear()
+            health.samples.append((at, True, seconds))
+
+    def _failure(self, health: ProviderHealth, error: str, at: float):
+        health.samples.append((at, False, None))
+        health.failures += 1
+        health.consecutive_failures += 1
+        health.last_error = error
+
+        if health.state == HALF_OPEN:
+            self._open(health, f"half-open probe failed: {error}")
+        elif health.state == CLOSED:
+            if health.consecutive_failures >= self.consecutive_failures:
+                self._open(health, f"{health.consecutive_failures} consecutive failures")
+            elif len(health.samples) >= self.min_requests and health.error_rate >= self.failure_threshold:
+                self._open(health, f"error rate {health.error_rate:.0%} over last {len(health.samples)} calls")
+
+    def release(self, name: str):
+        """A call ended without an outcome (e.g. it lost a hedged race)"""
+        self.providers[name].probe_in_flight = False
+
+    def _open(self, health: ProviderHealth, reason: str):
+        health.state = OPEN
+        health.opened_at = self.clock()
+        health.open_reason = reason
+        health.times_opened += 1
+
+    def track(self, name: str, call: Callable[[], Awaitable[Any]]) -> Callable[[], Awaitable[Any]]:
+        """Wrap a provider call so its outcome and latency feed the router"""
+
+        async def tracked():
+            started = time.perf_counter()
+            try:
+                result = await call()
+            except (asyncio.CancelledError, *self.neutral_errors):
+                self.release(name)
+                raise
+            except Exception as e:
+                self.record_failure(name, e)
+                raise
+            self.record_success(name, time.perf_counter() - started)
+            return result
+
+        return tracked
+
+    def snapshot(self) -> Dict[str, Any]:
+        order = self.order(claim_probe=False)
+        providers = {}
+        for name, health in self.providers.items():
+            cooldown_remaining = None
+            if health.state == OPEN:
+                cooldown_remaining = max(0.0, self.cooldown_seconds - (self.clock() - health.opened_at))
+            providers[name] = {
+                "state": health.state,
+                "position": order.index(name) if name in order else None,
+                "expected_latency_seconds": self.expected_latency(health),
+                "p50_latency_seconds": health.latency_percentile(50),
+                "p90_latency_seconds": health.latency_percentile(90),
+                "error_rate": health.error_rate,
+                "window_calls": len(health.samples),
+                "consecutive_failures": health.consecutive_failures,
+                "successes": health.successes,
+                "failures": health.failures,
+                "times_opened": health.times_opened,
+                "open_reason": health.open_reason,
+                "cooldown_remaining_seconds": cooldown_remaining,
+                "probe_in_flight": health.probe_in_flight,
+                "last_error": health.last_error,
+            }
+        return {
+            "order": order,
+            "adaptive_order": self.adaptive_order,
+            "config": {
+                "window": self.window,
+                "min_requests": self.min_requests,
+                "failure_threshold": self.failure_threshold,
+                "consecutive_failures": self.consecutive_failures,
+                "cooldown_seconds": self.cooldown_seconds,
+                "default_latency_seconds": self.default_latency,
+                "stats_ttl_seconds": self.stats_ttl_seconds,
+            },
+            "providers": providers,
+        }
@@ -0,0 +1,222 @@
+"""
+Rule-based persona tags compiled from Data/output.json
+
+The tag rules in output.json name each tag by the answer text it applies to:
+ranges of the risk slider ("1-2"), or fragments of option text ("Co pilot",
+"4-7 years or More than 7 years"). At startup every rule is matched against
+the quiz options in Data/Questions.json once, giving per-question lookup
+tables from option code (the 1-based position used by quiz_encoding) to the
+tags it earns. Tagging a submission is then one table lookup per rule field,
+and tags always come out in rule order, deduplicated and capped at
+`max_tags`, instead of depending on set ordering. Per submission this costs
+about what the old hard-coded checks did (a few microseconds); the point is
+that the rules live in output.json and the result is deterministic.
+
+Answer values outside the quiz options are matched against the rules on
+each call rather than added to the tables, so client input cannot grow them.
+
+`BulkTagger` applies the same tables to a whole corpus at once: submissions
+become a NumPy matrix of option codes, and each field's table turns its
+column into tag flags with a single fancy-indexing step.
+"""
+
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from quiz_encoding import OPTION_CODES, QUESTIONS
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Data", "output.json")
+
+_RANGE = re.compile(r"^\s*(\d+)\s*(?:-\s*(\d+))?\s*$")
+
+
+def load_rules(path: str = RULES_PATH) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _matches(key: str, value: Any) -> bool:
+    """
+    Whether a rule key applies to an answer
+
+    Numeric keys are inclusive ranges ("1-2", "3"). Text keys list
+    alternatives joined by " or " ("4-7 years or More than 7 years"), each
+    matched case-insensitively as a fragment of the answer text. A key whose
+    whole text occurs in the answer matches too, so "small or mid size
+    business or seasoned" still covers "small or mid size business".
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        bounds = _RANGE.match(key)
+        if not bounds:
+            return False
+        low = int(bounds.group(1))
+        high = int(bounds.group(2) or low)
+        return low <= value <= high
+    text = str(value).lower()
+    key = key.lower()
+    return key in text or any(part.strip() and part.strip() in text for part in key.split(" or "))
+
+
+class RuleField:
+    """Compiled rules for one answer field: option code -> tag indexes"""
+
+    def __init__(self, name: str, rules: Sequence[Tuple[str, int]], options: Sequence[Any], tag_names: Sequence[str]):
+        self.name = name
+        self.rules = list(rules)
+        self.tag_names = tag_names
+        # Code 0 means "no answer" and earns no tags
+        self.codes: Dict[Any, int] = {option: code for code, option in enumerate(options, start=1)}
+        self.table: List[Tuple[int, ...]] = [()] + [self.match(option) for option in options]
+        # Answer value -> tag names, for single submissions
+        self.named: Dict[Any, Tuple[str, ...]] = {
+            option: tuple(tag_names[i] for i in self.table[code]) for option, code in self.codes.items()
+        }
+
+    def match(self, value: Any) -> Tuple[int, ...]:
+        return tuple(dict.fromkeys(tag for key, tag in self.rules if _matches(key, value)))
+
+    def tags(self, value: Any) -> Tuple[int, ...]:
+        """Tag indexes for an answer; values outside the options are matched, not cached"""
+        if value is None:
+            return ()
+        if isinstance(value, list):
+            return tuple(dict.fromkeys(tag for item in value for tag in self.tags(item)))
+        code = self.codes.get(value)
+        return self.table[code] if code is not None else self.match(value)
+
+    def names(self, value: Any) -> Tuple[str, ...]:
+        if value is None:
+            return ()
+        if isinstance(value, list):
+            return tuple(dict.fromkeys(name for item in value for name in self.names(item)))
+        names = self.named.get(value)
+        if names is None:
+            names = tuple(self.tag_names[i] for i in self.match(value))
+        return names
+
+
+class RuleEngine:
+    """
+    Persona tag rules from output.json, compiled against the quiz options
+
+    `tags(answers)` takes the answer dict (as from `QuizAnswers.model_dump`)
+    and returns tags in rule order, without duplicates, at most `max_tags`.
+    """
+
+    def __init__(self, rules: Dict[str, Any], questions: Sequence[Dict[str, Any]] = QUESTIONS):
+        settings = rules.get("persona_tags_generation", {})
+        self.max_tags: int = settings.get("max_tags", 6)
+        self.unique: bool = settings.get("unique_tags_only", True)
+
+        by_name = {q["name"]: q for q in questions}
+        self.tag_names: List[str] = []
+        tag_index: Dict[str, int] = {}
+        field_rules: Dict[str, List[Tuple[str, int]]] = {}
+        for category in rules.get("tag_categories", []):
+            for key, tag in category["tags"].items():
+                if tag not in tag_index:
+                    tag_index[tag] = len(self.tag_names)
+                    self.tag_names.append(tag)
+                field_rules.setdefault(category["source_field"], []).append((key, tag_index[tag]))
+
+        self.fields: List[RuleField] = []
+        for name, field in field_rules.items():
+            question = by_name.get(name, {})
+            if question.get("type") == "slider":
+                options = list(range(question["min"], question["max"] + 1))
+            else:
+                options = list(OPTION_CODES.get(name, {}))
+            self.fields.append(RuleField(name, field, options, self.tag_names))
+
+    def tag_indexes(self, answers: Dict[str, Any]) -> List[int]:
+        indexes = [tag for field in self.fields for tag in field.tags(answers.get(field.name))]
+        if self.unique:
+            indexes = list(dict.fromkeys(indexes))
+        return indexes[:self.max_tags]
+
+    def tags(self, answers: Dict[str, Any]) -> List[str]:
+        tags = []
+        for field in self.fields:
+            value = answers.get(field.name)
+            if value is not None:
+                # A dict hit for quiz options; lists (unhashable) and other values go through names()
+                try:
+                    tags += field.named[value]
+                except (KeyError, TypeError):
+                    tags += field.names(value)
+        if self.unique:
+            tags = list(dict.fromkeys(tags))
+        return tags[:self.max_tags]
+
+
+class BulkTagger:
+    """
+    Vectorized tagging of many submissions with a RuleEngine's tables
+
+    `encode` turns answer dicts into an int32 matrix with one column per rule
+    field (0 for no answer); `tag_matrix` maps that to a boolean submissions x
+    tags matrix, already deduplicated and capped at `max_tags` in rule order.
+    Multi-select answers are not supported by the matrix form; the current
+    rules only read single-choice and slider fields.
+
+    Values outside the quiz options get codes after the field's own, kept by
+    this tagger only, so use one tagger per bulk run rather than a
+    long-lived one.
+    """
+
+    def __init__(self, engine: RuleEngine):
+        import numpy as np
+
+        self.np = np
+        self.engine = engine
+        self._tables: Dict[str, Any] = {}
+        # Per field: codes of values outside its options, and their tags in code order
+        self._extra_codes: Dict[str, Dict[Any, int]] = {field.name: {} for field in engine.fields}
+        self._extra_tags: Dict[str, List[Tuple[int, ...]]] = {field.name: [] for field in engine.fields}
+
+    def _code(self, field: RuleField, value: Any) -> int:
+        codes = self._extra_codes[field.name]
+        code = codes.get(value)
+        if code is None:
+            extra = self._extra_tags[field.name]
+            extra.append(field.match(value))
+            code = codes[value] = len(field.table) + len(extra) - 1
+        return code
+
+    def _table(self, field: RuleField):
+        """Boolean code x tag matrix for a field, rebuilt when new codes were added"""
+        np = self.np
+        rows = field.table + self._extra_tags[field.name]
+        table = self._tables.get(field.name)
+        if table is None or len(table) != len(rows):
+            table = np.zeros((len(rows), len(self.engine.tag_names)), dtype=bool)
+            for code, tags in enumerate(rows):
+                table[code, list(tags)] = True
+            self._tables[field.name] = table
+        return table
+
+    def encode(self, submissions: Iterable[Dict[str, Any]]):
+        submissions = list(submissions)
+        codes = self.np.zeros((len(submissions), len(self.engine.fields)), dtype=self.np.int32)
+        # Column by column, so each field's code dict stays hot
+        for column, field in enumerate(self.engine.fields):
+            known, name = field.codes, field.name
+            values = [answers.get(name) for answers in submissions]
+            codes[:, column] = [0 if value is None else known.get(value) or self._code(field, value) for value in values]
+        return codes
+
+    def tag_matrix(self, codes):
+        np = self.np
+        flags = np.zeros((codes.shape[0], len(self.engine.tag_names)), dtype=bool)
+        for column, field in enumerate(self.engine.fields):
+            flags |= self._table(field)[codes[:, column]]
+        # Tags are numbered in rule order, so keeping the first max_tags flags
+        # per row is the same cap the single-submission path applies
+        return flags & (np.cumsum(flags, axis=1) <= self.engine.max_tags)
+
+    def tags(self, codes) -> List[List[str]]:
+        names = self.engine.tag_names
+        return [[names[i] for i in row.nonzero()[0]] for row in self.tag_matrix(codes)]
+
@@ -0,0 +1,200 @@
+"""
+Provider health shared between worker processes
+
+With several uvicorn workers (WEB_CONCURRENCY) every process has its own
+ProviderRouter and HedgePolicy, so an outage one worker has already hit is
+rediscovered by each of the others, paying for its own failed calls before
+its circuit opens, and latency-based ordering and hedge delays are learnt
+from a fraction of the traffic. SharedProviderStats connects them through a
+small SQLite file in WAL mode:
+
+- every provider outcome a worker records is buffered in memory, so the
+  request path never touches SQLite, and every `interval` seconds the buffer
+  is written to the `outcomes` table in one transaction
+- in the same sync the worker reads the rows other workers wrote since its
+  previous sync (a range scan on the row id) and replays them into its own
+  router and latency trackers
+
+So every worker runs the same circuit-breaker and ordering rules over the
+same stream of outcomes, at most one interval behind. WAL readers never wait
+for the writer, and the sync runs in a thread, off the event loop. A worker
+that starts late replays the outcomes still within the router's stats TTL,
+so it begins with the current picture instead of an empty one. Rows older
+than `retention_seconds` are deleted, and each worker heartbeats into the
+`workers` table so the live processes can be listed.
+"""
+
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from hedging import HedgePolicy
+from router import ProviderRouter
+
+# (provider, wall-clock time, succeeded, latency seconds or None, error or None)
+Outcome = Tuple[str, float, bool, Optional[float], Optional[str]]
+
+
+class SharedProviderStats:
+    """Publishes this worker's provider outcomes and replays everyone else's"""
+
+    def __init__(
+        self,
+        path: str,
+        router: ProviderRouter,
+        hedge_policy: Optional[HedgePolicy] = None,
+        interval: float = 1.0,
+        retention_seconds: float = 600.0,
+        worker: Optional[str] = None,
+    ):
+        self.path = path
+        self.router = router
+        self.hedge_policy = hedge_policy
+        self.interval = interval
+        self.retention_seconds = max(retention_seconds, router.stats_ttl_seconds)
+        self.worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        self.started_at = time.time()
+        self.published = 0
+        self.applied = 0
+        self.syncs = 0
+        self.sync_errors = 0
+        self.last_error: Optional[str] = None
+        self.sync_seconds = 0.0
+        self._pending: List[Outcome] = []
+        self._last_purge = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outcomes ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, worker TEXT NOT NULL, provider TEXT NOT NULL, "
+            "at REAL NOT NULL, ok INTEGER NOT NULL, latency REAL, error TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS workers ("
+            "worker TEXT PRIMARY KEY, pid INTEGER NOT NULL, started_at REAL NOT NULL, "
+            "seen_at REAL NOT NULL, published INTEGER NOT NULL)"
+        )
+        # Replay only what the router would still count
+        cutoff = time.time() - router.stats_ttl_seconds
+        row = self._conn.execute("SELECT MIN(id) FROM outcomes WHERE at >= ?", (cutoff,)).fetchone()
+        if row[0] is not None:
+            self._last_id = row[0] - 1
+        else:
+            self._last_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM outcomes").fetchone()[0]
+
+    def record(self, provider: str, succeeded: bool, seconds: Optional[float], error: Optional[str]):
+        """ProviderRouter.on_outcome hook: queue a local outcome for the next sync"""
+        self._pending.append((provider, time.time(), succeeded, seconds, error))
+
+    def _exchange(self, outgoing: List[Outcome]) -> List[Outcome]:
+        """Write our outcomes and read the other workers' new ones (blocking; runs in a thread)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO outcomes (worker, provider, at, ok, latency, error) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(self.worker, provider, at, int(ok), latency, error) for provider, at, ok, latency, error in outgoing],
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO workers (worker, pid, started_at, seen_at, published) VALUES (?, ?, ?, ?, ?)",
+                    (self.worker, os.getpid(), self.started_at, now, self.published + len(outgoing)),
+                )
+                if now - self._last_purge >= 60:
+                    self._conn.execute("DELETE FROM outcomes WHERE at < ?", (now - self.retention_seconds,))
+                    self._conn.execute("DELETE FROM workers WHERE seen_at < ?", (now - self.retention_seconds,))
+                    self._last_purge = now
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            rows = self._conn.execute(
+                "SELECT id, worker, provider, at, ok, latency, error FROM outcomes WHERE id > ? ORDER BY id",
+                (self._last_id,),
+            ).fetchall()
+        if rows:
+            self._last_id = rows[-1][0]
+        return [
+            (provider, at, bool(ok), latency, error)
+            for _, worker, provider, at, ok, latency, error in rows
+            if worker != self.worker
+        ]
+
+    def apply(self, outcomes: List[Outcome]):
+        """Replay other workers' outcomes into this process's router and latency trackers"""
+        now = time.time()
+        for provider, at, ok, latency, error in outcomes:
+            self.router.record_remote(provider, ok, latency, error, max(0.0, now - at))
+            if ok and latency is not None and self.hedge_policy is not None:
+                self.hedge_policy.tracker(provider).record(latency)
+        self.applied += len(outcomes)
+
+    async def sync(self):
+        outgoing, self._pending = self._pending, []
+        started = time.perf_counter()
+        try:
+            incoming = await asyncio.to_thread(self._exchange, outgoing)
+        except sqlite3.Error as e:
+            # Keep the outcomes for the next attempt
+            self._pending[:0] = outgoing
+            self.sync_errors += 1
+            self.last_error = str(e)
+            return
+        self.sync_seconds += time.perf_counter() - started
+        self.syncs += 1
+        self.published += len(outgoing)
+        self.apply(incoming)
+
+    async def _run(self):
+        while True:
+            await self.sync()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the sync loop and publish whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.sync()
+
+    def workers(self) -> List[Dict[str, Any]]:
+        """Workers that synced recently, with the number of outcomes each published"""
+        cutoff = time.time() - max(10 * self.interval, 30)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT worker, pid, started_at, seen_at, published FROM workers WHERE seen_at >= ? ORDER BY started_at",
+                (cutoff,),
+            ).fetchall()
+        return [
+            {"worker": worker, "pid": pid, "started_at": started_at, "seconds_since_sync": time.time() - seen_at, "published": published}
+            for worker, pid, started_at, seen_at, published in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "worker": self.worker,
+            "interval_seconds": self.interval,
+            "syncs": self.syncs,
+            "published": self.published,
+            "applied": self.applied,
+            "pending": len(self._pending),
+            "avg_sync_ms": self.sync_seconds / self.syncs * 1000 if self.syncs else 0.0,
+            "sync_errors": self.sync_errors,
+            "last_error": self.last_error,
+        }
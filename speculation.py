@@ -0,0 +1,288 @@
+"""
+Speculative persona generation from partial quiz progress
+
+The quiz is answered step by step, and the fields that shape a persona most
+(TRIGGER_FIELDS) are known well before the final submit. The frontends post
+their partial answers with a session id as the user moves through the steps
+(`progress`). Once every trigger field is answered, a provisional generation
+starts in the background on the answers so far. On the final submit
+(`claim`) the provisional persona is used, or awaited if it is still in
+flight, when it fits the final answers (`fits`). Otherwise it is dropped
+and the caller generates as usual.
+
+A speculation fits when every field the final answers fill in was already
+answered when it started, free text (key_lesson) is unchanged, and the rest
+is within `max_distance`. Distance is the weighted answer mismatch used by
+persona_index: single choice fields cost their weight when they differ, the
+risk slider weight * |difference| / range, and multi selects weight *
+Jaccard distance. A field answered only after the speculation started is
+never a near miss, however little it weighs: the prompt tells the model to
+use every answer, key_lesson above all, and a persona that never saw it
+cannot reflect it (archetypes refuses free text submissions for the same
+reason).
+
+If later progress no longer fits an in-flight or finished speculation, a new
+one replaces it (the old one is cancelled), within the limits below. Calls
+are spent on users who may never submit, so the waste is bounded:
+
+    max_per_session   speculative generations per session
+    max_in_flight     speculative generations running at once
+    starts_per_minute token bucket over all sessions
+
+A session that expires (no progress or submit for `ttl_seconds`) or ends in
+a changed submit counts its speculations as wasted. Hits record how much
+generation time the user did not wait for.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+from persona_index import DEFAULT_WEIGHTS
+from quiz_encoding import QUESTIONS
+from rate_limits import TokenBucket
+
+# The heavily weighted persona_index fields: goal, involvement, risk, horizon,
+# ticket size, sectors and experience
+TRIGGER_FIELDS = tuple(DEFAULT_WEIGHTS)
+
+
+def _answered(value: Any) -> bool:
+    return value not in (None, "", [])
+
+
+class _Speculation:
+    def __init__(self, answers: Dict[str, Any], task: asyncio.Task, started: float):
+        self.answers = answers
+        self.task = task
+        self.started = started
+        self.finished: Optional[float] = None
+
+
+class _Session:
+    def __init__(self):
+        self.speculation: Optional[_Speculation] = None
+        self.started = 0
+
+
+class SpeculativeSessions:
+    """
+    Quiz sessions and their provisional generations
+
+    `generate(answers)` is the coroutine that produces a persona for a dict
+    of (partial) answers, e.g. the cached, coalesced provider path.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[Dict[str, Any]], Awaitable[Any]],
+        trigger_fields: Sequence[str] = TRIGGER_FIELDS,
+        weights: Optional[Dict[str, float]] = None,
+        max_distance: float = 0.15,
+        max_per_session: int = 3,
+        max_in_flight: int = 32,
+        starts_per_minute: float = 120,
+        max_sessions: int = 10000,
+        ttl_seconds: float = 900,
+        questions: Sequence[Dict[str, Any]] = QUESTIONS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.generate = generate
+        self.trigger_fields = list(trigger_fields)
+        self.questions = {q["name"]: q for q in questions}
+        self.weights = {name: 1.0 for name in self.questions}
+        self.weights.update({name: weight for name, weight in {**DEFAULT_WEIGHTS, **(weights or {})}.items() if name in self.weights})
+        self.max_distance = max_distance
+        self.max_per_session = max_per_session
+        self.max_in_flight = max_in_flight
+        self.starts = TokenBucket(starts_per_minute, clock=clock)
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._seen: Dict[str, float] = {}
+        self.in_flight = 0
+
+        self.progress_updates = 0
+        self.started = 0
+        self.restarted = 0
+        self.skipped: Dict[str, int] = {"session_limit": 0, "in_flight_limit": 0, "rate_limit": 0}
+        # Submits by outcome: hit (speculation used), changed (answers changed or added),
+        # failed (the speculative generation raised), none (no speculation to use)
+        self.claims: Dict[str, int] = {"hit": 0, "changed": 0, "failed": 0, "none": 0}
+        self.wasted = 0
+        self.saved_seconds = 0.0
+        self.waited_seconds = 0.0
+
+    def distance(self, speculated: Dict[str, Any], final: Dict[str, Any]) -> float:
+        """Weighted mismatch of the speculated answers against the final ones, 0..1"""
+        total = cost = 0.0
+        for name, value in final.items():
+            question = self.questions.get(name)
+            if question is None or not _answered(value):
+                continue
+            weight = self.weights[name]
+            total += weight
+            guess = speculated.get(name)
+            if not _answered(guess):
+                cost += weight
+            elif question["type"] == "slider":
+                cost += weight * abs(value - guess) / max(1, question["max"] - question["min"])
+            elif question["type"] == "multi":
+                chosen, guessed = set(value), set(guess)
+                cost += weight * (1 - len(chosen & guessed) / len(chosen | guessed))
+            elif guess != value:
+                cost += weight
+        return cost / total if total else 0.0
+
+    def fits(self, speculated: Dict[str, Any], final: Dict[str, Any]) -> bool:
+        """Whether a persona generated from the speculated answers can be served for the final ones"""
+        for name, value in final.items():
+            question = self.questions.get(name)
+            if question is None or not _answered(value):
+                continue
+            guess = speculated.get(name)
+            if not _answered(guess):
+                return False
+            if question["type"] == "textarea" and guess != value:
+                return False
+        return self.distance(speculated, final) <= self.max_distance
+
+    def progress(self, session_id: str, answers: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a session's answers so far; starts (or restarts) a speculation when warranted"""
+        self._expire()
+        self.progress_updates += 1
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session()
+            if len(self._sessions) > self.max_sessions:
+                self._drop(next(iter(self._sessions)))
+        self._sessions.move_to_end(session_id)
+        self._seen[session_id] = self.clock()
+
+        status = {"session_id": session_id, "speculating": session.speculation is not None}
+        missing = [name for name in self.trigger_fields if not _answered(answers.get(name))]
+        if missing:
+            return {**status, "waiting_for": missing}
+        current = session.speculation
+        if current is not None and self.fits(current.answers, answers):
+            return status
+        reason = self._refusal(session)
+        if reason is not None:
+            self.skipped[reason] += 1
+            return {**status, "skipped": reason}
+        if current is not None:
+            # Answers changed or were added since; the new one replaces it
+            self._discard(current)
+            self.restarted += 1
+        self._start(session, answers)
+        return {**status, "speculating": True}
+
+    def _refusal(self, session: _Session) -> Optional[str]:
+        if session.started >= self.max_per_session:
+            return "session_limit"
+        if self.in_flight >= self.max_in_flight:
+            return "in_flight_limit"
+        if self.starts.wait_time(1) > 0:
+            return "rate_limit"
+        return None
+
+    def _start(self, session: _Session, answers: Dict[str, Any]):
+        self.starts.take(1)
+        task = asyncio.ensure_future(self.generate(dict(answers)))
+        speculation = _Speculation(dict(answers), task, self.clock())
+        self.in_flight += 1
+        task.add_done_callback(lambda _: self._finished(speculation))
+        session.speculation = speculation
+        session.started += 1
+        self.started += 1
+
+    def _finished(self, speculation: _Speculation):
+        speculation.finished = self.clock()
+        self.in_flight -= 1
+        if not speculation.task.cancelled():
+            # Retrieve it so an unclaimed failure is not logged as never retrieved
+            speculation.task.exception()
+
+    def _discard(self, speculation: _Speculation):
+        speculation.task.cancel()
+        self.wasted += 1
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self._seen.pop(session_id, None)
+        if session.speculation is not None:
+            self._discard(session.speculation)
+
+    def _expire(self):
+        cutoff = self.clock() - self.ttl_seconds
+        while self._sessions:
+            session_id = next(iter(self._sessions))
+            if self._seen[session_id] >= cutoff:
+                break
+            self._drop(session_id)
+
+    async def claim(self, session_id: str, answers: Dict[str, Any]) -> Optional[Any]:
+        """
+        The session's speculative persona if it fits the final answers, else None
+
+        The session ends either way. An in-flight speculation is awaited:
+        it started before this submit, so it finishes sooner than a new call.
+        """
+        self._expire()
+        session = self._sessions.pop(session_id, None)
+        self._seen.pop(session_id, None)
+        speculation = session.speculation if session is not None else None
+        if speculation is None:
+            self.claims["none"] += 1
+            return None
+        if not self.fits(speculation.answers, answers):
+            self._discard(speculation)
+            self.claims["changed"] += 1
+            return None
+        submitted = self.clock()
+        try:
+            persona = await asyncio.shield(speculation.task)
+        except asyncio.CancelledError:
+            if speculation.task.cancelled():
+                self.claims["failed"] += 1
+                return None
+            raise
+        except Exception:
+            self.claims["failed"] += 1
+            return None
+        now = self.clock()
+        waited = now - submitted
+        # A task that was already done may not have run its done callback yet
+        finished = speculation.finished if speculation.finished is not None else now
+        self.claims["hit"] += 1
+        self.waited_seconds += waited
+        # What a call started at submit would have taken, less what was still waited for
+        self.saved_seconds += (finished - speculation.started) - waited
+        return persona
+
+    def stats(self) -> Dict[str, Any]:
+        claims = sum(self.claims.values())
+        return {
+            "sessions": len(self._sessions),
+            "progress_updates": self.progress_updates,
+            "speculations_started": self.started,
+            "speculations_restarted": self.restarted,
+            "speculations_in_flight": self.in_flight,
+            "skipped": self.skipped,
+            "claims": self.claims,
+            "hit_rate": self.claims["hit"] / claims if claims else 0.0,
+            "wasted": self.wasted,
+            "saved_seconds": self.saved_seconds,
+            "avg_saved_seconds": self.saved_seconds / self.claims["hit"] if self.claims["hit"] else 0.0,
+            "avg_waited_seconds": self.waited_seconds / self.claims["hit"] if self.claims["hit"] else 0.0,
+            "config": {
+                "trigger_fields": self.trigger_fields,
+                "max_distance": self.max_distance,
+                "max_per_session": self.max_per_session,
+                "max_in_flight": self.max_in_flight,
+                "starts_per_minute": self.starts.capacity,
+                "ttl_seconds": self.ttl_seconds,
+            },
+        }
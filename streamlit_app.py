@@ -8,6 +8,7 @@ import requests
 import json
 from datetime import datetime
 import os
+import uuid
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -255,7 +256,7 @@ def main():
         st.header("⚙️ Settings")
         mode = st.radio(
             "Generation Mode",
-            ["AI-Powered (Full)", "Rule-Based (Basic)", "Hybrid (Both)"],
+            ["AI-Powered (Full)", "AI-Powered (Streaming)", "Rule-Based (Basic)", "Hybrid (Both)"],
             help="AI mode provides detailed insights, Rule-based is faster"
         )
         
@@ -288,6 +289,8 @@ def main():
                         st.session_state.quiz_answers[key] = st.selectbox(
                             QUESTIONS[key]["label"],
                             options=QUESTIONS[key]["options"],
+                            index=None,
+                            placeholder="Choose an option",
                             key=f"q_{key}"
                         )
                 
@@ -298,7 +301,10 @@ def main():
                     min_value=1,
                     max_value=5,
                     value=3,
-                    help="1 = Stable and predictable | 5 = High risk, high upside"
+                    help="1 = Stable and predictable | 5 = High risk, high upside",
+                    key="q_risk_tolerance",
+                    on_change=mark_answered,
+                    args=("risk_tolerance",)
                 )
                 st.caption("Lower = Safer, Higher = More Aggressive")
         
@@ -311,6 +317,8 @@ def main():
                         st.session_state.quiz_answers[key] = st.selectbox(
                             QUESTIONS[key]["label"],
                             options=QUESTIONS[key]["options"],
+                            index=None,
+                            placeholder="Choose an option",
                             key=f"q_{key}"
                         )
         
@@ -354,6 +362,10 @@ def main():
                 height=100
             )
         
+        # Let the backend start generating once the answers that shape the persona are in
+        if mode == "AI-Powered (Full)":
+            send_quiz_progress(st.session_state.quiz_answers)
+        
         # Generate button
         st.markdown("---")
         if st.button("🚀 Generate My Investor Persona", type="primary", use_container_width=True):
@@ -361,24 +373,53 @@ def main():
                 # Determine endpoint
                 if mode == "AI-Powered (Full)":
                     endpoint = f"{API_BASE_URL}/generate-persona"
+                elif mode == "AI-Powered (Streaming)":
+                    endpoint = f"{API_BASE_URL}/generate-persona/stream"
                 elif mode == "Rule-Based (Basic)":
                     endpoint = f"{API_BASE_URL}/generate-persona/basic"
                 else:
                     endpoint = f"{API_BASE_URL}/generate-persona/hybrid"
                 
                 try:
-                    response = requests.post(
-                        endpoint,
-                        json=st.session_state.quiz_answers
-                    )
-                    
-                    if response.status_code == 200:
-                        st.session_state.persona_result = response.json()
+                    if mode == "AI-Powered (Streaming)":
+                        st.session_state.persona_result = stream_persona(
+                            endpoint,
+                            st.session_state.quiz_answers,
+                            st.empty()
+                        )
                         st.session_state.generation_mode = mode
                         st.success("✅ Persona generated successfully!")
                         st.info("👉 Check the **Results** tab to view your investor persona")
+                    elif mode == "Hybrid (Both)":
+                        st.session_state.persona_result = progressive_hybrid_persona(
+                            endpoint,
+                            st.session_state.quiz_answers,
+                            st.empty()
+                        )
+                        st.session_state.generation_mode = mode
+                        if st.session_state.persona_result.get("ai_error"):
+                            st.warning(f"⚠️ AI persona failed, showing rule-based tags only: {st.session_state.persona_result['ai_error']}")
+                        else:
+                            st.success("✅ Persona generated successfully!")
+                        st.info("👉 Check the **Results** tab to view your investor persona")
                     else:
-                        st.error(f"Error: {response.json().get('detail', 'Unknown error')}")
+                        response = requests.post(
+                            endpoint,
+                            params={"session_id": quiz_session_id()} if mode == "AI-Powered (Full)" else None,
+                            json=st.session_state.quiz_answers
+                        )
+                        
+                        if response.status_code == 200:
+                            st.session_state.persona_result = response.json()
+                            st.session_state.generation_mode = mode
+                            if mode == "AI-Powered (Full)":
+                                # The submit ended the session; later edits start a new one
+                                del st.session_state.quiz_session_id
+                                st.session_state.pop("sent_progress", None)
+                            st.success("✅ Persona generated successfully!")
+                            st.info("👉 Check the **Results** tab to view your investor persona")
+                        else:
+                            st.error(f"Error: {response.json().get('detail', 'Unknown error')}")
                         
                 except requests.exceptions.ConnectionError:
                     st.error("❌ Cannot connect to API. Make sure the backend is running on port 8000.")
@@ -396,7 +437,10 @@ def main():
             if st.session_state.generation_mode == "Hybrid (Both)":
                 # Show both AI and rule-based
                 st.markdown("#### 🤖 AI-Generated Persona")
-                display_full_persona(result.get("ai_persona", {}))
+                if result.get("ai_persona"):
+                    display_full_persona(result["ai_persona"])
+                else:
+                    st.warning(f"AI persona unavailable: {result.get('ai_error', 'Unknown error')}")
                 
                 st.markdown("---")
                 st.markdown("#### 📊 Rule-Based Tags")
@@ -434,6 +478,89 @@ def main():
         else:
             st.info("👈 Complete the quiz and click 'Generate My Investor Persona' to see results here.")
 
+def quiz_session_id():
+    if "quiz_session_id" not in st.session_state:
+        st.session_state.quiz_session_id = uuid.uuid4().hex
+    return st.session_state.quiz_session_id
+
+def mark_answered(key):
+    """Remember that a widget with a preset value (the risk slider) was set by the user"""
+    st.session_state.setdefault("answered_fields", set()).add(key)
+
+def send_quiz_progress(answers):
+    """Post the answers the user has given to /quiz/progress so the persona can be generated before the submit"""
+    # Blank widgets and the slider's untouched preset are not answers yet
+    answered = {
+        key: value for key, value in answers.items()
+        if value not in (None, "", []) and (key != "risk_tolerance" or key in st.session_state.get("answered_fields", ()))
+    }
+    if not answered or st.session_state.get("sent_progress") == answered:
+        return
+    # Recorded before posting, so an unreachable API is not retried (and waited for) on every rerun
+    st.session_state.sent_progress = answered
+    try:
+        requests.post(
+            f"{API_BASE_URL}/quiz/progress",
+            json={"session_id": quiz_session_id(), "answers": answered},
+            timeout=1
+        )
+    except requests.exceptions.RequestException:
+        pass  # best effort: without it the submit just generates from scratch
+
+def stream_persona(endpoint, answers, placeholder):
+    """Read server-sent persona events, rendering each field as it arrives"""
+    persona = {}
+    with requests.post(endpoint, json=answers, stream=True) as response:
+        if response.status_code != 200:
+            raise Exception(response.json().get("detail", "Unknown error"))
+        
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "field":
+                    persona[data["field"]] = data["value"]
+                    with placeholder.container():
+                        display_full_persona(persona)
+                elif event == "done":
+                    return data
+                elif event == "error":
+                    raise Exception(data["detail"])
+    return persona
+
+def progressive_hybrid_persona(endpoint, answers, placeholder):
+    """
+    Show the rule-based tags right away, then long-poll the job for the AI persona
+
+    If the AI job fails the rule-based tags are still returned, with the
+    error under "ai_error" instead of an AI persona.
+    """
+    response = requests.post(endpoint, params={"progressive": "true"}, json=answers)
+    if response.status_code != 200:
+        raise Exception(response.json().get("detail", "Unknown error"))
+    result = response.json()
+    if result["status"] == "done":
+        return result
+    
+    with placeholder.container():
+        st.markdown("#### 📊 Rule-Based Tags")
+        display_tags(result["rule_based_tags"])
+        st.caption("AI persona on its way...")
+    
+    job_url = f"{API_BASE_URL}{result['poll_url']}"
+    hybrid = {"ai_persona": None, "rule_based_tags": result["rule_based_tags"], "method": "hybrid"}
+    while True:
+        job_response = requests.get(job_url, params={"wait": 25})
+        if job_response.status_code != 200:
+            return {**hybrid, "ai_error": job_response.json().get("detail", "Unknown error")}
+        job = job_response.json()
+        if job["status"] == "done":
+            return {**hybrid, "ai_persona": job["ai_persona"]}
+        if job["status"] == "failed":
+            return {**hybrid, "ai_error": job["error"]}
+
 def display_tags(tags):
     """Display persona tags with styling"""
     tag_html = " ".join([f'<span class="persona-tag">{tag}</span>' for tag in tags])
@@ -0,0 +1,124 @@
+"""
+Hedged provider races: hedge timing, immediate replacement of failures,
+deadlines and the latencies they learn from
+
+Run with `python -m unittest discover tests` (or pytest).
+"""
+
+import asyncio
+import os
+import sys
+import time
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from hedging import AllProvidersFailed, DeadlineExceeded, HedgePolicy, LatencyTracker, race_providers  # noqa: E402
+
+
+def answer_after(seconds, result="persona"):
+    async def call():
+        await asyncio.sleep(seconds)
+        return result
+    return call
+
+
+def fail_after(seconds, message="down"):
+    async def call():
+        await asyncio.sleep(seconds)
+        raise RuntimeError(message)
+    return call
+
+
+class LatencyTrackerTest(unittest.TestCase):
+    def test_percentile(self):
+        tracker = LatencyTracker(window=10)
+        self.assertIsNone(tracker.percentile(90))
+        for seconds in range(1, 11):
+            tracker.record(seconds)
+        self.assertEqual((tracker.percentile(50), tracker.percentile(90)), (5, 9))
+        tracker.record(100)
+        self.assertEqual(len(tracker), 10)
+        self.assertEqual(tracker.percentile(100), 100)
+
+    def test_delay_follows_the_percentile_once_warm(self):
+        policy = HedgePolicy(default_delay=4, min_samples=3)
+        policy.tracker("OpenAI").record(1)
+        self.assertEqual(policy.hedge_delay("OpenAI"), 4)
+        policy.tracker("OpenAI").record(2)
+        policy.tracker("OpenAI").record(3)
+        self.assertEqual(policy.hedge_delay("OpenAI"), 3)
+        self.assertEqual(HedgePolicy(enabled=False).hedge_delay("OpenAI"), float("inf"))
+
+
+class RaceProvidersTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.log = []
+        self.policy = HedgePolicy(default_delay=0.1, min_samples=100)
+
+    async def race(self, calls, deadline=5.0):
+        return await race_providers(calls, self.policy, deadline, log=self.log.append)
+
+    async def test_fast_primary_wins_without_hedging(self):
+        result = await self.race([("OpenAI", answer_after(0.01)), ("Gemini", answer_after(0.01, "other"))])
+        self.assertEqual(result, ("OpenAI", "persona"))
+        self.assertEqual(len(self.log), 1)
+        self.assertEqual(len(self.policy.tracker("OpenAI")), 1)
+
+    async def test_slow_primary_is_hedged_and_its_time_recorded(self):
+        started = time.perf_counter()
+        result = await self.race([("OpenAI", answer_after(1)), ("Gemini", answer_after(0.05, "hedged"))])
+        self.assertEqual(result, ("Gemini", "hedged"))
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertIn("hedge", self.log[-1])
+        # The cancelled primary ran past its delay, so it counts towards its latency
+        tracker = self.policy.tracker("OpenAI")
+        self.assertEqual(len(tracker), 1)
+        self.assertGreater(tracker.percentile(100), 0.1)
+
+    async def test_just_launched_loser_is_not_recorded(self):
+        self.policy = HedgePolicy(default_delay=0.05, min_samples=100)
+        await self.race([("OpenAI", answer_after(0.07)), ("Gemini", answer_after(1))])
+        self.assertEqual(len(self.policy.tracker("Gemini")), 0)
+
+    async def test_failure_is_replaced_while_a_hedge_is_running(self):
+        self.policy = HedgePolicy(default_delay=0.05, min_samples=100)
+        started = time.perf_counter()
+        result = await self.race([
+            ("OpenAI", answer_after(1)),
+            ("Gemini", fail_after(0.01)),
+            ("Claude", answer_after(0.01, "third")),
+        ])
+        # Claude starts when Gemini fails, not a full hedge delay later
+        self.assertEqual(result, ("Claude", "third"))
+        self.assertLess(time.perf_counter() - started, 0.09)
+        self.assertTrue(self.log[-1].startswith("Attempting generation with Claude (fallback)"))
+
+    async def test_all_failed(self):
+        with self.assertRaises(AllProvidersFailed) as raised:
+            await self.race([("OpenAI", fail_after(0, "a")), ("Gemini", fail_after(0, "b"))])
+        self.assertEqual([name for name, _ in raised.exception.errors], ["OpenAI", "Gemini"])
+
+    async def test_deadline_records_the_timed_out_calls(self):
+        with self.assertRaises(DeadlineExceeded) as raised:
+            await self.race([("OpenAI", answer_after(5))], deadline=0.2)
+        self.assertEqual(raised.exception.timed_out, ["OpenAI"])
+        self.assertGreaterEqual(self.policy.tracker("OpenAI").percentile(100), 0.2)
+
+    async def test_sequential_when_disabled(self):
+        self.policy = HedgePolicy(enabled=False)
+        result = await self.race([("OpenAI", fail_after(0.01)), ("Gemini", answer_after(0.01, "next"))])
+        self.assertEqual(result, ("Gemini", "next"))
+
+    async def test_unstarted_providers_are_released(self):
+        released = []
+        await race_providers(
+            [("OpenAI", answer_after(0)), ("Gemini", answer_after(0)), ("Claude", answer_after(0))],
+            self.policy, 5, log=self.log.append, release=released.append,
+        )
+        self.assertEqual(released, ["Gemini", "Claude"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Incremental parsing of streamed persona JSON, and repair of broken responses
+
+Run with `python -m unittest discover tests` (or pytest).
+"""
+
+import json
+import os
+import sys
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from incremental_json import IncrementalObjectParser  # noqa: E402
+from json_repair import repair_json_object  # noqa: E402
+
+PERSONA = {
+    "persona_tags": ["Mid risk - balanced", "Hands-on hybrid"],
+    "persona_summary": "Says \"numbers first\", then {acts}, [carefully].",
+    "scores": {"risk": 3, "nested": [1, {"a": "}"}]},
+    "ready": True,
+}
+
+
+class IncrementalObjectParserTest(unittest.TestCase):
+    def test_members_arrive_as_soon_as_they_are_complete(self):
+        parser = IncrementalObjectParser()
+        text = "```json\n" + json.dumps(PERSONA) + "\n```"
+        arrived = {}
+        for position, ch in enumerate(text):
+            for key, _ in parser.feed(ch):
+                arrived[key] = position
+        self.assertEqual(list(arrived), list(PERSONA))
+        # persona_tags is handed back at the comma after its closing bracket
+        self.assertEqual(arrived["persona_tags"], text.index('"persona_summary"') - 2)
+        self.assertTrue(parser.complete)
+
+    def test_any_chunking_gives_the_same_members(self):
+        text = json.dumps(PERSONA, indent=2)
+        for size in (1, 3, 7, len(text)):
+            parser = IncrementalObjectParser()
+            members = [member for start in range(0, len(text), size) for member in parser.feed(text[start:start + size])]
+            self.assertEqual(dict(members), PERSONA)
+
+    def test_text_after_the_object_is_ignored(self):
+        parser = IncrementalObjectParser()
+        self.assertEqual(parser.feed('{"a": 1, "b": [2]} trailing {"c": 3}'), [("a", 1), ("b", [2])])
+        self.assertEqual(parser.feed(', "d": 4}'), [])
+
+    def test_broken_member_raises(self):
+        with self.assertRaises(ValueError):
+            IncrementalObjectParser().feed('{"a": nope, ')
+
+
+class RepairJsonObjectTest(unittest.TestCase):
+    def test_clean_json_needs_no_repair(self):
+        self.assertEqual(repair_json_object(json.dumps(PERSONA)), (PERSONA, None))
+
+    def test_fence_and_prose_are_extracted(self):
+        fenced = "Here you go:\n```json\n" + json.dumps(PERSONA) + "\n```\nEnjoy"
+        self.assertEqual(repair_json_object(fenced), (PERSONA, "extracted"))
+        self.assertEqual(repair_json_object("Sure! " + json.dumps(PERSONA)), (PERSONA, "extracted"))
+
+    def test_trailing_commas(self):
+        self.assertEqual(repair_json_object('{"a": [1, 2,], "b": {"c": 3,},}'), ({"a": [1, 2], "b": {"c": 3}}, "trailing_comma"))
+
+    def test_truncated_output_keeps_the_complete_members(self):
+        self.assertEqual(
+            repair_json_object('{"a": 1, "b": ["x", "y"], "c": "cut off mid str'),
+            ({"a": 1, "b": ["x", "y"]}, "truncated"),
+        )
+        self.assertEqual(repair_json_object('{"a": {"b": [1, 2], "c": '), ({"a": {"b": [1, 2]}}, "truncated"))
+        self.assertEqual(repair_json_object('{"summary": "cut'), ({}, "truncated"))
+
+    def test_unrecoverable(self):
+        for text in ("no json here", "[1, 2]", '{"a": nope}'):
+            with self.assertRaises(ValueError):
+                repair_json_object(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
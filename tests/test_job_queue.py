@@ -0,0 +1,173 @@
+"""
+Durable SQLite job queue and the worker pool that drains it
+
+Run with `python -m unittest discover tests` (or pytest).
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from job_queue import JobWorkers, QueueFull, SQLiteJobQueue  # noqa: E402
+
+
+class QueueTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "jobs.db")
+
+    def queue(self, **kwargs) -> SQLiteJobQueue:
+        return SQLiteJobQueue(self.path, **kwargs)
+
+
+class SQLiteJobQueueTest(QueueTestCase):
+    def test_claims_in_order_and_completes(self):
+        queue = self.queue()
+        first = queue.enqueue({"n": 1})
+        second = queue.enqueue({"n": 2})
+        job_id, payload, attempt, waited = queue.claim()
+        self.assertEqual((job_id, payload, attempt), (first, {"n": 1}, 1))
+        self.assertGreaterEqual(waited, 0)
+        queue.complete(first, {"ok": True})
+        self.assertEqual(queue.claim()[0], second)
+        self.assertIsNone(queue.claim())
+        job = queue.get(first)
+        self.assertEqual((job["status"], job["result"], job["attempts"]), ("done", {"ok": True}, 1))
+        self.assertEqual(queue.depth(), {"queued": 0, "running": 1, "done": 1, "failed": 0})
+
+    def test_full_queue_rejects(self):
+        queue = self.queue(max_depth=1)
+        queue.enqueue({})
+        with self.assertRaises(QueueFull):
+            queue.enqueue({})
+        self.assertEqual(queue.rejected, 1)
+
+    def test_retries_with_backoff_then_fails_with_fallback(self):
+        queue = self.queue(max_attempts=2, retry_base_seconds=10)
+        job_id = queue.enqueue({})
+        queue.claim()
+        self.assertTrue(queue.retry_or_fail(job_id, 1, "boom"))
+        # Backed off: not claimable until its jittered delay has passed
+        with mock.patch("job_queue.time.time", return_value=time.time() + 21):
+            self.assertEqual(queue.claim()[2], 2)
+        self.assertFalse(queue.retry_or_fail(job_id, 2, "boom again", fallback={"method": "rules"}))
+        job = queue.get(job_id)
+        self.assertEqual((job["status"], job["error"], job["result"]), ("failed", "boom again", {"method": "rules"}))
+
+    def test_expired_lease_is_claimed_again(self):
+        queue = self.queue(lease_seconds=30)
+        job_id = queue.enqueue({})
+        queue.claim()
+        self.assertIsNone(queue.claim())
+        with mock.patch("job_queue.time.time", return_value=time.time() + 31):
+            self.assertEqual(queue.claim()[:3], (job_id, {}, 2))
+
+    def test_release_does_not_count_the_attempt(self):
+        queue = self.queue()
+        job_id = queue.enqueue({})
+        queue.claim()
+        queue.release(job_id)
+        self.assertEqual(queue.claim()[2], 1)
+
+    def test_jobs_survive_a_restart(self):
+        job_id = self.queue().enqueue({"n": 1})
+        reopened = self.queue()
+        self.assertEqual(reopened.depth()["queued"], 1)
+        self.assertEqual(reopened.claim()[:2], (job_id, {"n": 1}))
+
+    def test_purge_drops_old_finished_jobs(self):
+        queue = self.queue(ttl_seconds=60)
+        job_id = queue.enqueue({})
+        queue.claim()
+        queue.complete(job_id, {})
+        self.assertEqual(queue.purge(), 0)
+        with mock.patch("job_queue.time.time", return_value=time.time() + 61):
+            self.assertEqual(queue.purge(), 1)
+        self.assertIsNone(queue.get(job_id))
+
+    async def test_concurrent_claims_never_share_a_job(self):
+        queues = [self.queue() for _ in range(4)]
+        ids = {queues[0].enqueue({"n": n}) for n in range(40)}
+
+        def drain(queue):
+            claimed = []
+            while (job := queue.claim()) is not None:
+                claimed.append(job[0])
+            return claimed
+
+        results = await asyncio.gather(*(asyncio.to_thread(drain, queue) for queue in queues))
+        claimed = [job_id for result in results for job_id in result]
+        self.assertEqual(sorted(claimed), sorted(ids))
+
+
+class JobWorkersTest(QueueTestCase):
+    async def test_drains_the_queue_concurrently(self):
+        queue = self.queue()
+        running = peak = 0
+
+        async def handler(payload):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            return {"double": payload["n"] * 2}
+
+        ids = [queue.enqueue({"n": n}) for n in range(6)]
+        workers = JobWorkers(queue, handler, concurrency=3, poll_seconds=0.01)
+        workers.start()
+        try:
+            for _ in range(200):
+                if queue.depth()["done"] == len(ids):
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await workers.stop()
+        self.assertEqual([queue.get(job_id)["result"] for job_id in ids], [{"double": n * 2} for n in range(6)])
+        self.assertEqual(peak, 3)
+
+    async def test_exhausted_job_stores_the_fallback(self):
+        queue = self.queue(max_attempts=1)
+
+        async def handler(payload):
+            raise RuntimeError("providers down")
+
+        job_id = queue.enqueue({"n": 1})
+        workers = JobWorkers(queue, handler, fallback=lambda payload, error: {"fallback": error}, poll_seconds=0.01)
+        workers.start()
+        try:
+            for _ in range(200):
+                if queue.get(job_id)["status"] == "failed":
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await workers.stop()
+        self.assertEqual(queue.get(job_id)["result"], {"fallback": "providers down"})
+
+    async def test_stop_hands_running_jobs_back(self):
+        queue = self.queue()
+        started = asyncio.Event()
+
+        async def handler(payload):
+            started.set()
+            await asyncio.sleep(60)
+
+        job_id = queue.enqueue({})
+        workers = JobWorkers(queue, handler, concurrency=1, poll_seconds=0.01)
+        workers.start()
+        await asyncio.wait_for(started.wait(), 5)
+        await workers.stop()
+        job = queue.get(job_id)
+        self.assertEqual((job["status"], job["attempts"]), ("queued", 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""
+Metrics are labelled with route templates, never raw request paths
+
+Run with `python -m unittest discover tests` (or pytest).
+"""
+
+import os
+import sys
+import unittest
+
+import httpx
+from fastapi import FastAPI
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from metrics import MetricsMiddleware, MetricsRegistry, current_endpoint  # noqa: E402
+
+
+class MetricsMiddlewareTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        registry = self.registry = MetricsRegistry()
+        self.requests = registry.histogram("requests_seconds", "Request latency", ["endpoint", "method", "status"])
+        self.generations = registry.counter("generations_total", "Generations", ["endpoint"])
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware, histogram=self.requests)
+
+        @app.get("/jobs/{job_id}")
+        async def get_job(job_id: str):
+            self.generations.inc(current_endpoint.get())
+            return {"endpoint": current_endpoint.get()}
+
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_contextvar_holds_the_route_template(self):
+        for job_id in ("a1", "b2", "c3"):
+            response = await self.client.get(f"/jobs/{job_id}")
+            self.assertEqual(response.json(), {"endpoint": "/jobs/{job_id}"})
+        self.assertIn('generations_total{endpoint="/jobs/{job_id}"} 3', self.registry.render())
+
+    async def test_unmatched_and_wrong_method(self):
+        await self.client.get("/nope/123")
+        await self.client.delete("/jobs/a1")
+        counts = [line for line in self.registry.render().splitlines() if line.startswith("requests_seconds_count")]
+        self.assertEqual(sorted(counts), [
+            'requests_seconds_count{endpoint="/jobs/{job_id}",method="DELETE",status="405"} 1',
+            'requests_seconds_count{endpoint="unmatched",method="GET",status="404"} 1',
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Bit-packed quiz answers: the codec round trip and the array-backed corpus
+
+Run with `python -m unittest discover tests` (or pytest).
+"""
+
+import os
+import sys
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from packed_answers import SIDE_ENTRY_BIT, AnswerCodec, PackedAnswers  # noqa: E402
+from persona_cache import canonical_answers  # noqa: E402
+
+ANSWERS = {
+    "goal_primary": "I want to own and actively run a business",
+    "risk_tolerance": 4,
+    "sectors": ["Tech and SaaS", "Food and beverage"],
+    "geo_scope": [],
+    "key_lesson": "",
+}
+
+
+class AnswerCodecTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.codec = AnswerCodec()
+
+    def test_option_answers_pack_into_the_key_alone(self):
+        key, side = self.codec.encode(ANSWERS)
+        self.assertIsNone(side)
+        self.assertLess(key, SIDE_ENTRY_BIT)
+        self.assertLessEqual(self.codec.bits, 63)
+        self.assertEqual(canonical_answers(self.codec.decode(key)), canonical_answers(ANSWERS))
+        self.assertEqual(self.codec.decode(key)["sectors"], ["Food and beverage", "Tech and SaaS"])
+
+    def test_free_text_and_unknown_values_go_to_the_side_entry(self):
+        answers = {**ANSWERS, "key_lesson": "Cash flow is king", "time_horizon": "Forever", "sectors": ["Tech and SaaS", "Crypto"]}
+        key, side = self.codec.encode(answers)
+        self.assertTrue(key & SIDE_ENTRY_BIT)
+        self.assertEqual(side, '{"key_lesson":"Cash flow is king","sectors":["Crypto","Tech and SaaS"],"time_horizon":"Forever"}')
+        self.assertEqual(canonical_answers(self.codec.decode(key, side)), canonical_answers(answers))
+
+    def test_stable_key(self):
+        key, side = self.codec.encode({**ANSWERS, "key_lesson": "Cash flow is king"})
+        self.assertEqual(self.codec.stable_key(key, side), self.codec.stable_key(*self.codec.encode({**ANSWERS, "key_lesson": "Cash flow is king"})))
+        self.assertNotEqual(self.codec.stable_key(key, side), self.codec.stable_key(*self.codec.encode({**ANSWERS, "key_lesson": "Other"})))
+        self.assertEqual(len(self.codec.stable_key(*self.codec.encode(ANSWERS))), 16)
+
+    def test_too_many_options_are_rejected(self):
+        questions = [{"name": f"q{n}", "type": "multi", "options": [str(i) for i in range(16)]} for n in range(4)]
+        with self.assertRaises(ValueError):
+            AnswerCodec(questions)
+
+
+class PackedAnswersTest(unittest.TestCase):
+    def test_corpus_round_trip_and_growth(self):
+        submissions = [ANSWERS, {"risk_tolerance": 1, "key_lesson": "Patience"}, {}, {"key_lesson": "Patience"}]
+        packed = PackedAnswers(AnswerCodec(), capacity=1)
+        packed.extend(submissions)
+        packed.append(ANSWERS)
+        self.assertEqual(len(packed), 5)
+        self.assertEqual([canonical_answers(answers) for answers in packed], [canonical_answers(a) for a in submissions + [ANSWERS]])
+        self.assertEqual(canonical_answers(packed[-1]), canonical_answers(ANSWERS))
+        # Equal side entries are stored once
+        self.assertEqual(packed.strings, ['{"key_lesson":"Patience"}'])
+        with self.assertRaises(IndexError):
+            packed[5]
+
+    def test_column_and_unique_indexes(self):
+        packed = PackedAnswers.from_answers(AnswerCodec(), [ANSWERS, {"risk_tolerance": 1}, ANSWERS, {}])
+        self.assertEqual(packed.column("risk_tolerance").tolist(), [4, 1, 4, 0])
+        self.assertEqual(packed.unique_indexes().tolist(), [0, 1, 3])
+        self.assertEqual(packed.nbytes, 4 * 12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Persona cache keys, the in-memory LRU and the SQLite tier behind it
+
+Run with `python -m unittest discover tests` (or pytest).
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from persona_cache import LRUCache, PersonaCache, SQLitePersonaStore, persona_cache_key  # noqa: E402
+
+PERSONA = {"persona_summary": "A measured investor.", "provider": "OpenAI"}
+
+
+class CacheKeyTest(unittest.TestCase):
+    def test_multi_select_order_and_blanks_do_not_matter(self):
+        a = {"sectors": ["Food", "Retail"], "risk_tolerance": 3, "key_lesson": ""}
+        b = {"risk_tolerance": 3, "sectors": ["Retail", "Food"], "geo_scope": []}
+        self.assertEqual(persona_cache_key(a, "v1", "m"), persona_cache_key(b, "v1", "m"))
+
+    def test_prompt_version_and_model_are_part_of_the_key(self):
+        answers = {"risk_tolerance": 3}
+        keys = {persona_cache_key(answers, "v1", "m"), persona_cache_key(answers, "v2", "m"), persona_cache_key(answers, "v1", "n")}
+        self.assertEqual(len(keys), 3)
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_entries_expire(self):
+        cache = LRUCache(ttl_seconds=10)
+        cache.set("a", 1)
+        with mock.patch("persona_cache.time.monotonic", return_value=time.monotonic() + 11):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.expirations, 1)
+
+
+class PersistentTierTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "personas.db")
+
+    def cache(self, **kwargs) -> PersonaCache:
+        return PersonaCache(LRUCache(), SQLitePersonaStore(self.path, **kwargs))
+
+    async def test_survives_a_restart(self):
+        await self.cache().aset("k", PERSONA)
+        restarted = self.cache()
+        self.assertEqual(await restarted.aget("k"), PERSONA)
+        self.assertEqual(await restarted.aget("k"), PERSONA)
+        self.assertEqual((restarted.persistent_hits, restarted.memory_hits, restarted.misses), (1, 1, 0))
+
+    async def test_shared_between_processes_writing_the_same_file(self):
+        first, second = self.cache(), self.cache()
+        await first.aset("k", PERSONA)
+        self.assertEqual(second.get("k"), PERSONA)
+
+    async def test_miss_is_counted_once(self):
+        cache = self.cache()
+        self.assertIsNone(await cache.aget("missing"))
+        self.assertIsNone(cache.get("missing"))
+        self.assertEqual(cache.misses, 2)
+        memory_only = PersonaCache(LRUCache())
+        self.assertIsNone(await memory_only.aget("missing"))
+        self.assertEqual(memory_only.misses, 1)
+
+    async def test_expired_rows_are_dropped(self):
+        self.cache(ttl_seconds=10).set("k", PERSONA)
+        cache = self.cache(ttl_seconds=10)
+        with mock.patch("persona_cache.time.time", return_value=time.time() + 11):
+            self.assertIsNone(await cache.aget("k"))
+        self.assertEqual(len(cache.persistent), 0)
+
+    async def test_loads_and_dumps_convert_persistent_values(self):
+        cache = PersonaCache(LRUCache(), SQLitePersonaStore(self.path), loads=tuple, dumps=list)
+        await cache.aset("k", ("a", "b"))
+        self.assertEqual(cache.persistent.get("k"), ["a", "b"])
+        self.assertEqual(PersonaCache(LRUCache(), SQLitePersonaStore(self.path), loads=tuple).get("k"), ("a", "b"))
+
+    def test_answered_pages_rows_kept_with_their_answers(self):
+        store = SQLitePersonaStore(self.path)
+        for n in range(5):
+            store.set(f"k{n}", {"n": n}, {"risk_tolerance": n})
+        store.set("no-answers", {"n": -1})
+        store.set("k0", {"n": 10}, {"risk_tolerance": 0})
+        first = store.answered(limit=3)
+        self.assertEqual([value["n"] for _, _, value in first], [1, 2, 3])
+        rest = store.answered(after=first[-1][0], limit=3)
+        self.assertEqual([(answers, value) for _, answers, value in rest], [({"risk_tolerance": 4}, {"n": 4}), ({"risk_tolerance": 0}, {"n": 10})])
+        with mock.patch("persona_cache.time.time", return_value=time.time() + 86401):
+            self.assertEqual(store.answered(), [])
+
+    def test_adds_the_answers_column_to_an_older_file(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE personas (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)")
+        conn.execute("INSERT INTO personas VALUES ('old', '{}', ?)", (time.time(),))
+        conn.commit()
+        conn.close()
+        store = SQLitePersonaStore(self.path)
+        self.assertEqual(store.get("old"), {})
+        store.set("new", {"n": 1}, {"risk_tolerance": 2})
+        self.assertEqual([answers for _, answers, _ in store.answered()], [{"risk_tolerance": 2}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Progressive persona jobs, in memory and shared between workers through SQLite
+
+Run with `python -m unittest discover tests` (or pytest).
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from persona_jobs import JobLimitExceeded, PersonaJobs, SQLiteJobStore  # noqa: E402
+
+PERSONA = {"persona_summary": "A measured investor.", "provider": "OpenAI"}
+
+
+class PersonaJobsTest(unittest.IsolatedAsyncioTestCase):
+    async def test_waiters_wake_when_the_job_finishes(self):
+        jobs = PersonaJobs()
+        job = await jobs.create()
+        self.assertFalse(await jobs.wait(job, 0.01))
+        waiter = asyncio.create_task(jobs.wait(job, 5))
+        await jobs.finish(job, PERSONA)
+        self.assertTrue(await waiter)
+        self.assertEqual(job.to_dict()["ai_persona"], PERSONA)
+        self.assertEqual(jobs.stats()["completed"], 1)
+
+    async def test_limit_drops_finished_jobs_but_never_pending_ones(self):
+        jobs = PersonaJobs(max_jobs=2)
+        first = await jobs.create()
+        await jobs.create()
+        with self.assertRaises(JobLimitExceeded):
+            await jobs.create()
+        await jobs.fail(first, "down")
+        await jobs.create()
+        self.assertIsNone(await jobs.get(first.id))
+        self.assertEqual((jobs.rejected, jobs.stats()["pending"]), (1, 2))
+
+    async def test_finished_jobs_expire(self):
+        jobs = PersonaJobs(ttl_seconds=60)
+        job = await jobs.create()
+        await jobs.finish(job, PERSONA)
+        with mock.patch("persona_jobs.time.time", return_value=time.time() + 61):
+            self.assertIsNone(await jobs.get(job.id))
+
+
+class SharedStoreTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "jobs.db")
+
+    def worker(self, **kwargs) -> PersonaJobs:
+        return PersonaJobs(store=SQLiteJobStore(self.path), poll_seconds=0.01, **kwargs)
+
+    async def test_other_worker_follows_the_job_through_the_store(self):
+        generating, polled = self.worker(), self.worker()
+        job = await generating.create()
+        seen = await polled.get(job.id)
+        self.assertEqual((seen.status, seen.local), ("pending", False))
+        waiter = asyncio.create_task(polled.wait(seen, 5))
+        await asyncio.sleep(0.03)
+        await generating.finish(job, PERSONA)
+        self.assertTrue(await waiter)
+        self.assertEqual(seen.result, PERSONA)
+        self.assertIsNone(await polled.get("unknown"))
+
+    async def test_pending_job_of_a_stopped_worker_is_reported_failed(self):
+        job = await self.worker().create()
+        with mock.patch("persona_jobs.time.time", return_value=time.time() + 601):
+            seen = await self.worker().get(job.id)
+        self.assertEqual(seen.status, "failed")
+        self.assertIn("stopped", seen.error)
+
+    async def test_store_errors_do_not_fail_the_job(self):
+        jobs = self.worker()
+        job = await jobs.create()
+        with mock.patch.object(jobs.store, "save", side_effect=sqlite3.OperationalError("database is locked")):
+            await jobs.finish(job, PERSONA)
+        self.assertEqual((job.status, jobs.store_errors), ("done", 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+"""
+Half-open probes claimed for a provider that never gets called are released
+
+The router hands the probe slot of a recovering provider to the request that
+orders it; if the rate limiter moves that provider behind a ready one and
+the ready one answers, the probe must be given back, or the provider stays
+half-open with a probe "in flight" forever. A stream cut off by throttling
+gives its probe back too, without counting as a failure.
+
+Run with `python -m unittest discover tests` (or pytest).
+"""
+
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from hedging import HedgePolicy, race_providers  # noqa: E402
+from rate_limits import ProviderThrottled  # noqa: E402
+from router import CLOSED, HALF_OPEN, ProviderRouter  # noqa: E402
+
+PERSONA = {
+    "persona_tags": ["Mid risk - balanced", "Hands-on hybrid", "Medium term"],
+    "persona_summary": "A measured investor.",
+    "investment_style": "Balances returns with involvement.",
+    "strengths": ["Operational discipline"],
+    "considerations": ["Validate unit economics"],
+    "recommended_opportunities": ["Regional QSR franchise"],
+}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def half_open(router: ProviderRouter, clock: Clock, name: str):
+    """Open `name`'s circuit and let the cooldown pass"""
+    router.record_failure(name, RuntimeError("down"))
+    clock.now += router.cooldown_seconds
+    router._refresh(router.providers[name])
+    assert router.providers[name].state == HALF_OPEN
+
+
+class RaceProvidersProbeTest(unittest.IsolatedAsyncioTestCase):
+    async def test_unlaunched_probe_is_released(self):
+        clock = Clock()
+        router = ProviderRouter(["OpenAI", "Gemini"], consecutive_failures=1, cooldown_seconds=30, clock=clock)
+        half_open(router, clock, "Gemini")
+        self.assertEqual(router.order(), ["Gemini", "OpenAI"])
+        self.assertTrue(router.providers["Gemini"].probe_in_flight)
+
+        async def answer():
+            return "persona"
+
+        async def never_called():
+            raise AssertionError("the probe should not have been launched")
+
+        # The rate limiter put the ready provider first; it wins before any hedge
+        calls = [
+            ("OpenAI", router.track("OpenAI", answer)),
+            ("Gemini", router.track("Gemini", never_called)),
+        ]
+        provider, result = await race_providers(
+            calls, HedgePolicy(default_delay=5), deadline=5, log=lambda _: None, release=router.release
+        )
+
+        self.assertEqual((provider, result), ("OpenAI", "persona"))
+        self.assertFalse(router.providers["Gemini"].probe_in_flight)
+        self.assertEqual(router.order(claim_probe=False)[0], "Gemini")
+
+
+class StreamProbeTest(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        env = {
+            "OPENAI_API_KEY": "test", "GOOGLE_API_KEY": "test", "ANTHROPIC_API_KEY": "test",
+            "JOB_QUEUE_ENABLED": "false", "PERSONA_CACHE_ENABLED": "false", "PERSONA_INDEX_ENABLED": "false",
+            "PROVIDER_LOADING": "lazy",
+        }
+        with mock.patch.dict(os.environ, env):
+            import main
+        cls.main = main
+
+    async def test_unreached_probe_is_released(self):
+        main = self.main
+        clock = Clock()
+        router = ProviderRouter(list(main.provider_router.providers), consecutive_failures=1, clock=clock)
+        half_open(router, clock, "Gemini")
+
+        async def stream_openai(prompt):
+            yield json.dumps(PERSONA)
+
+        def ready_first(healthy, tokens):
+            return sorted(healthy, key=lambda name: name != "OpenAI")
+
+        with mock.patch.object(main, "provider_router", router), \
+                mock.patch.object(main, "stream_persona_with_openai", stream_openai), \
+                mock.patch.object(main.rate_limiter, "order", ready_first):
+            events = [event async for event in main.stream_persona_events(main.QuizAnswers(risk_tolerance=3))]
+
+        self.assertTrue(events[-1].startswith(b"event: done"))
+        self.assertFalse(router.providers["Gemini"].probe_in_flight)
+        self.assertEqual(router.order(claim_probe=False)[0], "Gemini")
+
+    async def test_throttled_mid_stream_is_not_a_failure(self):
+        main = self.main
+        clock = Clock()
+        router = ProviderRouter(list(main.provider_router.providers), consecutive_failures=1, clock=clock)
+        half_open(router, clock, "OpenAI")
+
+        async def stream_openai(prompt):
+            yield '{"persona_summary": "A measured investor.", "persona_tags": '
+            raise ProviderThrottled("OpenAI", 5, "429 Too Many Requests")
+
+        def openai_first(healthy, tokens):
+            return sorted(healthy, key=lambda name: name != "OpenAI")
+
+        with mock.patch.object(main, "provider_router", router), \
+                mock.patch.object(main, "stream_persona_with_openai", stream_openai), \
+                mock.patch.object(main.rate_limiter, "order", openai_first):
+            events = [event async for event in main.stream_persona_events(main.QuizAnswers(risk_tolerance=3))]
+
+        self.assertTrue(events[0].startswith(b"event: field"))
+        self.assertTrue(events[-1].startswith(b"event: error"))
+        self.assertIn(b"throttled after 1 fields", events[-1])
+        # The probe is handed back without reopening the circuit
+        health = router.providers["OpenAI"]
+        self.assertEqual((health.state, health.failures, health.probe_in_flight), (HALF_OPEN, 1, False))
+        self.assertEqual(router.providers["Gemini"].state, CLOSED)
+
+
+if __name__ == "__main__":
+    unittest.main()
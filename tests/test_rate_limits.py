@@ -0,0 +1,127 @@
+"""
+Token-bucket rate limiting per provider, and its sync from response headers
+
+Run with `python -m unittest discover tests` (or pytest).
+"""
+
+import os
+import sys
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from rate_limits import ProviderThrottled, RateLimitScheduler, TokenBucket, parse_reset  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_refills_evenly(self):
+        clock = Clock()
+        bucket = TokenBucket(60, clock=clock)
+        bucket.take(60)
+        self.assertEqual(bucket.wait_time(1), 1.0)
+        clock.now += 30
+        self.assertEqual(bucket.available(), 30)
+        clock.now += 120
+        self.assertEqual(bucket.available(), 60)
+
+    def test_oversized_request_waits_for_a_full_bucket(self):
+        clock = Clock()
+        bucket = TokenBucket(60, clock=clock)
+        bucket.take(30)
+        self.assertEqual(bucket.wait_time(600), 30.0)
+
+
+class ParseResetTest(unittest.TestCase):
+    def test_formats(self):
+        self.assertEqual(parse_reset("20"), 20.0)
+        self.assertEqual(parse_reset("6m0s"), 360.0)
+        self.assertAlmostEqual(parse_reset("1m30.5s"), 90.5)
+        self.assertAlmostEqual(parse_reset("120ms"), 0.12)
+        self.assertEqual(parse_reset("2000-01-01T00:00:00Z"), 0.0)
+        self.assertIsNone(parse_reset("soon"))
+        self.assertIsNone(parse_reset(None))
+
+
+class SchedulerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.waits = []
+        self.scheduler = RateLimitScheduler(
+            {"OpenAI": (60, 6000), "Claude": (60, 6000)},
+            max_wait=2,
+            on_wait=lambda name, seconds: self.waits.append((name, seconds)),
+            clock=self.clock,
+        )
+
+    async def test_throttles_instead_of_waiting_past_max_wait(self):
+        for _ in range(50):
+            await self.scheduler.acquire("OpenAI", 100)
+        self.assertEqual(self.waits, [("OpenAI", 0.0)] * 50)
+        # The missing 1000 tokens refill in 10s, well past max_wait
+        with self.assertRaises(ProviderThrottled) as raised:
+            await self.scheduler.acquire("OpenAI", 2000)
+        self.assertEqual(raised.exception.retry_after, 10.0)
+        self.assertEqual(self.scheduler.providers["OpenAI"].rejected, 1)
+        self.assertEqual(self.scheduler.providers["OpenAI"].admitted, 50)
+
+    async def test_unlimited_provider_is_admitted(self):
+        await self.scheduler.acquire("Gemini", 10**9)
+        self.assertEqual(self.scheduler.wait_time("Gemini", 10**9), 0.0)
+
+    def test_order_puts_ready_providers_first(self):
+        self.scheduler.providers["OpenAI"].requests.take(60)
+        self.scheduler.providers["Claude"].requests.take(62)
+        self.assertEqual(self.scheduler.order(["Claude", "OpenAI", "Gemini"], 10), ["Gemini", "OpenAI"])
+        self.assertEqual(self.scheduler.providers["Claude"].rejected, 1)
+
+    def test_headers_set_the_remaining_capacity(self):
+        self.scheduler.update_from_headers("OpenAI", {
+            "x-ratelimit-limit-requests": "100",
+            "x-ratelimit-remaining-requests": "40",
+            "x-ratelimit-limit-tokens": "9000",
+            "x-ratelimit-remaining-tokens": "0",
+            "x-ratelimit-reset-tokens": "6s",
+        })
+        limits = self.scheduler.providers["OpenAI"]
+        self.assertEqual(limits.requests.capacity, 100)
+        self.assertEqual(limits.requests.available(), 40)
+        self.assertEqual(self.scheduler.wait_time("OpenAI", 1), 6.0)
+
+    def test_headers_are_scaled_to_the_worker_share(self):
+        scheduler = RateLimitScheduler({"Claude": (50, 40000)}, share=1 / 4, clock=self.clock)
+        limits = scheduler.providers["Claude"]
+        self.assertEqual((limits.requests.capacity, limits.tokens.capacity), (12.5, 10000))
+        scheduler.update_from_headers("Claude", {
+            "anthropic-ratelimit-requests-limit": "50",
+            "anthropic-ratelimit-requests-remaining": "48",
+            "anthropic-ratelimit-tokens-limit": "40000",
+            "anthropic-ratelimit-tokens-remaining": "39000",
+        })
+        # The account-wide headers must not hand this worker the whole budget
+        self.assertEqual(limits.requests.capacity, 12.5)
+        self.assertEqual(limits.requests.available(), 12)
+        self.assertEqual(limits.tokens.capacity, 10000)
+        self.assertEqual(limits.tokens.available(), 9750)
+
+    def test_429_blocks_until_retry_after(self):
+        wait = self.scheduler.record_rate_limited("Claude", {"retry-after": "5"})
+        self.assertEqual(wait, 5.0)
+        self.assertEqual(self.scheduler.wait_time("Claude", 1), 5.0)
+        self.clock.now += 5
+        self.assertEqual(self.scheduler.wait_time("Claude", 1), 0.0)
+
+    def test_429_without_retry_after_blocks_one_request_interval(self):
+        self.assertEqual(self.scheduler.record_rate_limited("OpenAI", {}), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+Provider circuit breakers and latency-aware ordering
+
+Run with `python -m unittest discover tests` (or pytest).
+"""
+
+import os
+import sys
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from rate_limits import ProviderThrottled  # noqa: E402
+from router import CLOSED, HALF_OPEN, OPEN, ProviderRouter  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ProviderRouterTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.outcomes = []
+        self.router = ProviderRouter(
+            ["OpenAI", "Gemini", "Claude"],
+            min_requests=4,
+            consecutive_failures=3,
+            cooldown_seconds=30,
+            neutral_errors=(ProviderThrottled,),
+            on_outcome=lambda *outcome: self.outcomes.append(outcome),
+            clock=self.clock,
+        )
+
+    def fail(self, name, times=1):
+        for _ in range(times):
+            self.router.record_failure(name, RuntimeError("down"))
+
+    def test_consecutive_failures_open_the_circuit(self):
+        self.fail("OpenAI", 2)
+        self.assertEqual(self.router.providers["OpenAI"].state, CLOSED)
+        self.fail("OpenAI")
+        self.assertEqual(self.router.providers["OpenAI"].state, OPEN)
+        self.assertEqual(self.router.order(), ["Gemini", "Claude"])
+        self.assertEqual(self.router.retry_after(), 30)
+
+    def test_error_rate_opens_the_circuit(self):
+        for _ in range(2):
+            self.router.record_success("Gemini", 1.0)
+            self.fail("Gemini")
+        self.assertEqual(self.router.providers["Gemini"].state, OPEN)
+        self.assertIn("error rate 50%", self.router.providers["Gemini"].open_reason)
+
+    def test_half_open_probe_goes_first_once(self):
+        self.fail("Claude", 3)
+        self.clock.now += 30
+        self.assertEqual(self.router.order(), ["Claude", "OpenAI", "Gemini"])
+        self.assertEqual(self.router.providers["Claude"].state, HALF_OPEN)
+        # The probe is claimed, so a concurrent request does not probe it too
+        self.assertEqual(self.router.order(), ["OpenAI", "Gemini"])
+        self.router.record_success("Claude", 2.0)
+        self.assertEqual(self.router.providers["Claude"].state, CLOSED)
+
+    def test_failed_probe_reopens(self):
+        self.fail("Claude", 3)
+        self.clock.now += 30
+        self.router.order()
+        self.fail("Claude")
+        health = self.router.providers["Claude"]
+        self.assertEqual((health.state, health.times_opened), (OPEN, 2))
+        self.assertTrue(health.open_reason.startswith("half-open probe failed"))
+
+    def test_orders_by_expected_latency(self):
+        self.router.record_success("OpenAI", 8.0)
+        self.router.record_success("Claude", 1.0)
+        self.assertEqual(self.router.order(), ["Claude", "Gemini", "OpenAI"])
+        self.router.adaptive_order = False
+        self.assertEqual(self.router.order(), ["OpenAI", "Gemini", "Claude"])
+
+    def test_stale_samples_are_forgotten(self):
+        self.router.record_success("OpenAI", 8.0)
+        self.clock.now += self.router.stats_ttl_seconds + 1
+        self.assertEqual(self.router.order(), ["OpenAI", "Gemini", "Claude"])
+        self.assertEqual(self.router.snapshot()["providers"]["OpenAI"]["window_calls"], 0)
+
+    async def test_track_records_outcomes_but_not_neutral_errors(self):
+        async def throttled():
+            raise ProviderThrottled("OpenAI", 1.0)
+
+        async def broken():
+            raise RuntimeError("500")
+
+        with self.assertRaises(ProviderThrottled):
+            await self.router.track("OpenAI", throttled)()
+        with self.assertRaises(RuntimeError):
+            await self.router.track("Gemini", broken)()
+        self.assertEqual(self.router.providers["OpenAI"].failures, 0)
+        self.assertEqual(self.outcomes, [("Gemini", False, None, "500")])
+
+    def test_remote_outcomes_are_replayed_unless_stale(self):
+        self.router.record_remote("OpenAI", False, None, "down", age=5)
+        self.router.record_remote("OpenAI", False, None, "down", age=self.router.stats_ttl_seconds + 1)
+        self.router.record_remote("Mistral", False, None, "down", age=0)
+        self.assertEqual(self.router.providers["OpenAI"].failures, 1)
+        self.assertEqual(self.outcomes, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Rule-based persona tags compiled from Data/output.json, singly and in bulk
+
+Run with `python -m unittest discover tests` (or pytest).
+"""
+
+import os
+import sys
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from rule_engine import BulkTagger, RuleEngine, load_rules  # noqa: E402
+
+ANSWERS = {
+    "risk_tolerance": 3,
+    "involvement_level": "Co pilot - I support and guide, a manager or founder runs it",
+    "time_horizon": "More than 7 years",
+    "customer_segment": "A mix is fine",
+    "experience_level": "I have run a small or mid size business",
+    "priority_focus": "Process - systems, playbooks, controls",
+}
+
+
+class RuleEngineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = RuleEngine(load_rules())
+
+    def test_tags_come_out_in_rule_order(self):
+        self.assertEqual(self.engine.tags(ANSWERS), [
+            "Mid risk - balanced", "Hands-on hybrid", "Long term", "Experienced operator", "Systems focused",
+        ])
+        self.assertEqual([self.engine.tag_names[i] for i in self.engine.tag_indexes(ANSWERS)], self.engine.tags(ANSWERS))
+
+    def test_ranges_and_alternatives(self):
+        self.assertEqual(self.engine.tags({"risk_tolerance": 5}), ["High risk, high upside"])
+        self.assertEqual(self.engine.tags({"time_horizon": "4-7 years"}), ["Long term"])
+        self.assertEqual(self.engine.tags({"experience_level": "I am a seasoned founder, investor or operator"}), ["Experienced operator"])
+        self.assertEqual(self.engine.tags({}), [])
+
+    def test_values_outside_the_options_match_without_growing_the_tables(self):
+        field = next(field for field in self.engine.fields if field.name == "customer_segment")
+        self.assertEqual(self.engine.tags({"customer_segment": "Mostly B2B clients"}), ["B2B focused"])
+        self.assertEqual(self.engine.tags({"customer_segment": ["B2C first", "B2B later"]}), ["B2C focused", "B2B focused"])
+        self.assertNotIn("Mostly B2B clients", field.named)
+
+    def test_unique_and_capped(self):
+        rules = {
+            "persona_tags_generation": {"max_tags": 2},
+            "tag_categories": [
+                {"source_field": "risk_tolerance", "tags": {"1-5": "Any risk", "3": "Mid"}},
+                {"source_field": "time_horizon", "tags": {"years": "Any risk", "2-4": "Medium"}},
+            ],
+        }
+        engine = RuleEngine(rules)
+        self.assertEqual(engine.tags({"risk_tolerance": 1, "time_horizon": "2-4 years"}), ["Any risk", "Medium"])
+        self.assertEqual(engine.tags({"risk_tolerance": 3, "time_horizon": "2-4 years"}), ["Any risk", "Mid"])
+
+
+class BulkTaggerTest(unittest.TestCase):
+    def test_matches_single_submission_tagging(self):
+        engine = RuleEngine(load_rules())
+        submissions = [
+            ANSWERS,
+            {"risk_tolerance": 1, "priority_focus": "Profit - margins, payback, upside"},
+            {"customer_segment": "Mostly B2B clients", "time_horizon": "Less than 2 years"},
+            {},
+            {**ANSWERS, "involvement_level": "Operator - I want to be in the driver seat daily", "customer_segment": "B2C - consumers, families, walk in users"},
+        ]
+        tagger = BulkTagger(engine)
+        self.assertEqual(tagger.tags(tagger.encode(submissions)), [engine.tags(answers) for answers in submissions])
+
+
+if __name__ == "__main__":
+    unittest.main()
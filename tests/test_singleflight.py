@@ -0,0 +1,83 @@
+"""
+Singleflight coalescing: shared results and errors, and cancellation
+
+Run with `python -m unittest discover tests` (or pytest).
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from singleflight import SingleFlight  # noqa: E402
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def work(self, result="persona"):
+        self.calls += 1
+        await self.release.wait()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def test_concurrent_callers_share_one_call(self):
+        waiters = [asyncio.create_task(self.flights.do("k", self.work)) for _ in range(5)]
+        await asyncio.sleep(0)
+        self.assertEqual(self.flights.in_flight(), 1)
+        self.release.set()
+        self.assertEqual(await asyncio.gather(*waiters), ["persona"] * 5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flights.stats(), {"calls": 1, "provider_calls_saved": 4, "abandoned": 0, "in_flight": 0})
+
+    async def test_different_keys_do_not_coalesce(self):
+        self.release.set()
+        await asyncio.gather(self.flights.do("a", self.work), self.flights.do("b", self.work))
+        self.assertEqual(self.calls, 2)
+
+    async def test_errors_reach_every_waiter_and_are_not_cached(self):
+        waiters = [asyncio.create_task(self.flights.do("k", lambda: self.work(RuntimeError("down")))) for _ in range(3)]
+        self.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(await self.flights.do("k", self.work), "persona")
+        self.assertEqual(self.calls, 2)
+
+    async def test_cancelled_waiter_leaves_the_call_to_the_others(self):
+        first = asyncio.create_task(self.flights.do("k", self.work))
+        second = asyncio.create_task(self.flights.do("k", self.work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        self.release.set()
+        self.assertEqual(await second, "persona")
+        self.assertTrue(first.cancelled())
+        self.assertEqual(self.flights.abandoned, 0)
+
+    async def test_last_waiter_cancelling_cancels_the_call(self):
+        started = asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(60)
+
+        waiter = asyncio.create_task(self.flights.do("k", work))
+        await started.wait()
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual((self.flights.abandoned, self.flights.in_flight()), (1, 0))
+        # A new caller starts afresh rather than joining the cancelled call
+        self.release.set()
+        self.assertEqual(await self.flights.do("k", self.work), "persona")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Speculative personas are only served for final answers they saw
+
+Run with `python -m unittest discover tests` (or pytest).
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from quiz_encoding import QUESTIONS  # noqa: E402
+from speculation import TRIGGER_FIELDS, SpeculativeSessions  # noqa: E402
+
+OPTIONS = {q["name"]: q.get("options") for q in QUESTIONS}
+
+# The trigger fields plus the cheap ones a quiz fills in before them
+PARTIAL = {
+    "goal_primary": OPTIONS["goal_primary"][0],
+    "time_horizon": OPTIONS["time_horizon"][0],
+    "ticket_size": OPTIONS["ticket_size"][0],
+    "risk_tolerance": 3,
+    "reaction_style": OPTIONS["reaction_style"][0],
+    "decision_style": OPTIONS["decision_style"][0],
+    "involvement_level": OPTIONS["involvement_level"][0],
+    "time_per_week": OPTIONS["time_per_week"][0],
+    "partner_preference": OPTIONS["partner_preference"][0],
+    "sectors": OPTIONS["sectors"][:2],
+    "customer_segment": OPTIONS["customer_segment"][0],
+    "brand_preference": OPTIONS["brand_preference"][0],
+    "geo_scope": OPTIONS["geo_scope"][:1],
+    "experience_level": OPTIONS["experience_level"][0],
+    "priority_focus": OPTIONS["priority_focus"][0],
+}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class SpeculationTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.generated = []
+
+        async def generate(answers):
+            self.generated.append(answers)
+            return {"seen": answers}
+
+        self.sessions = SpeculativeSessions(generate, clock=Clock())
+
+    async def speculate(self, answers):
+        status = self.sessions.progress("s1", answers)
+        self.assertTrue(status["speculating"])
+        await asyncio.sleep(0)
+
+    async def test_waits_for_the_trigger_fields(self):
+        answers = {name: value for name, value in PARTIAL.items() if name != "experience_level"}
+        status = self.sessions.progress("s1", answers)
+        self.assertEqual(status["waiting_for"], ["experience_level"])
+        self.assertEqual(self.sessions.started, 0)
+        self.assertTrue(set(TRIGGER_FIELDS) <= set(PARTIAL))
+
+    async def test_same_answers_hit(self):
+        await self.speculate(PARTIAL)
+        persona = await self.sessions.claim("s1", dict(PARTIAL))
+        self.assertEqual(persona, {"seen": PARTIAL})
+        self.assertEqual(self.sessions.claims["hit"], 1)
+
+    async def test_small_slider_move_hits(self):
+        await self.speculate(PARTIAL)
+        persona = await self.sessions.claim("s1", {**PARTIAL, "risk_tolerance": 4})
+        self.assertIsNotNone(persona)
+
+    async def test_added_key_lesson_misses(self):
+        await self.speculate(PARTIAL)
+        final = {**PARTIAL, "key_lesson": "Never invest where I do not trust the numbers."}
+        # Weighted distance alone would call this a hit
+        self.assertLessEqual(self.sessions.distance(PARTIAL, final), self.sessions.max_distance)
+        self.assertIsNone(await self.sessions.claim("s1", final))
+        self.assertEqual(self.sessions.claims["changed"], 1)
+        self.assertEqual(self.sessions.wasted, 1)
+
+    async def test_changed_key_lesson_misses(self):
+        answers = {**PARTIAL, "key_lesson": "Trust the numbers."}
+        await self.speculate(answers)
+        self.assertIsNone(await self.sessions.claim("s1", {**answers, "key_lesson": "Trust the people."}))
+        self.assertEqual(self.sessions.claims["changed"], 1)
+
+    async def test_added_low_weight_field_misses(self):
+        await self.speculate(PARTIAL)
+        final = {**PARTIAL, "deal_structures": OPTIONS["deal_structures"][:1]}
+        self.assertIsNone(await self.sessions.claim("s1", final))
+
+    async def test_added_field_restarts_the_speculation(self):
+        await self.speculate(PARTIAL)
+        final = {**PARTIAL, "key_lesson": "Trust the numbers."}
+        status = self.sessions.progress("s1", final)
+        self.assertTrue(status["speculating"])
+        self.assertEqual(self.sessions.restarted, 1)
+        await asyncio.sleep(0)
+        self.assertEqual(await self.sessions.claim("s1", final), {"seen": final})
+
+    async def test_restarts_stop_at_the_session_limit(self):
+        await self.speculate(PARTIAL)
+        for lesson in ("one", "two", "three"):
+            status = self.sessions.progress("s1", {**PARTIAL, "key_lesson": lesson})
+        self.assertEqual(status.get("skipped"), "session_limit")
+        self.assertEqual(self.sessions.started, self.sessions.max_per_session)
+        self.assertIsNone(await self.sessions.claim("s1", {**PARTIAL, "key_lesson": "three"}))
+
+    async def test_failed_speculation_is_not_served(self):
+        async def fail(answers):
+            raise RuntimeError("provider down")
+
+        sessions = SpeculativeSessions(fail, clock=Clock())
+        sessions.progress("s1", PARTIAL)
+        self.assertIsNone(await sessions.claim("s1", dict(PARTIAL)))
+        self.assertEqual(sessions.claims["failed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
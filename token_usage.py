@@ -0,0 +1,78 @@
+"""
+Per-provider token usage, including prompt-cache hits
+
+Providers report how much of each prompt was served from their prompt cache
+(OpenAI `cached_tokens`, Anthropic `cache_read_input_tokens`, Gemini
+`cached_content_token_count`). Recording those next to the call latency shows
+what the static system-prompt prefix actually saves: the share of input tokens
+billed at the cached rate, and how much faster calls with a cache hit are.
+"""
+
+import threading
+from typing import Any, Dict, Optional
+
+
+class ProviderUsage:
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+        self.cache_write_tokens = 0
+        self.output_tokens = 0
+        self.cache_hit_calls = 0
+        # Summed latency of calls with and without a cache hit
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+        self.timed_hits = 0
+        self.timed_misses = 0
+
+
+class TokenUsage:
+    """Counters per provider; `input_tokens` always includes the cached part"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.providers: Dict[str, ProviderUsage] = {}
+
+    def record(
+        self,
+        provider: str,
+        input_tokens: int,
+        output_tokens: int,
+        cached_tokens: int = 0,
+        cache_write_tokens: int = 0,
+        seconds: Optional[float] = None,
+    ):
+        with self._lock:
+            usage = self.providers.setdefault(provider, ProviderUsage())
+            usage.calls += 1
+            usage.input_tokens += input_tokens
+            usage.output_tokens += output_tokens
+            usage.cached_input_tokens += cached_tokens
+            usage.cache_write_tokens += cache_write_tokens
+            if cached_tokens:
+                usage.cache_hit_calls += 1
+            if seconds is not None:
+                if cached_tokens:
+                    usage.hit_seconds += seconds
+                    usage.timed_hits += 1
+                else:
+                    usage.miss_seconds += seconds
+                    usage.timed_misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                name: {
+                    "calls": usage.calls,
+                    "input_tokens": usage.input_tokens,
+                    "cached_input_tokens": usage.cached_input_tokens,
+                    "cache_write_tokens": usage.cache_write_tokens,
+                    "output_tokens": usage.output_tokens,
+                    "cached_input_ratio": usage.cached_input_tokens / usage.input_tokens if usage.input_tokens else 0.0,
+                    "cache_hit_calls": usage.cache_hit_calls,
+                    "mean_seconds_cache_hit": usage.hit_seconds / usage.timed_hits if usage.timed_hits else None,
+                    "mean_seconds_cache_miss": usage.miss_seconds / usage.timed_misses if usage.timed_misses else None,
+                }
+                for name, usage in self.providers.items()
+            }
@@ -0,0 +1,66 @@
+"""
+Which callback URLs the server will POST finished persona jobs to
+
+A progressive hybrid request may name a `callback_url`, and the endpoint is
+open to any origin, so without a check anyone could make the server send
+requests to internal hosts or the cloud metadata service. Callbacks are
+therefore off unless WEBHOOK_ALLOWED_HOSTS lists the hosts they may go to
+(`hooks.example.com`, or `.example.com` for any subdomain). Even a listed
+host is refused when it resolves to a private, loopback, link-local or
+otherwise non-public address; the check is made when the URL is submitted
+and again before each delivery, in case the DNS answer has changed.
+"""
+
+import asyncio
+import ipaddress
+import socket
+from typing import Iterable, List
+from urllib.parse import urlsplit
+
+
+class CallbackRejected(ValueError):
+    pass
+
+
+class CallbackPolicy:
+    def __init__(self, allowed_hosts: Iterable[str] = ()):
+        self.allowed_hosts = [host.strip().lower().rstrip(".") for host in allowed_hosts if host.strip()]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.allowed_hosts)
+
+    def host(self, url: str) -> str:
+        """The URL's host if it is an http(s) URL to an allowed host, else CallbackRejected"""
+        if not self.enabled:
+            raise CallbackRejected("callbacks are disabled (WEBHOOK_ALLOWED_HOSTS is not set)")
+        try:
+            parts = urlsplit(url)
+            parts.port
+        except ValueError:
+            raise CallbackRejected("callback_url is not a valid URL")
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise CallbackRejected("callback_url must be an http(s) URL")
+        if parts.username or parts.password:
+            raise CallbackRejected("callback_url must not carry credentials")
+        host = parts.hostname.rstrip(".")
+        if not any(host == allowed or (allowed.startswith(".") and host.endswith(allowed)) for allowed in self.allowed_hosts):
+            raise CallbackRejected(f"callback_url host {host} is not in WEBHOOK_ALLOWED_HOSTS")
+        return host
+
+    async def check(self, url: str) -> List[str]:
+        """Check `url` and resolve its host; CallbackRejected unless every address is public"""
+        host = self.host(url)
+        port = urlsplit(url).port or (443 if url.lower().startswith("https") else 80)
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise CallbackRejected(f"callback_url host {host} does not resolve: {e}")
+        addresses = sorted({info[4][0] for info in infos})
+        for address in addresses:
+            ip = ipaddress.ip_address(address.split("%")[0])
+            if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+                ip = ip.ipv4_mapped
+            if not ip.is_global or ip.is_multicast:
+                raise CallbackRejected(f"callback_url host {host} resolves to a non-public address ({ip})")
+        return addresses